@@ -1,16 +1,98 @@
 import re
+import json
+import asyncio
+import hashlib
+from functools import cached_property
+from typing import AsyncIterator, Tuple
 from config import get_settings
+from ttl_cache import TTLCache
+from triage_engine import triage_engine
+from conversation_memory import ConversationMemory
+from llm_gateway import llm_gateway
+from resilience import bounded_stream, breakers, guarded_call, stage_timeout
 
 settings = get_settings()
 
+GEMINI_MODEL = 'gemini-2.0-flash-exp'
+
+# Share of the remaining request budget a model call may use; the rest is left for the hospital lookup
+GEMINI_BUDGET_SHARE = 0.8
+
+REPORT_KEYWORDS = ['report', 'upload', 'scan', 'lab']
+
+# JSON schema for the single-call structured triage response
+TRIAGE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "seriousness_score": {"type": "NUMBER"},
+        "advice": {"type": "STRING"},
+        "suggest_hospital": {"type": "BOOLEAN"},
+        "request_report": {"type": "BOOLEAN"},
+        "specialty": {"type": "STRING"}
+    },
+    "required": ["seriousness_score", "advice", "suggest_hospital", "request_report", "specialty"]
+}
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_message(text: str) -> str:
+    """Fold case, punctuation and whitespace so near-identical messages share a cache key"""
+    text = _PUNCTUATION.sub(' ', (text or '').lower())
+    return _WHITESPACE.sub(' ', text).strip()
+
+# Every profile field _build_advice_prompt puts into the prompt
+PROMPT_PROFILE_FIELDS = ('age', 'gender', 'blood_group', 'height', 'weight', 'location_preference',
+                         'allergies', 'chronic_conditions', 'current_medications')
+
+def profile_key(user_profile: dict = None) -> str:
+    """Digest of the profile fields in the advice prompt.
+
+    Cached advice is only shared between profiles whose prompt would be
+    identical, so one patient's details never reach another.
+    """
+    if not user_profile:
+        return ''
+    values = [user_profile.get(field) for field in PROMPT_PROFILE_FIELDS]
+    return hashlib.sha256(json.dumps(values, default=str).encode('utf-8')).hexdigest()
+
 class AIService:
     def __init__(self):
+        self.structured_triage = settings.AI_STRUCTURED_TRIAGE
+        self.cache = TTLCache(maxsize=settings.AI_CACHE_SIZE, ttl=settings.AI_CACHE_TTL_SECONDS)
+
+    @cached_property
+    def gemini_model(self):
+        # google.generativeai takes about a second to import, so it is loaded on first use
         import google.generativeai as genai
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.gemini_model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        return genai.GenerativeModel(GEMINI_MODEL)
+    
+    def _generate(self, prompt: str, generation_config: dict = None):
+        """generate_content through the shared gateway; identical in-flight prompts make one call.
+
+        Bounded by the request deadline and the Gemini circuit breaker. Not
+        retried: a generation is not idempotent and callers have fallbacks.
+        """
+        key = (GEMINI_MODEL, prompt, json.dumps(generation_config, sort_keys=True) if generation_config else None)
+        return guarded_call('gemini', lambda timeout: llm_gateway.call(
+            key, lambda: self.gemini_model.generate_content(
+                prompt, generation_config=generation_config, request_options={'timeout': timeout}
+            )
+        ), share=GEMINI_BUDGET_SHARE)
     
     def evaluate_seriousness(self, symptoms: str) -> float:
         """Evaluate the seriousness of symptoms and return a percentage score"""
+        # Clear-cut messages are scored locally without a model call
+        local = triage_engine.score(symptoms)
+        if local.confidence >= settings.TRIAGE_CONFIDENCE_THRESHOLD:
+            return float(local.score)
+        
+        cache_key = ('score', normalize_message(symptoms))
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         prompt = f"""
         Analyze the following medical symptoms and provide a seriousness score from 0-100.
         Consider factors like severity, urgency, and potential complications.
@@ -27,23 +109,26 @@ class AIService:
         """
         
         try:
-            response = self.gemini_model.generate_content(prompt)
+            response = self._generate(prompt)
             score_text = response.text.strip()
             
             # Extract number from response
             numbers = re.findall(r'\d+\.?\d*', score_text)
             if numbers:
                 score = float(numbers[0])
-                return min(max(score, 0), 100)  # Clamp between 0-100
+                score = min(max(score, 0), 100)  # Clamp between 0-100
+                self.cache.set(cache_key, score)
+                return score
             return 50.0
         except Exception as e:
             print(f"Error evaluating seriousness: {e}")
             return 50.0
     
-    def get_medical_advice(self, symptoms: str, user_profile: dict = None) -> str:
-        """Get medical advice as an intelligent agent with context awareness"""
+    def _build_advice_prompt(self, symptoms: str, user_profile: dict = None, conversation: str = '') -> str:
+        """Build the agent prompt shared by get_medical_advice and triage"""
         user_context = ""
         medical_history = ""
+        conversation_context = ""
         
         if user_profile:
             user_context = f"""
@@ -64,11 +149,18 @@ class AIService:
             - Current Medications: {user_profile.get('current_medications', 'None reported')}
             """
         
-        prompt = f"""
+        if conversation:
+            conversation_context = f"""
+            Conversation So Far:
+{conversation}
+            """
+        
+        return f"""
         You are MediGuide AI - an intelligent medical advisory agent, not just a chatbot. Act as a knowledgeable, empathetic healthcare assistant.
         
         {user_context}
         {medical_history}
+        {conversation_context}
         
         Patient Query: {symptoms}
         
@@ -102,13 +194,184 @@ class AIService:
         
         Respond naturally as an intelligent healthcare agent would.
         """
+    
+    def get_medical_advice(self, symptoms: str, user_profile: dict = None, conversation: str = '') -> str:
+        """Get medical advice as an intelligent agent with context awareness"""
+        cache_key = ('advice', normalize_message(symptoms), profile_key(user_profile), conversation)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        prompt = self._build_advice_prompt(symptoms, user_profile, conversation)
         
         try:
-            response = self.gemini_model.generate_content(prompt)
+            response = self._generate(prompt)
+            self.cache.set(cache_key, response.text)
             return response.text
         except Exception as e:
             print(f"Error getting medical advice: {e}")
             return f"Error generating medical advice: {str(e)}"
+    
+    def triage(self, symptoms: str, user_profile: dict = None, conversation: str = '') -> dict:
+        """Score the symptoms and produce advice, hospital/report flags and a specialty.
+
+        In structured mode this is a single Gemini call with JSON schema output;
+        otherwise (or if the structured call fails) it falls back to the
+        separate scoring and advice prompts. conversation is the context from
+        conversation_memory for the advice.
+        """
+        if self.structured_triage:
+            result = self._structured_triage(symptoms, user_profile, conversation)
+            if result is not None:
+                return result
+        score = self.evaluate_seriousness(symptoms)
+        advice = self.get_medical_advice(symptoms, user_profile, conversation)
+        return build_triage_result(symptoms, score, advice)
+    
+    def _structured_triage(self, symptoms: str, user_profile: dict = None, conversation: str = ''):
+        """One round trip returning the full triage result, or None on failure"""
+        cache_key = ('triage', normalize_message(symptoms), profile_key(user_profile), conversation)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
+        prompt = self._build_advice_prompt(symptoms, user_profile, conversation) + """
+        Return your answer as JSON with these fields:
+        - seriousness_score: number from 0-100 (0-30 minor, 31-60 moderate, 61-85 serious, 86-100 critical)
+        - advice: your full response to the patient, as described above
+        - suggest_hospital: true if the patient should visit a hospital or clinic
+        - request_report: true if uploading a medical report or lab result would help
+        - specialty: the most relevant medical specialty, e.g. "cardiology" or "internal medicine"
+        """
+        
+        try:
+            response = self._generate(
+                prompt,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": TRIAGE_SCHEMA
+                }
+            )
+            result = parse_triage_response(response.text)
+            self.cache.set(cache_key, result)
+            return dict(result)
+        except Exception as e:
+            print(f"Error running structured triage: {e}")
+            return None
+    
+    def summarize_conversation(self, summary: str, turns: list) -> str:
+        """Fold older exchanges into the running conversation summary (ConversationMemory's summarizer)"""
+        exchanges = "\n".join(f"Patient: {user}\nMediGuide: {reply}" for user, reply, _ in turns)
+        prompt = f"""
+        Update the running summary of a patient's conversation with a medical assistant.
+        Keep symptoms with their onset and duration, medications, allergies, measurements,
+        advice already given and open questions. Drop greetings and disclaimers.
+        Answer with the updated summary only, in at most {settings.CONVERSATION_SUMMARY_TOKENS * 3 // 4} words.
+        
+        Current summary: {summary or 'None yet'}
+        
+        New exchanges:
+        {exchanges}
+        """
+        response = self._generate(
+            prompt,
+            generation_config={"max_output_tokens": settings.CONVERSATION_SUMMARY_TOKENS}
+        )
+        return response.text.strip()
+
+def build_triage_result(symptoms: str, score: float, advice: str, specialty: str = '') -> dict:
+    """Assemble a triage result, deriving the flags from keywords"""
+    return {
+        'seriousness_score': score,
+        'advice': advice,
+        'suggest_hospital': score > 60 or 'hospital' in advice.lower(),
+        'request_report': any(word in symptoms.lower() for word in REPORT_KEYWORDS),
+        'specialty': specialty
+    }
+
+def parse_triage_response(text: str) -> dict:
+    """Validate a structured triage JSON payload; raises ValueError if malformed"""
+    data = json.loads(text)
+    if not isinstance(data, dict) or not isinstance(data.get('advice'), str):
+        raise ValueError("Triage response is missing advice")
+    score = float(data['seriousness_score'])
+    return {
+        'seriousness_score': min(max(score, 0), 100),  # Clamp between 0-100
+        'advice': data['advice'],
+        'suggest_hospital': bool(data.get('suggest_hospital', False)),
+        'request_report': bool(data.get('request_report', False)),
+        'specialty': str(data.get('specialty') or '').strip().lower()
+    }
+
+class AsyncAIService:
+    """Async variant of AIService for the FastAPI endpoints.
+
+    The Gemini client is blocking, so each call runs in a worker thread and the
+    event loop stays free to serve other requests while a chat is in flight.
+    """
+
+    def __init__(self, service: AIService):
+        self.service = service
+
+    async def evaluate_seriousness(self, symptoms: str) -> float:
+        return await asyncio.to_thread(self.service.evaluate_seriousness, symptoms)
+
+    async def get_medical_advice(self, symptoms: str, user_profile: dict = None, conversation: str = '') -> str:
+        return await asyncio.to_thread(self.service.get_medical_advice, symptoms, user_profile, conversation)
+
+    async def analyze(self, symptoms: str, user_profile: dict = None, conversation: str = '') -> Tuple[float, str]:
+        """Run scoring and advice concurrently and return (seriousness_score, advice)"""
+        score, advice = await asyncio.gather(
+            self.evaluate_seriousness(symptoms),
+            self.get_medical_advice(symptoms, user_profile, conversation)
+        )
+        return score, advice
+
+    async def stream_medical_advice(self, symptoms: str, user_profile: dict = None,
+                                    conversation: str = '') -> AsyncIterator[str]:
+        """Yield the advice text as Gemini generates it; the full text is cached at the end"""
+        cache_key = ('advice', normalize_message(symptoms), profile_key(user_profile), conversation)
+        cached = self.service.cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        prompt = self.service._build_advice_prompt(symptoms, user_profile, conversation)
+        parts = []
+        breaker = breakers['gemini']
+        try:
+            breaker.allow()
+            # Load the model off the event loop on first use
+            model = await asyncio.to_thread(getattr, self.service, 'gemini_model')
+            timeout = stage_timeout(settings.GEMINI_TIMEOUT_SECONDS, GEMINI_BUDGET_SHARE)
+            response = model.generate_content_async(prompt, stream=True, request_options={'timeout': timeout})
+            # The gateway slot is held while Gemini generates, not while the client reads
+            async for chunk in llm_gateway.async_stream(bounded_stream('gemini', response, timeout)):
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
+            breaker.record_success()
+        except (GeneratorExit, asyncio.CancelledError):
+            # The client went away mid-stream
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.record(e)
+            print(f"Error streaming medical advice: {e}")
+            yield f"Error generating medical advice: {str(e)}"
+            return
+        self.service.cache.set(cache_key, ''.join(parts))
+
+    async def triage(self, symptoms: str, user_profile: dict = None, conversation: str = '') -> dict:
+        """Async AIService.triage; the legacy two-prompt path runs concurrently"""
+        if self.service.structured_triage:
+            result = await asyncio.to_thread(self.service._structured_triage, symptoms, user_profile, conversation)
+            if result is not None:
+                return result
+        score, advice = await self.analyze(symptoms, user_profile, conversation)
+        return build_triage_result(symptoms, score, advice)
 
-# Singleton instance
+# Singleton instances
 ai_service = AIService()
+async_ai_service = AsyncAIService(ai_service)
+conversation_memory = ConversationMemory(summarizer=ai_service.summarize_conversation)
@@ -1,16 +1,31 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import tuple_, text as sa_text
+from sqlalchemy.orm import joinedload
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 import os
 import re
 import json
+import hashlib
 import requests
 from datetime import datetime, timedelta
-import googlemaps
+from functools import lru_cache
 from dotenv import load_dotenv
-from ai_service import ai_service
+from ai_service import ai_service, conversation_memory
+from llm_gateway import llm_gateway
+from resilience import MAPS_CLIENT_OPTIONS, guarded_call, request_deadline, resilience_stats
+from fanout import fetch_concurrently
+from geocode_cache import geocode_cache
+from geodesy import haversine_many
+from hospital_scorer import hospital_scorer
+from migrations import migrate
+from text_blob import INSERT_BLOB_SQL, blob_params, decode_text
+from write_behind import WriteBehindQueue
+from identity_cache import IdentityCache, ModelSnapshot
+from place_details_cache import place_details_cache
+from upload_store import UploadStore, UploadTooLarge
+from document_worker import document_worker
 
 # Load environment variables
 load_dotenv()
@@ -19,24 +34,48 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///mediguide.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_DIR') or os.path.join(app.root_path, 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_HISTORY_MAX_PAGE_SIZE = 200
+
 # Initialize extensions
 db = SQLAlchemy(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# Initialize Google Maps client
-try:
-    gmaps = googlemaps.Client(key=os.getenv('GOOGLE_MAPS_API_KEY'))
-except Exception as e:
-    print(f"Google Maps initialization failed: {e}")
-    gmaps = None
+@lru_cache(maxsize=None)
+def get_gmaps():
+    """Google Maps client, created on first use so the app starts quickly"""
+    import googlemaps
+    try:
+        return googlemaps.Client(key=os.getenv('GOOGLE_MAPS_API_KEY'), **MAPS_CLIENT_OPTIONS)
+    except Exception as e:
+        print(f"Google Maps initialization failed: {e}")
+        return None
+
+# Content-addressed document store; the upload folder is created on the first save
+upload_store = UploadStore(app.config['UPLOAD_FOLDER'], max_bytes=app.config['MAX_CONTENT_LENGTH'])
 
-# Create upload folder
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+def store_document_artifacts(content_hash, artifacts):
+    """Copy a finished job's artifacts onto every document of that content, so they outlive the cache DB"""
+    # Called from the worker's threads as well as from requests
+    with app.app_context():
+        MedicalDocument.query.filter(
+            MedicalDocument.content_hash == content_hash, MedicalDocument.artifacts.is_(None)
+        ).update({MedicalDocument.artifacts: json.dumps(artifacts)}, synchronize_session=False)
+        db.session.commit()
+
+def sync_document_artifacts(content_hash):
+    """Job status of an upload; stores the artifacts of jobs finished by another process"""
+    job = document_worker.status(content_hash)
+    if job and job['status'] == 'done':
+        store_document_artifacts(content_hash, job['artifacts'])
+    return job
+
+document_worker.on_done(store_document_artifacts)
 
 # Database Models
 class User(UserMixin, db.Model):
@@ -59,34 +98,102 @@ class User(UserMixin, db.Model):
     documents = db.relationship('MedicalDocument', backref='user', lazy=True)
     reminders = db.relationship('Reminder', backref='user', lazy=True)
 
+class TextBlob(db.Model):
+    """Content-addressed text, stored once however many rows reference it"""
+    hash = db.Column(db.String(64), primary_key=True)  # sha256 of the UTF-8 text
+    codec = db.Column(db.String(8), nullable=False)  # raw, zlib
+    data = db.Column(db.LargeBinary, nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # Uncompressed bytes
+    
+    @property
+    def text(self):
+        return decode_text(self.codec, self.data)
+    
+    @staticmethod
+    def store(text):
+        """Save a text if it is new and return its hash"""
+        params = blob_params(text)
+        db.session.execute(sa_text(INSERT_BLOB_SQL), params)
+        return params['hash']
+
+class BlobText:
+    """Model attribute whose text lives in TextBlob, referenced by a hash column.
+
+    Reads go through the blob relationship, so queries can eager-load it.
+    """
+    
+    def __init__(self, hash_column, relationship):
+        self.hash_column = hash_column
+        self.relationship = relationship
+    
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        digest = getattr(obj, self.hash_column)
+        if digest is None:
+            return None
+        blob = getattr(obj, self.relationship)
+        if blob is None or blob.hash != digest:
+            # Set since the row was loaded
+            blob = db.session.get(TextBlob, digest)
+        return blob.text
+    
+    def __set__(self, obj, value):
+        setattr(obj, self.hash_column, None if value is None else TextBlob.store(value))
+
 class ChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.Text, nullable=False)
-    response = db.Column(db.Text, nullable=False)
+    response_hash = db.Column(db.String(64), db.ForeignKey('text_blob.hash'), nullable=False)
     severity_score = db.Column(db.Integer, default=0)
-    extracted_symptoms = db.Column(db.Text)  # JSON string
+    extracted_symptoms_hash = db.Column(db.String(64), db.ForeignKey('text_blob.hash'))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Shared with the matching Consultation through TextBlob
+    response_blob = db.relationship(TextBlob, foreign_keys=[response_hash])
+    extracted_symptoms_blob = db.relationship(TextBlob, foreign_keys=[extracted_symptoms_hash])
+    response = BlobText('response_hash', 'response_blob')
+    extracted_symptoms = BlobText('extracted_symptoms_hash', 'extracted_symptoms_blob')  # JSON string
+    
+    # History pages are range scans over (user_id, timestamp, id)
+    __table_args__ = (db.Index('ix_chat_message_user_timestamp', 'user_id', 'timestamp', 'id'),)
 
 class Consultation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    symptoms = db.Column(db.Text, nullable=False)
+    symptoms_hash = db.Column(db.String(64), db.ForeignKey('text_blob.hash'), nullable=False)
     severity_score = db.Column(db.Integer, nullable=False)
-    diagnosis = db.Column(db.Text)
+    diagnosis_hash = db.Column(db.String(64), db.ForeignKey('text_blob.hash'))
     recommended_action = db.Column(db.String(50))  # home_remedy, doctor_visit, emergency
     recommended_hospitals = db.Column(db.Text)  # JSON string
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    symptoms_blob = db.relationship(TextBlob, foreign_keys=[symptoms_hash])
+    diagnosis_blob = db.relationship(TextBlob, foreign_keys=[diagnosis_hash])
+    symptoms = BlobText('symptoms_hash', 'symptoms_blob')  # JSON string
+    diagnosis = BlobText('diagnosis_hash', 'diagnosis_blob')
+    
+    __table_args__ = (db.Index('ix_consultation_user_timestamp', 'user_id', 'timestamp'),)
+
+# Statements for write-behind chat logging; the same objects every time so batches group them
+INSERT_TEXT_BLOB = sa_text(INSERT_BLOB_SQL)
+INSERT_CHAT_MESSAGE = ChatMessage.__table__.insert()
+INSERT_CONSULTATION = Consultation.__table__.insert()
 
 class MedicalDocument(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    filename = db.Column(db.String(255), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)  # Relative to UPLOAD_FOLDER, e.g. "ab/cd/<content_hash>"
     original_filename = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.String(50))
     file_size = db.Column(db.Integer)
+    content_hash = db.Column(db.String(64))
+    artifacts = db.Column(db.Text)  # JSON manifest from the document worker, once processing is done
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
     description = db.Column(db.Text)
+    
+    __table_args__ = (db.Index('ix_medical_document_user_upload_date', 'user_id', 'upload_date'),)
 
 class Reminder(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -97,51 +204,62 @@ class Reminder(db.Model):
     scheduled_time = db.Column(db.DateTime, nullable=False)
     is_sent = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Due-reminder scans: unsent reminders by scheduled time
+    __table_args__ = (db.Index('ix_reminder_is_sent_scheduled_time', 'is_sent', 'scheduled_time'),)
+
+# Chat and consultation logging; commits in background batches when WRITE_BEHIND_ENABLED is set
+with app.app_context():
+    chat_writer = WriteBehindQueue(db.engine)
+
+class CachedUser(ModelSnapshot, UserMixin):
+    """Read-only User snapshot served to Flask-Login from the identity cache"""
+    
+    def _load(self):
+        # Relationship lists (e.g. on the profile page) come from the live row
+        return db.session.get(User, self.id)
+
+user_cache = IdentityCache(CachedUser)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    return user_cache.get(user_id, lambda: db.session.get(User, user_id))
 
 # AI Service Helper Functions
 def extract_symptoms(text):
     """Extract symptoms from user input - simplified for now"""
     return [text]  # Return the full text as symptom for AI processing
 
-def calculate_severity_score(symptoms, text):
-    """Calculate severity score using AI service"""
-    try:
-        return int(ai_service.evaluate_seriousness(text))
-    except Exception as e:
-        print(f"Error calculating severity: {e}")
-        return 30  # Default moderate score
+def get_user_profile(user):
+    """Build the profile dict the AI service uses for context"""
+    return {
+        'age': user.age,
+        'gender': user.gender,
+        'location_preference': user.location,
+        'allergies': None,  # These would come from profile if implemented
+        'chronic_conditions': None,
+        'current_medications': None
+    }
+
+def get_recommended_action(severity_score):
+    """Map a severity score to a recommended action"""
+    if severity_score >= 70:
+        return 'emergency'
+    elif severity_score >= 40:
+        return 'doctor_visit'
+    return 'home_remedy'
 
-def get_medical_advice(symptoms, severity_score, user):
-    """Get medical advice using AI service"""
+def triage_message(symptoms, user):
+    """Score symptoms and get medical advice using the AI service's triage call"""
     try:
-        # Prepare user profile for AI
-        user_profile = {
-            'age': user.age,
-            'gender': user.gender,
-            'location_preference': user.location,
-            'allergies': None,  # These would come from profile if implemented
-            'chronic_conditions': None,
-            'current_medications': None
-        }
-        
-        advice = ai_service.get_medical_advice(' '.join(symptoms), user_profile)
-        
-        # Determine recommended action based on severity
-        if severity_score >= 70:
-            recommended_action = 'emergency'
-        elif severity_score >= 40:
-            recommended_action = 'doctor_visit'
-        else:
-            recommended_action = 'home_remedy'
-            
-        return advice, recommended_action
+        conversation = conversation_memory.context(f'flask:{user.id}')
+        triage = ai_service.triage(' '.join(symptoms), get_user_profile(user), conversation)
+        severity_score = int(triage['seriousness_score'])
+        return severity_score, triage['advice'], get_recommended_action(severity_score), triage
     except Exception as e:
         print(f"Error getting medical advice: {e}")
-        return "I'm having trouble processing your request right now. Please try again later.", 'home_remedy'
+        return 30, "I'm having trouble processing your request right now. Please try again later.", 'home_remedy', {}
 
 def get_hospital_specialization(symptoms):
     """Map symptoms to medical specializations"""
@@ -166,39 +284,54 @@ def get_hospital_specialization(symptoms):
 # Hospital Search and Recommendation
 def search_nearby_hospitals(location, radius=5000):
     """Search for nearby hospitals using Google Places API"""
+    gmaps = get_gmaps()
     if not gmaps:
         # Fallback hospital data
         return get_fallback_hospitals()
     
     try:
-        # Geocode the location
-        geocode_result = gmaps.geocode(location)
-        if not geocode_result:
+        # Geocode the location (cached on disk)
+        geocoded = geocode_cache.geocode(gmaps, location)
+        if not geocoded:
             return get_fallback_hospitals()
         
-        lat_lng = geocode_result[0]['geometry']['location']
+        lat_lng = {'lat': geocoded['lat'], 'lng': geocoded['lng']}
         
         # Search for hospitals
-        places_result = gmaps.places_nearby(
+        places_result = guarded_call('maps', lambda timeout: gmaps.places_nearby(
             location=lat_lng,
             radius=radius,
             type='hospital'
+        ), share=0.5, idempotent=True)
+        
+        places = places_result.get('results', [])[:10]  # Limit to 10 results
+        
+        # Fetch all details at once; slow or failed lookups come back as None
+        details = fetch_concurrently(get_hospital_details, [place['place_id'] for place in places])
+        
+        # Great-circle distances to all places in one call
+        distances = haversine_many(
+            lat_lng['lat'], lat_lng['lng'],
+            [place['geometry']['location']['lat'] for place in places],
+            [place['geometry']['location']['lng'] for place in places]
         )
         
         hospitals = []
-        for place in places_result.get('results', [])[:10]:  # Limit to 10 results
-            hospital_details = get_hospital_details(place['place_id'])
+        for place, hospital_details, distance in zip(places, details, distances):
+            hospital_details = hospital_details or {}
             
             hospital = {
                 'name': place['name'],
                 'rating': place.get('rating', 0),
                 'address': place.get('vicinity', ''),
-                'distance': calculate_distance(lat_lng, place['geometry']['location']),
+                'distance': round(float(distance), 1),
                 'place_id': place['place_id'],
                 'phone': hospital_details.get('phone', ''),
                 'website': hospital_details.get('website', ''),
                 'opening_hours': hospital_details.get('opening_hours', {}),
-                'is_open': hospital_details.get('is_open', None)
+                # Computed from cached hours; the nearby-search flag covers places without them
+                'is_open': (hospital_details.get('is_open') if hospital_details.get('is_open') is not None
+                            else place.get('opening_hours', {}).get('open_now'))
             }
             hospitals.append(hospital)
         
@@ -210,12 +343,13 @@ def search_nearby_hospitals(location, radius=5000):
 
 def get_hospital_details(place_id):
     """Get detailed information about a hospital"""
+    gmaps = get_gmaps()
     if not gmaps:
         return {}
     
     try:
-        details = gmaps.place(place_id, fields=['formatted_phone_number', 'website', 'opening_hours'])
-        result = details.get('result', {})
+        # Cached per field; open_now is evaluated locally from the cached hours
+        result = place_details_cache.details(gmaps, place_id, ['formatted_phone_number', 'website', 'opening_hours'])
         
         return {
             'phone': result.get('formatted_phone_number', ''),
@@ -227,13 +361,6 @@ def get_hospital_details(place_id):
         print(f"Error getting hospital details: {e}")
         return {}
 
-def calculate_distance(point1, point2):
-    """Calculate distance between two points (simplified)"""
-    # This is a simplified calculation - in production, use proper geospatial calculations
-    lat_diff = abs(point1['lat'] - point2['lat'])
-    lng_diff = abs(point1['lng'] - point2['lng'])
-    return round((lat_diff + lng_diff) * 111, 1)  # Rough km conversion
-
 def get_fallback_hospitals():
     """Fallback hospital data when API is not available"""
     return [
@@ -267,41 +394,8 @@ def get_fallback_hospitals():
     ]
 
 def recommend_hospitals(hospitals, symptoms, severity_score, specializations):
-    """Recommend best hospitals based on multiple factors"""
-    scored_hospitals = []
-    
-    for hospital in hospitals:
-        score = 0
-        
-        # Rating score (0-40 points)
-        score += hospital.get('rating', 0) * 8
-        
-        # Distance score (0-30 points, closer is better)
-        distance = hospital.get('distance', 10)
-        if distance <= 2:
-            score += 30
-        elif distance <= 5:
-            score += 20
-        elif distance <= 10:
-            score += 10
-        
-        # Availability score (0-20 points)
-        if hospital.get('is_open') is True:
-            score += 20
-        elif hospital.get('is_open') is None:
-            score += 10  # Unknown status
-        
-        # Emergency capability (0-10 points)
-        if severity_score >= 70:
-            if 'emergency' in hospital.get('name', '').lower():
-                score += 10
-        
-        hospital['recommendation_score'] = score
-        scored_hospitals.append(hospital)
-    
-    # Sort by score and return top 5
-    scored_hospitals.sort(key=lambda x: x['recommendation_score'], reverse=True)
-    return scored_hospitals[:5]
+    """Recommend best hospitals based on rating, distance, availability and specialization"""
+    return hospital_scorer.top_k(hospitals, severity_score, specializations, k=5)
 
 # Routes
 @app.route('/')
@@ -352,6 +446,8 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
+    # The next login loads a fresh snapshot
+    user_cache.invalidate(current_user.id)
     logout_user()
     return redirect(url_for('index'))
 
@@ -365,10 +461,58 @@ def chat():
 def profile():
     return render_template('profile.html', user=current_user)
 
+def encode_history_cursor(msg):
+    """Opaque keyset cursor for a chat message: its (timestamp, id)"""
+    return f"{msg.timestamp.isoformat()}_{msg.id}"
+
+def decode_history_cursor(cursor):
+    timestamp, _, msg_id = cursor.rpartition('_')
+    return datetime.fromisoformat(timestamp), int(msg_id)
+
 @app.route('/api/chat_history')
 @login_required
 def get_chat_history():
-    messages = ChatMessage.query.filter_by(user_id=current_user.id).order_by(ChatMessage.timestamp).all()
+    """One page of chat history, oldest first within the page.
+
+    With no cursor the newest page is returned; `before` pages back through
+    older messages and `after` fetches anything newer than a cursor.
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', CHAT_HISTORY_PAGE_SIZE)), 1), CHAT_HISTORY_MAX_PAGE_SIZE)
+        before = request.args.get('before')
+        after = request.args.get('after')
+        before_key = decode_history_cursor(before) if before else None
+        after_key = decode_history_cursor(after) if after else None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or cursor'}), 400
+    
+    # Messages are never edited, so the newest message id identifies every page's content
+    newest = db.session.query(ChatMessage.id).filter_by(user_id=current_user.id).order_by(
+        ChatMessage.timestamp.desc(), ChatMessage.id.desc()
+    ).first()
+    etag = hashlib.sha1(
+        f"{current_user.id}:{newest[0] if newest else 0}:{before}:{after}:{limit}".encode()
+    ).hexdigest()
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    key = tuple_(ChatMessage.timestamp, ChatMessage.id)
+    query = ChatMessage.query.filter_by(user_id=current_user.id)
+    if after_key:
+        # Newer than the cursor, walking forward
+        query = query.filter(key > after_key).order_by(ChatMessage.timestamp, ChatMessage.id)
+    else:
+        if before_key:
+            query = query.filter(key < before_key)
+        query = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+    
+    messages = query.options(joinedload(ChatMessage.response_blob)).limit(limit + 1).all()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not after_key:
+        messages.reverse()
     
     history = []
     for msg in messages:
@@ -377,10 +521,19 @@ def get_chat_history():
             'message': msg.message,
             'response': msg.response,
             'severity_score': msg.severity_score,
-            'timestamp': msg.timestamp.isoformat()
+            'timestamp': msg.timestamp.isoformat(),
+            'cursor': encode_history_cursor(msg)
         })
     
-    return jsonify(history)
+    response = jsonify({
+        'messages': history,
+        'has_more': has_more,
+        'before': history[0]['cursor'] if history else before,
+        'after': history[-1]['cursor'] if history else after
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/api/send_message', methods=['POST'])
 @login_required
@@ -391,45 +544,77 @@ def send_message():
     if not user_message:
         return jsonify({'error': 'Message cannot be empty'}), 400
     
-    # Extract symptoms and calculate severity
+    # Extract symptoms, calculate severity and generate medical advice; the
+    # model and Maps calls share one time budget
     symptoms = extract_symptoms(user_message)
-    severity_score = calculate_severity_score(symptoms, user_message)
-    
-    # Generate medical advice
-    advice, recommended_action = get_medical_advice(symptoms, severity_score, current_user)
-    
-    # Get hospital recommendations if needed
-    hospitals = []
-    if severity_score >= 40 or 'hospital' in user_message.lower():
-        user_location = current_user.location or "New York, NY"  # Default location
-        hospitals = search_nearby_hospitals(user_location)
+    with request_deadline():
+        severity_score, advice, recommended_action, triage = triage_message(symptoms, current_user)
+        if triage:
+            conversation_memory.record(f'flask:{current_user.id}', user_message, advice)
         
-        if hospitals:
-            specializations = get_hospital_specialization(symptoms)
-            hospitals = recommend_hospitals(hospitals, symptoms, severity_score, specializations)
-    
-    # Save to database
-    chat_message = ChatMessage(
-        user_id=current_user.id,
-        message=user_message,
-        response=advice,
-        severity_score=severity_score,
-        extracted_symptoms=json.dumps(symptoms)
-    )
-    db.session.add(chat_message)
-    
-    # Save consultation record
-    consultation = Consultation(
-        user_id=current_user.id,
-        symptoms=json.dumps(symptoms),
-        severity_score=severity_score,
-        diagnosis=advice,
-        recommended_action=recommended_action,
-        recommended_hospitals=json.dumps(hospitals)
-    )
-    db.session.add(consultation)
+        # Get hospital recommendations if needed
+        hospitals = []
+        if severity_score >= 40 or 'hospital' in user_message.lower() or triage.get('suggest_hospital'):
+            user_location = current_user.location or "New York, NY"  # Default location
+            hospitals = search_nearby_hospitals(user_location)
+            
+            if hospitals:
+                specializations = get_hospital_specialization(symptoms)
+                if triage.get('specialty') and triage['specialty'] not in specializations:
+                    specializations.insert(0, triage['specialty'])
+                hospitals = recommend_hospitals(hospitals, symptoms, severity_score, specializations)
     
-    db.session.commit()
+    if chat_writer.enabled:
+        # Queue the records; the background writer commits them with other requests' in one batch
+        now = datetime.utcnow()
+        advice_blob = blob_params(advice)
+        symptoms_blob = blob_params(json.dumps(symptoms))
+        chat_writer.submit([
+            (INSERT_TEXT_BLOB, advice_blob),
+            (INSERT_TEXT_BLOB, symptoms_blob),
+            (INSERT_CHAT_MESSAGE, {
+                'user_id': current_user.id,
+                'message': user_message,
+                'response_hash': advice_blob['hash'],
+                'severity_score': severity_score,
+                'extracted_symptoms_hash': symptoms_blob['hash'],
+                'timestamp': now
+            }),
+            (INSERT_CONSULTATION, {
+                'user_id': current_user.id,
+                'symptoms_hash': symptoms_blob['hash'],
+                'severity_score': severity_score,
+                'diagnosis_hash': advice_blob['hash'],
+                'recommended_action': recommended_action,
+                'recommended_hospitals': json.dumps(hospitals),
+                'timestamp': now
+            })
+        ])
+        message_id = None
+    else:
+        # Save to database
+        chat_message = ChatMessage(
+            user_id=current_user.id,
+            message=user_message,
+            response=advice,
+            severity_score=severity_score,
+            extracted_symptoms=json.dumps(symptoms)
+        )
+        db.session.add(chat_message)
+        
+        # Save consultation record
+        consultation = Consultation(
+            user_id=current_user.id,
+            symptoms=json.dumps(symptoms),
+            severity_score=severity_score,
+            diagnosis=advice,
+            recommended_action=recommended_action,
+            recommended_hospitals=json.dumps(hospitals)
+        )
+        db.session.add(consultation)
+        
+        db.session.commit()
+        message_id = chat_message.id
     
     return jsonify({
         'response': advice,
@@ -437,16 +622,37 @@ def send_message():
         'symptoms': symptoms,
         'recommended_action': recommended_action,
         'hospitals': hospitals,
-        'message_id': chat_message.id
+        'message_id': message_id
     })
 
+@app.route('/api/metrics/write_behind')
+@login_required
+def write_behind_metrics():
+    return jsonify(chat_writer.stats())
+
+@app.route('/api/metrics/llm')
+@login_required
+def llm_metrics():
+    return jsonify(llm_gateway.stats())
+
+@app.route('/api/metrics/resilience')
+@login_required
+def resilience_metrics():
+    return jsonify(resilience_stats())
+
+@app.route('/api/metrics/documents')
+@login_required
+def document_metrics():
+    return jsonify(document_worker.stats())
+
 @app.route('/api/hospitals')
 @login_required
 def get_hospitals():
     location = request.args.get('location', current_user.location or 'New York, NY')
     radius = int(request.args.get('radius', 5000))
     
-    hospitals = search_nearby_hospitals(location, radius)
+    with request_deadline():
+        hospitals = search_nearby_hospitals(location, radius)
     return jsonify(hospitals)
 
 @app.route('/api/upload_document', methods=['POST'])
@@ -460,48 +666,99 @@ def upload_document():
         return jsonify({'error': 'No file selected'}), 400
     
     if file:
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-        filename = timestamp + filename
-        
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        # Streamed to disk in chunks; identical files are stored once
+        try:
+            stored = upload_store.save(file.stream, file.filename)
+        except UploadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
         
         # Save to database
         document = MedicalDocument(
             user_id=current_user.id,
-            filename=filename,
+            filename=stored.path,
             original_filename=file.filename,
-            file_type=file.content_type,
-            file_size=os.path.getsize(file_path),
+            file_type=stored.mime_type,
+            file_size=stored.size,
+            content_hash=stored.hash,
             description=request.form.get('description', '')
         )
         db.session.add(document)
         db.session.commit()
         
+        # Previews and text are derived in the background
+        processing = document_worker.submit(
+            stored.hash, upload_store.path_for(stored.hash), stored.mime_type, upload_store.derived_dir(stored.hash)
+        )
+        if processing == 'done':
+            # Identical content was processed before; copy its artifacts now
+            sync_document_artifacts(stored.hash)
+        
         return jsonify({
             'success': True,
             'message': 'Document uploaded successfully',
-            'document_id': document.id
+            'document_id': document.id,
+            'processing': processing
         })
 
+@app.route('/api/documents/<int:document_id>/status')
+@login_required
+def document_status(document_id):
+    document = MedicalDocument.query.filter_by(id=document_id, user_id=current_user.id).first()
+    if not document:
+        return jsonify({'error': 'Document not found'}), 404
+    if document.artifacts:
+        return jsonify({'status': 'done', 'artifacts': json.loads(document.artifacts)})
+    job = sync_document_artifacts(document.content_hash) if document.content_hash else None
+    return jsonify(job or {'status': 'unprocessed'})
+
+@app.route('/api/documents/<int:document_id>/download')
+@login_required
+def download_document(document_id):
+    """Serve a stored document with Range and If-None-Match support.
+
+    The ETag is the content hash (documents uploaded before hashing get one
+    from the file's size and mtime). The file object goes to the WSGI
+    server's file wrapper, which sends it with sendfile where it can.
+    """
+    document = MedicalDocument.query.filter_by(id=document_id, user_id=current_user.id).first()
+    if not document:
+        return jsonify({'error': 'Document not found'}), 404
+    response = send_from_directory(
+        upload_store.root,
+        document.filename,
+        mimetype=document.file_type,
+        download_name=document.original_filename,
+        etag=document.content_hash or True,
+        conditional=True,
+        max_age=0
+    )
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 @app.route('/api/update_profile', methods=['POST'])
 @login_required
 def update_profile():
     data = request.get_json()
     
-    current_user.name = data.get('name', current_user.name)
-    current_user.age = data.get('age', current_user.age)
-    current_user.gender = data.get('gender', current_user.gender)
-    current_user.phone = data.get('phone', current_user.phone)
-    current_user.location = data.get('location', current_user.location)
-    current_user.insurance = data.get('insurance', current_user.insurance)
+    # current_user is a cached read-only snapshot; update the row itself
+    user = db.session.get(User, current_user.id)
+    user.name = data.get('name', user.name)
+    user.age = data.get('age', user.age)
+    user.gender = data.get('gender', user.gender)
+    user.phone = data.get('phone', user.phone)
+    user.location = data.get('location', user.location)
+    user.insurance = data.get('insurance', user.insurance)
     
     db.session.commit()
+    user_cache.invalidate(user.id)
     
     return jsonify({'success': True, 'message': 'Profile updated successfully'})
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        migrate(db.engine, 'flask')
+    # Resume documents queued before the last restart
+    document_worker.start()
     app.run(debug=True, host='0.0.0.0', port=5000)
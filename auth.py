@@ -5,11 +5,27 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from database import get_db, User
 from config import get_settings
+from identity_cache import IdentityCache
+from ttl_cache import TTLCache
+import time
+import asyncio
+import hashlib
 import requests
+from requests.adapters import HTTPAdapter
 
 settings = get_settings()
 security = HTTPBearer()
 
+# Decoded tokens (token hash -> user id) until they expire, and user snapshots by id
+token_cache = TTLCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE, ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+user_cache = IdentityCache()
+
+# Keep-alive connection pool for Google token checks, and verified userinfo by token hash
+google_http = requests.Session()
+google_http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=settings.GOOGLE_HTTP_POOL_SIZE))
+google_http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=settings.GOOGLE_HTTP_POOL_SIZE))
+google_token_cache = TTLCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE, ttl=settings.GOOGLE_TOKEN_CACHE_TTL_SECONDS)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -19,6 +35,10 @@ def create_access_token(data: dict):
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    user_id = token_cache.get(token_key)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id: int = payload.get("user_id")
@@ -27,6 +47,8 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials"
             )
+        # Only valid tokens are memoized, and never past their exp
+        token_cache.set(token_key, user_id, ttl=payload["exp"] - time.time() if "exp" in payload else None)
         return user_id
     except JWTError:
         raise HTTPException(
@@ -35,20 +57,49 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
 
 def get_current_user(user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+    """Read-only snapshot of the authenticated user, cached by id.
+
+    Code that changes a user must load the row itself and call
+    invalidate_user() after committing.
+    """
+    user = user_cache.get(user_id, lambda: db.query(User).filter(User.id == user_id).first())
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+def invalidate_user(user_id: int):
+    user_cache.invalidate(user_id)
+
 def verify_google_token(token: str):
-    """Verify Google OAuth token and return user info"""
+    """Verify Google OAuth token and return user info.
+
+    Uses a pooled keep-alive session with strict connect/read timeouts.
+    Verified userinfo is cached by token hash for GOOGLE_TOKEN_CACHE_TTL_SECONDS
+    (or less when Google reports the token expiring sooner). Failures are not
+    cached. GOOGLE_USERINFO_URL can point at a local stub server.
+    """
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    user_info = google_token_cache.get(token_key)
+    if user_info is not None:
+        return user_info
     try:
-        response = requests.get(
-            f"https://www.googleapis.com/oauth2/v1/userinfo?access_token={token}"
+        response = google_http.get(
+            settings.GOOGLE_USERINFO_URL,
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=(settings.GOOGLE_HTTP_CONNECT_TIMEOUT, settings.GOOGLE_HTTP_READ_TIMEOUT)
         )
         if response.status_code == 200:
-            return response.json()
+            user_info = response.json()
+            ttl = settings.GOOGLE_TOKEN_CACHE_TTL_SECONDS
+            if "expires_in" in user_info:
+                ttl = min(ttl, float(user_info["expires_in"]))
+            google_token_cache.set(token_key, user_info, ttl=ttl)
+            return user_info
         return None
     except Exception as e:
         print(f"Error verifying Google token: {e}")
         return None
+
+async def verify_google_token_async(token: str):
+    """verify_google_token without blocking the event loop"""
+    return await asyncio.to_thread(verify_google_token, token)
@@ -1,11 +1,13 @@
 import os
+import sys
+import asyncio
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
-import google.generativeai as genai
-import googlemaps
+from functools import lru_cache
 import os
 from datetime import datetime
 import uuid
@@ -17,6 +19,21 @@ import secrets
 import dotenv
 dotenv.load_dotenv()
 
+# Shared modules live in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sse import format_sse, SSE_HEADERS
+from triage_engine import triage_engine
+from fanout import fetch_concurrently
+from geocode_cache import geocode_cache
+from place_details_cache import place_details_cache
+from geodesy import haversine_km
+from chat_store import chat_store
+from llm_gateway import llm_gateway
+from resilience import (
+    MAPS_CLIENT_OPTIONS, UPSTREAM_TIMEOUTS, bounded_stream, breakers, guarded_call, request_deadline,
+    resilience_stats, stage_timeout
+)
+
 app = FastAPI(title="Medi Care API", version="1.0.0")
 
 # CORS configuration
@@ -28,13 +45,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure Gemini AI
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-2.0-flash')
-
-# Initialize Google Maps client
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
-gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY) if GOOGLE_MAPS_API_KEY else None
+# Bearer token for the /api/metrics endpoints; they are disabled while it is unset
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Clients are created on first use; google.generativeai alone takes about a second to import
+GEMINI_MODEL = 'gemini-2.0-flash'
+# Share of the remaining request budget a model call may use; the rest is left for the hospital lookup
+GEMINI_BUDGET_SHARE = 0.8
+
+@lru_cache(maxsize=None)
+def get_model():
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+def generate(prompt: str):
+    """generate_content through the shared gateway, bounded by the request deadline and circuit breaker"""
+    return guarded_call('gemini', lambda timeout: llm_gateway.call(
+        (GEMINI_MODEL, prompt, None),
+        lambda: get_model().generate_content(prompt, request_options={'timeout': timeout})
+    ), share=GEMINI_BUDGET_SHARE)
+
+@lru_cache(maxsize=None)
+def get_gmaps():
+    if not GOOGLE_MAPS_API_KEY:
+        return None
+    import googlemaps
+    return googlemaps.Client(key=GOOGLE_MAPS_API_KEY, **MAPS_CLIENT_OPTIONS)
 
 # Pydantic models
 class HospitalSearchRequest(BaseModel):
@@ -102,8 +140,15 @@ def generate_token() -> str:
     """Generate a simple token for authentication"""
     return secrets.token_urlsafe(32)
 
+def require_metrics_token(authorization: Optional[str] = Header(None)):
+    """Admin check for the metrics endpoints: Authorization: Bearer <METRICS_TOKEN>"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer' or not secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
 # In-memory storage for demo
-chat_history = {}  # Store chat history per user: {user_id: [messages]}
 users_db = {}  # Store user data: {email: {id, name, email, password_hash, age, gender, location}}
 current_user = {
     "id": "user123",
@@ -111,6 +156,11 @@ current_user = {
     "email": "adithyen@gmail.com"
 }
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Keep in-memory chat history across restarts
+    chat_store.close()
+
 # API Routes
 @app.get("/")
 async def root():
@@ -205,15 +255,16 @@ async def get_user():
 def get_nearby_hospitals_for_chat(latitude: float, longitude: float, limit: int = 3):
     """Get nearby hospitals for chat recommendations"""
     try:
+        gmaps = get_gmaps()
         if not gmaps:
             return []
         
         # Search for hospitals near the location
-        places_result = gmaps.places_nearby(
+        places_result = guarded_call('maps', lambda timeout: gmaps.places_nearby(
             location=(latitude, longitude),
             radius=10000,  # 10km radius
             type='hospital'
-        )
+        ), idempotent=True)
         
         hospitals = []
         for place in places_result.get('results', [])[:limit]:
@@ -233,192 +284,197 @@ def get_nearby_hospitals_for_chat(latitude: float, longitude: float, limit: int
     except Exception as e:
         return []
 
-def analyze_symptoms_with_gemini(symptoms: str, user_location: dict = None):
-    """Analyze symptoms using Gemini AI and provide medical advice"""
-    try:
-        # Enhanced medical AI doctor prompt
-        location_context = ""
-        if user_location:
-            location_context = f"The patient is located at coordinates: {user_location['latitude']}, {user_location['longitude']}. Include nearby hospital recommendations in your response."
-        else:
-            location_context = "Ask the patient for their location to provide nearby hospital recommendations."
-        
-        # Check if user is asking about hospitals in a specific location
-        symptoms_lower = symptoms.lower()
-        if any(word in symptoms_lower for word in ['hospital', 'hospitals']):
-            # Define hospital data for major cities
-            city_hospitals = {
-                'coimbatore': {
-                    'name': 'Coimbatore',
-                    'hospitals': [
-                        "**Kovai Medical Center (KMCH)**\n   📍 Avinashi Road, Coimbatore\n   📞 0422-4324324\n   ⭐ Multi-specialty hospital with 24/7 emergency",
-                        "**PSG Hospitals**\n   📍 Peelamedu, Coimbatore\n   📞 0422-2570170\n   ⭐ Teaching hospital with all departments",
-                        "**Ganga Hospital**\n   📍 313, Mettupalayam Road, Coimbatore\n   📞 0422-2485000\n   ⭐ Specialized in orthopedics and trauma",
-                        "**Sri Ramakrishna Hospital**\n   📍 395, Sidhapudur, Coimbatore\n   📞 0422-2320100\n   ⭐ Multi-specialty with advanced facilities"
-                    ]
-                },
-                'chennai': {
-                    'name': 'Chennai',
-                    'hospitals': [
-                        "**Apollo Hospitals**\n   📍 Greams Road, Chennai\n   📞 044-2829 3333\n   ⭐ Leading multi-specialty hospital",
-                        "**Fortis Malar Hospital**\n   📍 Adyar, Chennai\n   📞 044-4289 2222\n   ⭐ Advanced cardiac and critical care",
-                        "**MIOT International**\n   📍 Manapakkam, Chennai\n   📞 044-4200 1000\n   ⭐ Multi-organ transplant center",
-                        "**Stanley Medical College**\n   📍 Old Jail Road, Chennai\n   📞 044-2835 3221\n   ⭐ Government teaching hospital"
-                    ]
-                },
-                'bangalore': {
-                    'name': 'Bangalore',
-                    'hospitals': [
-                        "**Manipal Hospital**\n   📍 HAL Airport Road, Bangalore\n   📞 080-2502 4444\n   ⭐ Multi-specialty tertiary care",
-                        "**Fortis Hospital**\n   📍 Bannerghatta Road, Bangalore\n   📞 080-6621 4444\n   ⭐ Advanced medical care",
-                        "**Narayana Health**\n   📍 Bommasandra, Bangalore\n   📞 080-7122 7979\n   ⭐ Cardiac and multi-specialty",
-                        "**St. John's Medical College**\n   📍 Koramangala, Bangalore\n   📞 080-4963 3001\n   ⭐ Teaching hospital"
-                    ]
-                },
-                'mumbai': {
-                    'name': 'Mumbai',
-                    'hospitals': [
-                        "**Kokilaben Dhirubhai Ambani Hospital**\n   📍 Andheri West, Mumbai\n   📞 022-4269 6969\n   ⭐ Multi-specialty tertiary care",
-                        "**Lilavati Hospital**\n   📍 Bandra West, Mumbai\n   📞 022-2640 4040\n   ⭐ Multi-specialty hospital",
-                        "**Breach Candy Hospital**\n   📍 Breach Candy, Mumbai\n   📞 022-2367 8888\n   ⭐ Premium healthcare services",
-                        "**Tata Memorial Hospital**\n   📍 Parel, Mumbai\n   📞 022-2417 7000\n   ⭐ Cancer treatment center"
-                    ]
-                },
-                'delhi': {
-                    'name': 'Delhi',
-                    'hospitals': [
-                        "**AIIMS Delhi**\n   📍 Ansari Nagar, New Delhi\n   📞 011-2658 8500\n   ⭐ Premier medical institute",
-                        "**Max Super Speciality Hospital**\n   📍 Saket, New Delhi\n   📞 011-2651 5050\n   ⭐ Multi-specialty care",
-                        "**Fortis Escorts Heart Institute**\n   📍 Okhla Road, New Delhi\n   📞 011-4713 5000\n   ⭐ Cardiac specialty hospital",
-                        "**Apollo Hospital**\n   📍 Sarita Vihar, New Delhi\n   📞 011-2692 5858\n   ⭐ Multi-specialty hospital"
-                    ]
-                }
+def find_city_hospitals_reply(symptoms: str, user_location: dict = None):
+    """Return a canned hospital list reply for hospital questions, or None for symptom messages"""
+    # Check if user is asking about hospitals in a specific location
+    symptoms_lower = symptoms.lower()
+    if any(word in symptoms_lower for word in ['hospital', 'hospitals']):
+        # Define hospital data for major cities
+        city_hospitals = {
+            'coimbatore': {
+                'name': 'Coimbatore',
+                'hospitals': [
+                    "**Kovai Medical Center (KMCH)**\n   📍 Avinashi Road, Coimbatore\n   📞 0422-4324324\n   ⭐ Multi-specialty hospital with 24/7 emergency",
+                    "**PSG Hospitals**\n   📍 Peelamedu, Coimbatore\n   📞 0422-2570170\n   ⭐ Teaching hospital with all departments",
+                    "**Ganga Hospital**\n   📍 313, Mettupalayam Road, Coimbatore\n   📞 0422-2485000\n   ⭐ Specialized in orthopedics and trauma",
+                    "**Sri Ramakrishna Hospital**\n   📍 395, Sidhapudur, Coimbatore\n   📞 0422-2320100\n   ⭐ Multi-specialty with advanced facilities"
+                ]
+            },
+            'chennai': {
+                'name': 'Chennai',
+                'hospitals': [
+                    "**Apollo Hospitals**\n   📍 Greams Road, Chennai\n   📞 044-2829 3333\n   ⭐ Leading multi-specialty hospital",
+                    "**Fortis Malar Hospital**\n   📍 Adyar, Chennai\n   📞 044-4289 2222\n   ⭐ Advanced cardiac and critical care",
+                    "**MIOT International**\n   📍 Manapakkam, Chennai\n   📞 044-4200 1000\n   ⭐ Multi-organ transplant center",
+                    "**Stanley Medical College**\n   📍 Old Jail Road, Chennai\n   📞 044-2835 3221\n   ⭐ Government teaching hospital"
+                ]
+            },
+            'bangalore': {
+                'name': 'Bangalore',
+                'hospitals': [
+                    "**Manipal Hospital**\n   📍 HAL Airport Road, Bangalore\n   📞 080-2502 4444\n   ⭐ Multi-specialty tertiary care",
+                    "**Fortis Hospital**\n   📍 Bannerghatta Road, Bangalore\n   📞 080-6621 4444\n   ⭐ Advanced medical care",
+                    "**Narayana Health**\n   📍 Bommasandra, Bangalore\n   📞 080-7122 7979\n   ⭐ Cardiac and multi-specialty",
+                    "**St. John's Medical College**\n   📍 Koramangala, Bangalore\n   📞 080-4963 3001\n   ⭐ Teaching hospital"
+                ]
+            },
+            'mumbai': {
+                'name': 'Mumbai',
+                'hospitals': [
+                    "**Kokilaben Dhirubhai Ambani Hospital**\n   📍 Andheri West, Mumbai\n   📞 022-4269 6969\n   ⭐ Multi-specialty tertiary care",
+                    "**Lilavati Hospital**\n   📍 Bandra West, Mumbai\n   📞 022-2640 4040\n   ⭐ Multi-specialty hospital",
+                    "**Breach Candy Hospital**\n   📍 Breach Candy, Mumbai\n   📞 022-2367 8888\n   ⭐ Premium healthcare services",
+                    "**Tata Memorial Hospital**\n   📍 Parel, Mumbai\n   📞 022-2417 7000\n   ⭐ Cancer treatment center"
+                ]
+            },
+            'delhi': {
+                'name': 'Delhi',
+                'hospitals': [
+                    "**AIIMS Delhi**\n   📍 Ansari Nagar, New Delhi\n   📞 011-2658 8500\n   ⭐ Premier medical institute",
+                    "**Max Super Speciality Hospital**\n   📍 Saket, New Delhi\n   📞 011-2651 5050\n   ⭐ Multi-specialty care",
+                    "**Fortis Escorts Heart Institute**\n   📍 Okhla Road, New Delhi\n   📞 011-4713 5000\n   ⭐ Cardiac specialty hospital",
+                    "**Apollo Hospital**\n   📍 Sarita Vihar, New Delhi\n   📞 011-2692 5858\n   ⭐ Multi-specialty hospital"
+                ]
             }
+        }
+        
+        # Check if specific city mentioned
+        city_found = None
+        for city_key in city_hospitals.keys():
+            if city_key in symptoms_lower:
+                city_found = city_key
+                break
+        
+        # If user location provided, try to determine city from coordinates
+        if not city_found and user_location:
+            # Simple coordinate-based city detection (you can enhance this)
+            lat, lng = user_location['latitude'], user_location['longitude']
+            if 11.0 <= lat <= 11.1 and 76.9 <= lng <= 77.1:  # Coimbatore approx
+                city_found = 'coimbatore'
+            elif 13.0 <= lat <= 13.2 and 80.1 <= lng <= 80.3:  # Chennai approx
+                city_found = 'chennai'
+            elif 12.9 <= lat <= 13.0 and 77.5 <= lng <= 77.7:  # Bangalore approx
+                city_found = 'bangalore'
+            elif 19.0 <= lat <= 19.3 and 72.7 <= lng <= 73.0:  # Mumbai approx
+                city_found = 'mumbai'
+            elif 28.4 <= lat <= 28.7 and 77.0 <= lng <= 77.4:  # Delhi approx
+                city_found = 'delhi'
+        
+        if city_found and city_found in city_hospitals:
+            city_data = city_hospitals[city_found]
+            hospital_list = '\n\n'.join([f"{i+1}. {hospital}" for i, hospital in enumerate(city_data['hospitals'])])
             
-            # Check if specific city mentioned
-            city_found = None
-            for city_key in city_hospitals.keys():
-                if city_key in symptoms_lower:
-                    city_found = city_key
-                    break
-            
-            # If user location provided, try to determine city from coordinates
-            if not city_found and user_location:
-                # Simple coordinate-based city detection (you can enhance this)
-                lat, lng = user_location['latitude'], user_location['longitude']
-                if 11.0 <= lat <= 11.1 and 76.9 <= lng <= 77.1:  # Coimbatore approx
-                    city_found = 'coimbatore'
-                elif 13.0 <= lat <= 13.2 and 80.1 <= lng <= 80.3:  # Chennai approx
-                    city_found = 'chennai'
-                elif 12.9 <= lat <= 13.0 and 77.5 <= lng <= 77.7:  # Bangalore approx
-                    city_found = 'bangalore'
-                elif 19.0 <= lat <= 19.3 and 72.7 <= lng <= 73.0:  # Mumbai approx
-                    city_found = 'mumbai'
-                elif 28.4 <= lat <= 28.7 and 77.0 <= lng <= 77.4:  # Delhi approx
-                    city_found = 'delhi'
-            
-            if city_found and city_found in city_hospitals:
-                city_data = city_hospitals[city_found]
-                hospital_list = '\n\n'.join([f"{i+1}. {hospital}" for i, hospital in enumerate(city_data['hospitals'])])
-                
-                return {
-                    'response': f"""Top hospitals in {city_data['name']}:
+            return {
+                'response': f"""Top hospitals in {city_data['name']}:
 
 {hospital_list}
 
 Note: This is AI guidance. Consult a healthcare provider.""",
-                    'severity_score': 30,
-                    'hospitals': [],
-                    'timestamp': datetime.now().strftime("%I:%M %p")
-                }
-            
-            # If no specific city found, ask for location
-            if not city_found:
-                return {
-                    'response': """I can help you find hospitals! Please specify your city (Coimbatore, Chennai, Bangalore, Mumbai, Delhi) or share your location for personalized recommendations.
+                'severity_score': 30,
+                'hospitals': [],
+                'timestamp': datetime.now().strftime("%I:%M %p")
+            }
+        
+        # If no specific city found, ask for location
+        if not city_found:
+            return {
+                'response': """I can help you find hospitals! Please specify your city (Coimbatore, Chennai, Bangalore, Mumbai, Delhi) or share your location for personalized recommendations.
 
 Note: This is AI guidance. Consult a healthcare provider.""",
-                    'severity_score': 30,
-                    'hospitals': [],
-                    'timestamp': datetime.now().strftime("%I:%M %p")
-                }
-        
-        prompt = f"""
-        You are Dr. MediCare AI. A patient said: "{symptoms}"
-        
-        Keep responses SHORT (2-3 sentences max):
-        
-        1. If symptoms: Brief advice + 1 question
-        2. If hospitals: Ask for specific location
-        3. Be direct and helpful
-        
-        {location_context}
-        
-        End with: "Note: This is AI guidance. Consult a healthcare provider."
-        """
-        
-        response = model.generate_content(prompt)
-        ai_response = response.text
-        
-        # Enhanced severity score extraction
-        severity_score = 30  # default
-        symptoms_lower = symptoms.lower()
-        
-        # Emergency symptoms (80-100)
-        if any(word in symptoms_lower for word in ['chest pain', 'difficulty breathing', 'shortness of breath', 'severe headache', 'stroke', 'heart attack', 'unconscious', 'bleeding heavily']):
-            severity_score = 90
-        elif any(word in symptoms_lower for word in ['severe', 'emergency', 'can\'t breathe', 'crushing pain', 'sudden onset']):
-            severity_score = 80
-        # High priority symptoms (60-79)
-        elif any(word in symptoms_lower for word in ['high fever', 'vomiting blood', 'severe pain', 'confusion', 'seizure']):
-            severity_score = 70
-        elif any(word in symptoms_lower for word in ['fever', 'vomiting', 'severe nausea', 'intense pain']):
-            severity_score = 60
-        # Moderate symptoms (40-59)
-        elif any(word in symptoms_lower for word in ['pain', 'nausea', 'headache', 'dizziness', 'fatigue']):
-            severity_score = 50
-        elif any(word in symptoms_lower for word in ['cough', 'cold', 'sore throat', 'runny nose']):
-            severity_score = 40
-        # Mild symptoms (20-39)
-        elif any(word in symptoms_lower for word in ['mild', 'slight', 'minor', 'little']):
-            severity_score = 25
-            
-        # Get nearby hospitals if location provided
-        hospitals = []
-        if user_location and 'latitude' in user_location and 'longitude' in user_location:
-            hospitals = get_nearby_hospitals_for_chat(
-                user_location['latitude'], 
-                user_location['longitude']
+                'severity_score': 30,
+                'hospitals': [],
+                'timestamp': datetime.now().strftime("%I:%M %p")
+            }
+    
+    return None
+
+def build_chat_prompt(symptoms: str, user_location: dict = None) -> str:
+    """Build the Dr. MediCare AI prompt"""
+    # Enhanced medical AI doctor prompt
+    location_context = ""
+    if user_location:
+        location_context = f"The patient is located at coordinates: {user_location['latitude']}, {user_location['longitude']}. Include nearby hospital recommendations in your response."
+    else:
+        location_context = "Ask the patient for their location to provide nearby hospital recommendations."
+    
+    return f"""
+    You are Dr. MediCare AI. A patient said: "{symptoms}"
+    
+    Keep responses SHORT (2-3 sentences max):
+    
+    1. If symptoms: Brief advice + 1 question
+    2. If hospitals: Ask for specific location
+    3. Be direct and helpful
+    
+    {location_context}
+    
+    End with: "Note: This is AI guidance. Consult a healthcare provider."
+    """
+
+def score_symptom_severity(symptoms: str) -> int:
+    """Severity score (0-100) from the local rule-based triage engine"""
+    return triage_engine.score(symptoms).score
+
+def format_hospital_text(hospitals: List[Dict]) -> str:
+    """Hospital recommendations appended to the reply when location is provided"""
+    if not hospitals:
+        return ""
+    hospital_text = "\n\nNearby hospitals:\n"
+    for i, hospital in enumerate(hospitals[:3], 1):  # Limit to 3 hospitals
+        hospital_text += f"{i}. {hospital['name']} ({hospital['distance']:.1f}km)\n"
+        hospital_text += f"   {hospital['address']}\n"
+    return hospital_text
+
+def has_coordinates(user_location: dict = None) -> bool:
+    return bool(user_location and 'latitude' in user_location and 'longitude' in user_location)
+
+def fallback_chat_result() -> dict:
+    """Canned reply used when the AI call fails"""
+    return {
+        'response': f"""Hello! I'm Dr. MediCare AI. How are you feeling today? What's bringing you here - are you experiencing any symptoms or health concerns I can help you with?
+
+If you'd like me to recommend hospitals in your area, just let me know your location and I'll find some good options nearby.
+
+Please note: This is AI-generated medical guidance for informational purposes only. Always consult a licensed healthcare provider for proper medical evaluation.""",
+        'severity_score': 30,
+        'hospitals': [],
+        'timestamp': datetime.now().strftime("%I:%M %p")
+    }
+
+async def analyze_symptoms_with_gemini(symptoms: str, user_location: dict = None):
+    """Analyze symptoms using Gemini AI and provide medical advice"""
+    try:
+        # Check if user is asking about hospitals in a specific location
+        city_reply = find_city_hospitals_reply(symptoms, user_location)
+        if city_reply:
+            return city_reply
+        
+        prompt = build_chat_prompt(symptoms, user_location)
+        
+        # Run the model call and the hospital lookup concurrently, off the event loop
+        model_call = asyncio.to_thread(generate, prompt)
+        if has_coordinates(user_location):
+            response, hospitals = await asyncio.gather(
+                model_call,
+                asyncio.to_thread(
+                    get_nearby_hospitals_for_chat,
+                    user_location['latitude'],
+                    user_location['longitude']
+                )
             )
-            
-            # Add hospital recommendations when location is provided
-            if hospitals:
-                hospital_text = "\n\nNearby hospitals:\n"
-                for i, hospital in enumerate(hospitals[:3], 1):  # Limit to 3 hospitals
-                    hospital_text += f"{i}. {hospital['name']} ({hospital['distance']:.1f}km)\n"
-                    hospital_text += f"   {hospital['address']}\n"
-                
-                ai_response += hospital_text
+        else:
+            response, hospitals = await model_call, []
         
         return {
-            'response': ai_response,
-            'severity_score': severity_score,
+            'response': response.text + format_hospital_text(hospitals),
+            'severity_score': score_symptom_severity(symptoms),
             'hospitals': hospitals,
             'timestamp': datetime.now().strftime("%I:%M %p")
         }
         
     except Exception as e:
         # Fallback response
-        return {
-            'response': f"""Hello! I'm Dr. MediCare AI. How are you feeling today? What's bringing you here - are you experiencing any symptoms or health concerns I can help you with?
-
-If you'd like me to recommend hospitals in your area, just let me know your location and I'll find some good options nearby.
-
-Please note: This is AI-generated medical guidance for informational purposes only. Always consult a licensed healthcare provider for proper medical evaluation.""",
-            'severity_score': 30,
-            'hospitals': [],
-            'timestamp': datetime.now().strftime("%I:%M %p")
-        }
+        return fallback_chat_result()
 
 class User(BaseModel):
     id: str
@@ -478,41 +534,132 @@ HARDCODED_HOSPITALS = [
 ]
 
 @app.get("/api/chat/history/{user_id}")
-async def get_chat_history(user_id: str):
-    """Get chat history for a specific user"""
-    user_chats = chat_history.get(user_id, [])
-    return {"history": user_chats}
+async def get_chat_history(user_id: str, limit: int = 50, before: Optional[datetime] = None):
+    """Get chat history for a specific user, oldest first.
+
+    Returns the newest `limit` chats, or the newest ones older than `before`
+    (a chat timestamp) to page further back.
+    """
+    limit = min(max(limit, 1), 200)
+    # One extra (older) chat tells whether there is another page
+    user_chats = await asyncio.to_thread(chat_store.history, user_id, limit + 1, before)
+    has_more = len(user_chats) > limit
+    return {"history": user_chats[-limit:], "has_more": has_more}
+
+def record_chat(request: ChatRequest, ai_result: dict) -> dict:
+    """Build the chat record for an AI result and store it in the user's history.
+
+    Blocking: storing may spill older chats to SQLite, so async callers run it
+    in a thread.
+    """
+    # Create chat response with proper timestamp
+    current_time = datetime.now()
+    chat_response = {
+        "id": f"chat_{current_time.strftime('%Y%m%d_%H%M%S')}",
+        "user_id": request.user_id,
+        "message": request.message,
+        "response": ai_result['response'],
+        "severity_score": ai_result['severity_score'],
+        "timestamp": current_time.isoformat(),
+        "hospitals": ai_result.get('hospitals', [])
+    }
+    
+    # Recent chats stay in memory, older ones are kept on disk
+    chat_store.append(chat_response)
+    
+    return chat_response
 
 @app.post("/api/chat/send")
 async def send_chat_message(request: ChatRequest):
     """Send a chat message and get AI response"""
     try:
-        # Get AI response using Gemini
-        ai_result = analyze_symptoms_with_gemini(request.message, request.user_location)
-        
-        # Create chat response with proper timestamp
-        current_time = datetime.now()
-        chat_response = {
-            "id": f"chat_{current_time.strftime('%Y%m%d_%H%M%S')}",
-            "user_id": request.user_id,
-            "message": request.message,
-            "response": ai_result['response'],
-            "severity_score": ai_result['severity_score'],
-            "timestamp": current_time.isoformat(),
-            "hospitals": ai_result.get('hospitals', [])
-        }
-        
-        # Store chat in memory (persistent across sessions)
-        user_id = request.user_id
-        if user_id not in chat_history:
-            chat_history[user_id] = []
-        chat_history[user_id].append(chat_response)
-        
-        return chat_response
+        # Get AI response using Gemini, within the request's time budget
+        with request_deadline():
+            ai_result = await analyze_symptoms_with_gemini(request.message, request.user_location)
+        return await asyncio.to_thread(record_chat, request, ai_result)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing chat message: {str(e)}")
-        return chat_response
+
+@app.post("/api/chat/stream")
+async def stream_chat_message(request: ChatRequest):
+    """Send a chat message and stream the AI response as Server-Sent Events.
+
+    `token` events carry the reply as Gemini generates it, followed by `score`
+    and `hospitals` events and a final `done` event holding the same record
+    /api/chat/send returns and stores.
+    """
+    async def events():
+        ai_result = find_city_hospitals_reply(request.message, request.user_location)
+        if ai_result:
+            yield format_sse("token", {"text": ai_result['response']})
+        else:
+            with request_deadline():
+                # Look up hospitals while the reply is being generated
+                hospitals_task = None
+                if has_coordinates(request.user_location):
+                    hospitals_task = asyncio.create_task(asyncio.to_thread(
+                        get_nearby_hospitals_for_chat,
+                        request.user_location['latitude'],
+                        request.user_location['longitude']
+                    ))
+                breaker = breakers['gemini']
+                try:
+                    parts = []
+                    prompt = build_chat_prompt(request.message, request.user_location)
+                    breaker.allow()
+                    model = await asyncio.to_thread(get_model)
+                    timeout = stage_timeout(UPSTREAM_TIMEOUTS['gemini'], GEMINI_BUDGET_SHARE)
+                    response = model.generate_content_async(
+                        prompt, stream=True, request_options={'timeout': timeout}
+                    )
+                    # The gateway slot is held while Gemini generates, not while the client reads
+                    async for chunk in llm_gateway.async_stream(bounded_stream('gemini', response, timeout)):
+                        if chunk.text:
+                            parts.append(chunk.text)
+                            yield format_sse("token", {"text": chunk.text})
+                    breaker.record_success()
+                    
+                    hospitals = await hospitals_task if hospitals_task else []
+                    hospital_text = format_hospital_text(hospitals)
+                    if hospital_text:
+                        parts.append(hospital_text)
+                        yield format_sse("token", {"text": hospital_text})
+                    
+                    ai_result = {
+                        'response': ''.join(parts),
+                        'severity_score': score_symptom_severity(request.message),
+                        'hospitals': hospitals,
+                        'timestamp': datetime.now().strftime("%I:%M %p")
+                    }
+                except (GeneratorExit, asyncio.CancelledError):
+                    # The client went away mid-stream
+                    breaker.release()
+                    if hospitals_task:
+                        hospitals_task.cancel()
+                    raise
+                except Exception as e:
+                    # Fallback response; the done event carries the text to show
+                    breaker.record(e)
+                    if hospitals_task:
+                        hospitals_task.cancel()
+                    ai_result = fallback_chat_result()
+        
+        yield format_sse("score", {"severity_score": ai_result['severity_score']})
+        yield format_sse("hospitals", {"hospitals": ai_result['hospitals']})
+        yield format_sse("done", await asyncio.to_thread(record_chat, request, ai_result))
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/api/metrics/llm", dependencies=[Depends(require_metrics_token)])
+async def llm_metrics():
+    """Gemini gateway concurrency limit, queue and coalescing counters"""
+    return llm_gateway.stats()
+
+@app.get("/api/metrics/resilience", dependencies=[Depends(require_metrics_token)])
+async def resilience_metrics():
+    """Circuit breaker state per upstream (Gemini, Google Maps)"""
+    return resilience_stats()
 
 @app.get("/api/hospitals")
 async def get_hospitals():
@@ -530,45 +677,46 @@ async def search_hospitals(request: HospitalSearchRequest):
 
 def calculate_distance(lat1, lng1, lat2, lng2):
     """Calculate distance between two points using Haversine formula"""
-    R = 6371  # Earth's radius in km
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lng = math.radians(lng2 - lng1)
-    
-    a = (math.sin(delta_lat / 2) * math.sin(delta_lat / 2) +
-         math.cos(lat1_rad) * math.cos(lat2_rad) *
-         math.sin(delta_lng / 2) * math.sin(delta_lng / 2))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    distance = R * c
-    return round(distance, 1)
+    return round(haversine_km(lat1, lng1, lat2, lng2), 1)
+
+def get_place_details(place_id: str) -> dict:
+    return place_details_cache.details(get_gmaps(), place_id, [
+        'name', 'formatted_address', 'formatted_phone_number',
+        'rating', 'opening_hours', 'geometry'
+    ])
 
 @app.post("/api/hospitals/nearby")
 async def find_nearby_hospitals(request: LocationRequest):
     """Find hospitals near given coordinates using Google Maps API"""
+    gmaps = get_gmaps()
     if not gmaps:
         raise HTTPException(status_code=500, detail="Google Maps API not configured")
     
     try:
-        # Search for hospitals near the given location
-        places_result = gmaps.places_nearby(
-            location=(request.latitude, request.longitude),
-            radius=5000,  # 5km radius
-            type='hospital'
-        )
+        with request_deadline():
+            # Search for hospitals near the given location
+            places_result = await asyncio.to_thread(guarded_call, 'maps', lambda timeout: gmaps.places_nearby(
+                location=(request.latitude, request.longitude),
+                radius=5000,  # 5km radius
+                type='hospital'
+            ), share=0.5, idempotent=True)
+            
+            places = places_result.get('results', [])[:2]  # Get top 2 results
+            
+            # Get place details for more information, all places at once
+            place_details = await asyncio.to_thread(
+                fetch_concurrently, get_place_details, [place['place_id'] for place in places]
+            )
         
         hospitals = []
-        for place in places_result.get('results', [])[:2]:  # Get top 2 results
-            # Get place details for more information
-            place_details = gmaps.place(place['place_id'], fields=[
-                'name', 'formatted_address', 'formatted_phone_number', 
-                'rating', 'opening_hours', 'geometry'
-            ])
-            
-            details = place_details.get('result', {})
-            location = details.get('geometry', {}).get('location', {})
+        for place, details in zip(places, place_details):
+            # Fall back to the nearby-search data if details failed or timed out
+            details = details or {}
+            location = details.get('geometry', place.get('geometry', {})).get('location', {})
+            # The locally computed status is unknown without periods or a UTC offset
+            is_open = details.get('opening_hours', {}).get('open_now')
+            if is_open is None:
+                is_open = place.get('opening_hours', {}).get('open_now', True)
             
             hospital = {
                 "id": place['place_id'],
@@ -578,7 +726,7 @@ async def find_nearby_hospitals(request: LocationRequest):
                 "rating": details.get('rating', place.get('rating', 4.0)),
                 "distance": f"{calculate_distance(request.latitude, request.longitude, location.get('lat', 0), location.get('lng', 0))} km",
                 "specialties": ["General Medicine", "Emergency Care"],
-                "is_open": details.get('opening_hours', {}).get('open_now', True)
+                "is_open": is_open
             }
             hospitals.append(hospital)
         
@@ -613,21 +761,22 @@ async def find_nearby_hospitals(request: LocationRequest):
 @app.post("/api/hospitals/by-address")
 async def find_hospitals_by_address(request: AddressRequest):
     """Find hospitals near given address using Google Maps API"""
+    gmaps = get_gmaps()
     if not gmaps:
         raise HTTPException(status_code=500, detail="Google Maps API not configured")
     
     try:
-        # Geocode the address to get coordinates
-        geocode_result = gmaps.geocode(request.address)
-        if not geocode_result:
-            raise HTTPException(status_code=400, detail="Address not found")
-        
-        location = geocode_result[0]['geometry']['location']
-        lat, lng = location['lat'], location['lng']
-        
-        # Use the coordinates to find nearby hospitals
-        location_request = LocationRequest(latitude=lat, longitude=lng)
-        return await find_nearby_hospitals(location_request)
+        with request_deadline():
+            # Geocode the address to get coordinates (cached on disk)
+            location = await asyncio.to_thread(geocode_cache.geocode, gmaps, request.address)
+            if not location:
+                raise HTTPException(status_code=400, detail="Address not found")
+            
+            lat, lng = location['lat'], location['lng']
+            
+            # Use the coordinates to find nearby hospitals
+            location_request = LocationRequest(latitude=lat, longitude=lng)
+            return await find_nearby_hospitals(location_request)
         
     except Exception as e:
         # Fallback to simulated data
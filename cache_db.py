@@ -0,0 +1,19 @@
+import os
+import sqlite3
+from config import get_settings
+
+settings = get_settings()
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def get_cache_db_path() -> str:
+    """SQLite file shared by the Flask app, main.py and backend/main.py for
+    upstream caches; it lives next to the app DB unless CACHE_DB_PATH is set"""
+    return settings.CACHE_DB_PATH or os.path.join(PROJECT_DIR, 'mediguide_cache.db')
+
+def connect(path: str = None) -> sqlite3.Connection:
+    """Open the cache DB in WAL mode so several worker processes can share it"""
+    conn = sqlite3.connect(path or get_cache_db_path(), timeout=5, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
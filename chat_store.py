@@ -0,0 +1,180 @@
+import sys
+import json
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from functools import cached_property
+from typing import Dict, List, Optional
+import cache_db
+from config import get_settings
+
+settings = get_settings()
+
+class ChatRecord:
+    """One chat exchange; timestamps are integer microseconds, hospitals a JSON string"""
+    __slots__ = ('user_id', 'message', 'response', 'severity_score', 'timestamp_us', 'hospitals_json')
+
+    def __init__(self, user_id: str, message: str, response: str, severity_score: int,
+                 timestamp_us: int, hospitals_json: str):
+        self.user_id = user_id
+        self.message = message
+        self.response = response
+        self.severity_score = severity_score
+        self.timestamp_us = timestamp_us
+        self.hospitals_json = hospitals_json
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> 'ChatRecord':
+        timestamp = datetime.fromisoformat(record['timestamp'])
+        return cls(
+            sys.intern(record['user_id']),
+            record['message'],
+            record['response'],
+            int(record['severity_score']),
+            to_microseconds(timestamp),
+            json.dumps(record.get('hospitals') or [], separators=(',', ':'))
+        )
+
+    def to_dict(self) -> Dict:
+        timestamp = datetime.fromtimestamp(self.timestamp_us / 1e6)
+        return {
+            'id': f"chat_{timestamp.strftime('%Y%m%d_%H%M%S')}",
+            'user_id': self.user_id,
+            'message': self.message,
+            'response': self.response,
+            'severity_score': self.severity_score,
+            'timestamp': timestamp.isoformat(),
+            'hospitals': json.loads(self.hospitals_json)
+        }
+
+def to_microseconds(timestamp: datetime) -> int:
+    return round(timestamp.timestamp() * 1_000_000)
+
+class ChatHistoryStore:
+    """Bounded per-user chat history.
+
+    The newest ring_size records of each user stay in memory in a ring
+    buffer; records pushed out of a ring, and the rings of users evicted
+    from the in-memory LRU (max_users), are appended to a SQLite table.
+    Reads take the newest records from the ring and page older ones from
+    disk, so memory stays flat however long the worker runs. close() spills
+    every ring, so history survives restarts.
+    """
+
+    def __init__(self, path: str = None, ring_size: int = None, max_users: int = None):
+        self.ring_size = ring_size or settings.CHAT_HISTORY_RING_SIZE
+        self.max_users = max_users or settings.CHAT_HISTORY_MAX_USERS
+        self._rings: 'OrderedDict[str, deque]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._path = path or settings.CHAT_HISTORY_DB_PATH
+
+    @cached_property
+    def _conn(self):
+        # Opened on first read or spill; importing the module touches no files
+        conn = cache_db.connect(self._path)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_history (
+                    user_id TEXT NOT NULL,
+                    timestamp_us INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    severity_score INTEGER NOT NULL,
+                    hospitals TEXT NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_chat_history_user_timestamp ON chat_history (user_id, timestamp_us)"
+            )
+        return conn
+
+    def append(self, record: Dict):
+        """Store a chat record as built by the chat endpoints"""
+        entry = ChatRecord.from_dict(record)
+        spill = []
+        with self._lock:
+            ring = self._rings.get(entry.user_id)
+            if ring is None:
+                ring = self._rings[entry.user_id] = deque()
+                if len(self._rings) > self.max_users:
+                    _, evicted = self._rings.popitem(last=False)
+                    spill.extend(evicted)
+            else:
+                self._rings.move_to_end(entry.user_id)
+            ring.append(entry)
+            if len(ring) > self.ring_size:
+                spill.append(ring.popleft())
+            if spill:
+                self._spill(spill)
+
+    def history(self, user_id: str, limit: int = 50, before: Optional[datetime] = None) -> List[Dict]:
+        """Up to limit records older than before (newest when None), oldest first"""
+        before_us = to_microseconds(before) if before else None
+        with self._lock:
+            recent = [
+                entry for entry in self._rings.get(user_id, ())
+                if before_us is None or entry.timestamp_us < before_us
+            ][-limit:]
+            # Everything on disk is older than what is still in the ring
+            remaining = limit - len(recent)
+            if remaining > 0:
+                cutoff = recent[0].timestamp_us if recent else before_us
+                query = "SELECT user_id, message, response, severity_score, timestamp_us, hospitals FROM chat_history WHERE user_id = ?"
+                params = [user_id]
+                if cutoff is not None:
+                    query += " AND timestamp_us < ?"
+                    params.append(cutoff)
+                query += " ORDER BY timestamp_us DESC LIMIT ?"
+                params.append(remaining)
+                older = [ChatRecord(*row) for row in self._conn.execute(query, params).fetchall()]
+                recent = older[::-1] + recent
+        return [entry.to_dict() for entry in recent]
+
+    def close(self):
+        """Spill every ring to disk"""
+        with self._lock:
+            entries = [entry for ring in self._rings.values() for entry in ring]
+            self._rings.clear()
+            if entries:
+                self._spill(entries)
+
+    def memory_stats(self) -> Dict:
+        with self._lock:
+            return {'users': len(self._rings), 'records': sum(len(ring) for ring in self._rings.values())}
+
+    def _spill(self, entries: List[ChatRecord]):
+        # Caller holds the lock
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO chat_history VALUES (?, ?, ?, ?, ?, ?)",
+                [(e.user_id, e.timestamp_us, e.message, e.response, e.severity_score, e.hospitals_json)
+                 for e in entries]
+            )
+
+# Singleton instance
+chat_store = ChatHistoryStore()
+
+if __name__ == '__main__':
+    # Memory check: python chat_store.py
+    import os
+    import time
+    import resource
+    import tempfile
+
+    store = ChatHistoryStore(os.path.join(tempfile.mkdtemp(), 'history.db'), ring_size=20, max_users=200)
+    hospitals = [{'name': f'Hospital {i}', 'address': 'Somewhere', 'rating': 4.2, 'distance': '1.2 km'} for i in range(3)]
+    base = datetime.now().timestamp()
+    for n in range(1, 6):
+        start = time.perf_counter()
+        for i in range(20_000):
+            store.append({
+                'user_id': f'user{i % 150}',
+                'message': 'I have had a headache and mild fever since yesterday',
+                'response': 'Rest, stay hydrated and take paracetamol if needed. ' * 10,
+                'severity_score': 30,
+                'timestamp': datetime.fromtimestamp(base + n * 20_000 + i).isoformat(),
+                'hospitals': hospitals
+            })
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{n * 20_000:>7} records: {(time.perf_counter() - start) * 1e3:7.1f} ms  "
+              f"max RSS {rss_mb:6.1f} MB  in memory {store.memory_stats()}")
@@ -1,25 +1,93 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import Optional
 
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./mediguide.db"
+    CACHE_DB_PATH: Optional[str] = None  # SQLite file for upstream caches; defaults to mediguide_cache.db in the project root
+    WRITE_BEHIND_ENABLED: bool = False  # Queue chat/consultation inserts and commit them in background batches
+    WRITE_BEHIND_BATCH_SIZE: int = 100
+    WRITE_BEHIND_FLUSH_INTERVAL_SECONDS: float = 0.5
+    WRITE_BEHIND_MAX_QUEUE: int = 10000  # Submissions beyond this are written synchronously
+    CHAT_HISTORY_DB_PATH: Optional[str] = None  # SQLite file for backend chat history spilled from memory; defaults to CACHE_DB_PATH
+    CHAT_HISTORY_RING_SIZE: int = 50  # Newest chats kept in memory per user
+    CHAT_HISTORY_MAX_USERS: int = 1000  # Users whose recent chats stay in memory
     
     # Security
     SECRET_KEY: str = "your-secret-key-here"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_TOKEN_CACHE_SIZE: int = 4096  # Decoded access tokens kept until they expire
+    AUTH_USER_CACHE_SIZE: int = 1024  # Authenticated-user snapshots; 0 disables
+    AUTH_USER_CACHE_TTL_SECONDS: int = 300
     
     # Google APIs
     GOOGLE_CLIENT_ID: Optional[str] = None
     GOOGLE_CLIENT_SECRET: Optional[str] = None
+    GOOGLE_USERINFO_URL: str = "https://www.googleapis.com/oauth2/v1/userinfo"  # Point at a local stub in tests
+    GOOGLE_HTTP_CONNECT_TIMEOUT: float = 3.05
+    GOOGLE_HTTP_READ_TIMEOUT: float = 5.0
+    GOOGLE_HTTP_POOL_SIZE: int = 10
+    GOOGLE_TOKEN_CACHE_TTL_SECONDS: int = 300  # Verified Google userinfo, keyed by token hash
     GOOGLE_MAPS_API_KEY: Optional[str] = None
+    MAPS_TIMEOUT_SECONDS: float = 4.0  # Per Maps call, retries included
+    MAPS_DETAILS_WORKERS: int = 8  # Concurrent Places details lookups across all searches
+    MAPS_SEARCH_DEADLINE_SECONDS: float = 3.0  # Details still pending after this are dropped
+    GEOCODE_CACHE_TTL_SECONDS: int = 90 * 24 * 3600
+    GEOCODE_NEGATIVE_TTL_SECONDS: int = 24 * 3600  # For addresses that did not geocode
+    CATALOG_MIN_RESULTS: int = 5  # Local catalog hits needed to skip the Places API
+    CATALOG_STALE_SECONDS: int = 7 * 24 * 3600  # Catalog rows older than this trigger a Places refresh
+    CATALOG_DUPLICATE_KM: float = 0.2  # Same-name catalog rows this close are one hospital (e.g. a CSV row and its Places row)
+    PLACE_DETAILS_TTL_SECONDS: int = 7 * 24 * 3600  # Name, address, phone, website, location
+    PLACE_HOURS_TTL_SECONDS: int = 24 * 3600  # Weekly opening hours; open now is computed from them
+    PLACE_VOLATILE_TTL_SECONDS: int = 6 * 3600  # Any other details field, e.g. rating
+    
+    # Resilience
+    REQUEST_DEADLINE_SECONDS: float = 20.0  # End-to-end budget of a chat or hospital request, split across its upstream calls
+    RETRY_MAX_ATTEMPTS: int = 3  # Idempotent upstream calls only
+    RETRY_BASE_DELAY_SECONDS: float = 0.1  # Backoff doubles per attempt, with full jitter
+    RETRY_MAX_DELAY_SECONDS: float = 1.0
+    BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive failures that open an upstream's circuit
+    BREAKER_RESET_SECONDS: float = 30.0  # Open circuits let one trial call through after this
+    RESILIENCE_WORKERS: int = 32  # Threads running upstream calls under a deadline
+    
+    # Uploads
+    UPLOAD_DIR: Optional[str] = None  # Content-addressed document store; defaults to uploads/ in the project root
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Bytes read, hashed and written per step
+    UPLOAD_MAX_BYTES: int = 16 * 1024 * 1024
+    DOCUMENT_WORKERS: int = 2  # Processes decoding and downscaling uploads in the background
+    DOCUMENT_MAX_ATTEMPTS: int = 3
+    DOCUMENT_RETRY_DELAY_SECONDS: float = 5.0  # Doubles with every failed attempt
+    DOCUMENT_JOB_TIMEOUT_SECONDS: int = 300  # Running jobs older than this are assumed lost and retried
+    DOCUMENT_PREVIEW_MAX_SIDE: int = 1600  # Longest side of the image derivative sent to the AI
+    DOCUMENT_PREVIEW_QUALITY: int = 85
+    DOCUMENT_THUMBNAIL_SIDE: int = 256
+    DOCUMENT_TEXT_MAX_CHARS: int = 50000  # Text kept from PDFs
+    DOCUMENT_ANALYZER: str = "document_worker:stub_analyzer"  # "module:function" run on the derivatives
     
     # AI Services
     GEMINI_API_KEY: Optional[str] = None
+    AI_STRUCTURED_TRIAGE: bool = True  # One JSON-schema call instead of separate score/advice prompts
+    AI_CACHE_SIZE: int = 1024  # Max cached AI responses; 0 disables the cache
+    AI_CACHE_TTL_SECONDS: int = 3600
+    TRIAGE_CONFIDENCE_THRESHOLD: float = 0.85  # Local triage engine answers alone at or above this
+    GEMINI_TIMEOUT_SECONDS: float = 15.0  # Per Gemini call, including the wait for a gateway slot
+    LLM_INITIAL_CONCURRENCY: int = 8  # Starting limit on concurrent Gemini calls per process; adapts (AIMD)
+    LLM_MIN_CONCURRENCY: int = 1
+    LLM_MAX_CONCURRENCY: int = 32
+    LLM_TARGET_LATENCY_SECONDS: float = 8.0  # Slower calls, like 429s, shrink the limit
+    LLM_MAX_QUEUE: int = 64  # Callers waiting for a slot; more are turned away at once
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    CONVERSATION_RECENT_TURNS: int = 6  # Exchanges quoted verbatim in the advice prompt
+    CONVERSATION_SUMMARIZE_EVERY: int = 4  # Older exchanges are folded into the running summary in batches this big
+    CONVERSATION_TOKEN_BUDGET: int = 1200  # Hard cap on the conversation context added to each prompt
+    CONVERSATION_SUMMARY_TOKENS: int = 300
     
     class Config:
         env_file = ".env"
 
+@lru_cache(maxsize=None)
 def get_settings():
+    """Settings are read from the environment once per process"""
     return Settings()
@@ -0,0 +1,195 @@
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import Callable, List, Tuple
+import cache_db
+from config import get_settings
+
+settings = get_settings()
+
+# Each turn is [patient message, assistant reply, unix time]
+Turn = List
+
+# Rough English average; close enough to keep prompts under the model's budget
+CHARS_PER_TOKEN = 4
+
+# Longest message or reply kept per turn; a single turn cannot crowd out the rest
+MAX_TURN_CHARS = 2000
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_tokens(text: str, tokens: int, keep_end: bool = False) -> str:
+    """Cut text to about tokens tokens, marking the cut with an ellipsis"""
+    limit = max(tokens, 0) * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    if limit <= 1:
+        return ''
+    return '…' + text[-(limit - 1):] if keep_end else text[:limit - 1] + '…'
+
+def extractive_summary(summary: str, turns: List[Turn], max_tokens: int) -> str:
+    """Summary update without a model call: the patient's messages, appended.
+
+    Used when the summarizer fails; the oldest text is dropped first.
+    """
+    notes = ' '.join(f"Patient said: {truncate_tokens(user, 50)}" for user, _, _ in turns)
+    return truncate_tokens(f"{summary} {notes}".strip(), max_tokens, keep_end=True)
+
+class ConversationMemory:
+    """Bounded per-conversation context for the advice prompts.
+
+    The last recent_turns exchanges are kept verbatim, plus a running summary
+    of everything older. Once summarize_every more turns have piled up, the
+    overflow is folded into the summary by one summarizer call on a
+    background thread, so the request path never waits for it. Stored state
+    and the context built from it under token_budget stay the same size
+    however long the conversation runs. State lives in the cache DB, so
+    every worker process sees the same conversation.
+
+    summarizer(summary, turns) returns the updated summary; if it raises, the
+    patient's messages are appended to the summary verbatim instead.
+    """
+
+    def __init__(self, summarizer: Callable[[str, List[Turn]], str] = None, path: str = None,
+                 recent_turns: int = None, summarize_every: int = None, token_budget: int = None,
+                 summary_tokens: int = None):
+        self.summarizer = summarizer
+        self.recent_turns = recent_turns or settings.CONVERSATION_RECENT_TURNS
+        self.summarize_every = summarize_every or settings.CONVERSATION_SUMMARIZE_EVERY
+        self.token_budget = token_budget or settings.CONVERSATION_TOKEN_BUDGET
+        self.summary_tokens = summary_tokens or settings.CONVERSATION_SUMMARY_TOKENS
+        self._lock = threading.Lock()
+        self._folding = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='conversation-summary')
+        self._path = path
+
+    @cached_property
+    def _conn(self):
+        # Connected on first use so importing ai_service stays free of side effects
+        conn = cache_db.connect(self._path)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_memory (
+                    conversation_key TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    turns TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+        return conn
+
+    def context(self, key: str) -> str:
+        """Summary plus the newest turns that fit in token_budget, oldest first"""
+        summary, turns = self._load(key)
+        remaining = self.token_budget
+        sections = []
+        if summary:
+            summary_section = "Summary of earlier conversation:\n" + truncate_tokens(summary, self.summary_tokens)
+            summary_section = truncate_tokens(summary_section, remaining)
+            sections.append(summary_section)
+            remaining -= estimate_tokens(summary_section)
+
+        header = "Recent messages (oldest first):"
+        remaining -= estimate_tokens(header) + 1
+        recent = []
+        for user, reply, _ in reversed(turns):
+            block = f"Patient: {user}\nMediGuide: {reply}"
+            cost = estimate_tokens(block) + 1
+            if cost > remaining:
+                # Always show part of the latest exchange rather than nothing
+                if not recent and remaining > 0:
+                    recent.append(truncate_tokens(block, remaining - 1))
+                break
+            recent.insert(0, block)
+            remaining -= cost
+        if recent:
+            sections.append('\n'.join([header] + recent))
+        return '\n\n'.join(sections)
+
+    def record(self, key: str, user_message: str, reply: str):
+        """Append a finished exchange; folds the overflow into the summary when due"""
+        turn = [user_message[:MAX_TURN_CHARS], reply[:MAX_TURN_CHARS], time.time()]
+        with self._lock:
+            with self._conn:
+                # Take the write lock before reading so concurrent workers cannot drop a turn
+                self._conn.execute('BEGIN IMMEDIATE')
+                summary, turns = self._select(key)
+                turns.append(turn)
+                self._store(key, summary, turns)
+            due = len(turns) >= self.recent_turns + self.summarize_every and key not in self._folding
+            if due:
+                self._folding.add(key)
+        if due:
+            self._executor.submit(self._fold, key)
+
+    def clear(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversation_memory WHERE conversation_key = ?", (key,))
+
+    def flush(self):
+        """Wait for pending summary updates"""
+        self._executor.submit(lambda: None).result()
+
+    def _fold(self, key: str):
+        try:
+            summary, turns = self._load(key)
+            overflow = turns[:len(turns) - self.recent_turns]
+            if not overflow:
+                return
+            try:
+                updated = self.summarizer(summary, overflow) if self.summarizer else None
+            except Exception as e:
+                print(f"Conversation summary failed, keeping messages verbatim: {e}")
+                updated = None
+            if not updated:
+                updated = extractive_summary(summary, overflow, self.summary_tokens)
+            updated = truncate_tokens(updated.strip(), self.summary_tokens)
+
+            with self._lock, self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                _, current = self._select(key)
+                # Another process may have folded these turns already
+                if current[:len(overflow)] == overflow:
+                    self._store(key, updated, current[len(overflow):])
+        finally:
+            with self._lock:
+                self._folding.discard(key)
+
+    def _load(self, key: str) -> Tuple[str, List[Turn]]:
+        with self._lock:
+            return self._select(key)
+
+    def _select(self, key: str) -> Tuple[str, List[Turn]]:
+        # Caller holds the lock
+        row = self._conn.execute(
+            "SELECT summary, turns FROM conversation_memory WHERE conversation_key = ?", (key,)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else ('', [])
+
+    def _store(self, key: str, summary: str, turns: List[Turn]):
+        # Caller holds the lock, inside a transaction
+        self._conn.execute("""
+            INSERT INTO conversation_memory (conversation_key, summary, turns, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (conversation_key) DO UPDATE SET
+                summary = excluded.summary, turns = excluded.turns, updated_at = excluded.updated_at
+        """, (key, summary, json.dumps(turns), time.time()))
+
+if __name__ == '__main__':
+    # Prompt size check: python conversation_memory.py
+    import os
+    import tempfile
+
+    def summarize(summary: str, turns: List[Turn]) -> str:
+        return truncate_tokens(f"{summary} " + ' '.join(user for user, _, _ in turns), 300, keep_end=True)
+
+    memory = ConversationMemory(summarize, os.path.join(tempfile.mkdtemp(), 'memory.db'))
+    reply = 'Rest, drink plenty of fluids and take paracetamol for the fever if needed. ' * 8
+    for turn in range(1, 201):
+        memory.record('demo', f"Day {turn}: the headache is still there and the fever is {37 + turn % 3} C", reply)
+        if turn in (1, 5, 10, 25, 50, 100, 200):
+            memory.flush()
+            context = memory.context('demo')
+            print(f"turn {turn:>3}: context {estimate_tokens(context):>5} tokens (budget {memory.token_budget})")
@@ -1,8 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 from config import get_settings
+from migrations import migrate
+from write_behind import WriteBehindQueue
 
 settings = get_settings()
 
@@ -58,21 +60,32 @@ class Chat(Base):
     __tablename__ = "chats"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     message = Column(Text, nullable=False)
     response = Column(Text, nullable=False)
     seriousness_score = Column(Float)  # Percentage score
     timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (Index("ix_chats_user_timestamp", "user_id", "timestamp"),)
 
 class Report(Base):
     __tablename__ = "reports"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     filename = Column(String, nullable=False)
-    filepath = Column(String, nullable=False)
+    filepath = Column(String, nullable=False)  # Relative to the upload store, e.g. "ab/cd/<content_hash>"
     file_size = Column(Integer)
+    content_hash = Column(String(64))
+    mime_type = Column(String(100))
+    artifacts = Column(Text)  # JSON manifest from the document worker, once processing is done
     uploaded_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (Index("ix_reports_user_uploaded_at", "user_id", "uploaded_at"),)
+
+# Chat logging; commits in background batches when WRITE_BEHIND_ENABLED is set
+chat_writer = WriteBehindQueue(engine)
+INSERT_CHAT = Chat.__table__.insert()
 
 # Database dependency
 def get_db():
@@ -82,6 +95,7 @@ def get_db():
     finally:
         db.close()
 
-# Create tables
+# Create tables, then bring existing ones up to date
 def init_db():
     Base.metadata.create_all(bind=engine)
+    migrate(engine, 'api')
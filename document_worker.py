@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import atexit
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import cached_property
+from typing import Callable, Dict, Optional
+import cache_db
+from config import get_settings
+
+settings = get_settings()
+
+IMAGE_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/tiff'}
+ALLOWED_TYPES = IMAGE_TYPES | {'application/pdf'}
+
+class RejectedDocument(ValueError):
+    """The upload is not a document type we process; never retried"""
+
+def stub_analyzer(artifacts: Dict) -> Dict:
+    """Local stand-in for the AI analyzer stage.
+
+    A real analyzer gets the same manifest and should send the preview or
+    extracted text to the model, never the original upload.
+    """
+    return {'analyzer': 'stub', 'inputs': sorted(key for key in ('preview', 'text') if key in artifacts)}
+
+def load_analyzer(spec: str) -> Callable[[Dict], Dict]:
+    """Resolve a "module:function" analyzer spec"""
+    module, _, name = spec.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+def _derive_images(source_path: str, out_dir: str, max_side: int, thumbnail_side: int, quality: int) -> Dict:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(source_path)
+        with image:
+            width, height = image.size
+            # Lets the JPEG decoder skip straight to a reduced scale
+            image.draft('RGB', (max_side, max_side))
+            preview = ImageOps.exif_transpose(image).convert('RGB')
+    except UnidentifiedImageError as e:
+        raise RejectedDocument(f"Unreadable image: {e}")
+    except Image.DecompressionBombError as e:
+        raise RejectedDocument(f"Image too large to decode: {e}")
+    preview.thumbnail((max_side, max_side), Image.LANCZOS)
+    preview_path = os.path.join(out_dir, 'preview.jpg')
+    preview.save(preview_path, 'JPEG', quality=quality, optimize=True)
+
+    preview.thumbnail((thumbnail_side, thumbnail_side), Image.LANCZOS)
+    thumbnail_path = os.path.join(out_dir, 'thumbnail.jpg')
+    preview.save(thumbnail_path, 'JPEG', quality=80, optimize=True)
+    return {'preview': preview_path, 'thumbnail': thumbnail_path, 'width': width, 'height': height}
+
+def _extract_pdf_text(source_path: str, out_dir: str, max_chars: int) -> Dict:
+    from pypdf import PdfReader
+    from pypdf.errors import PdfReadError
+
+    try:
+        reader = PdfReader(source_path)
+    except PdfReadError as e:
+        raise RejectedDocument(f"Unreadable PDF: {e}")
+    parts, length = [], 0
+    for page in reader.pages:
+        if length >= max_chars:
+            break
+        text = page.extract_text() or ''
+        parts.append(text)
+        length += len(text)
+    text_path = os.path.join(out_dir, 'text.txt')
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join(parts)[:max_chars])
+    return {'text': text_path, 'pages': len(reader.pages)}
+
+def process_document(source_path: str, mime_type: str, out_dir: str, options: Dict) -> Dict:
+    """Validate, derive and analyze one upload; runs in a pool process.
+
+    Returns the artifact manifest: file paths of the derivatives plus the
+    analyzer's result.
+    """
+    if mime_type not in ALLOWED_TYPES:
+        raise RejectedDocument(f"Unsupported document type: {mime_type}")
+    os.makedirs(out_dir, exist_ok=True)
+    if mime_type in IMAGE_TYPES:
+        artifacts = _derive_images(source_path, out_dir, options['max_side'], options['thumbnail_side'], options['quality'])
+    else:
+        artifacts = _extract_pdf_text(source_path, out_dir, options['max_text_chars'])
+    artifacts['analysis'] = load_analyzer(options['analyzer'])(dict(artifacts, mime_type=mime_type))
+    return artifacts
+
+class DocumentWorker:
+    """Background processing of uploaded documents.
+
+    Jobs are rows in the document_jobs table of the cache DB, keyed by the
+    upload's content hash, so identical uploads are processed once and job
+    status is shared by every app process. A dispatcher thread claims queued
+    jobs and runs process_document() in a process pool, keeping CPU-heavy
+    decoding out of the request path and out of the GIL. Failures are retried
+    with exponential backoff up to max_attempts. The dispatcher renews the
+    lease of the jobs it is running every job_timeout / 3, so only jobs left
+    running by a crashed process go stale and are picked up again after
+    job_timeout.
+
+    Listeners added with on_done() are called as listener(content_hash,
+    artifacts) when a job finishes, so the apps can keep the artifacts on
+    their own records and not only in the cache DB.
+    """
+
+    def __init__(self, path: str = None, workers: int = None, max_attempts: int = None,
+                 retry_delay: float = None, job_timeout: float = None, analyzer: str = None):
+        self.workers = workers or settings.DOCUMENT_WORKERS
+        self.max_attempts = max_attempts or settings.DOCUMENT_MAX_ATTEMPTS
+        self.retry_delay = settings.DOCUMENT_RETRY_DELAY_SECONDS if retry_delay is None else retry_delay
+        self.job_timeout = job_timeout or settings.DOCUMENT_JOB_TIMEOUT_SECONDS
+        self.options = {
+            'max_side': settings.DOCUMENT_PREVIEW_MAX_SIDE,
+            'thumbnail_side': settings.DOCUMENT_THUMBNAIL_SIDE,
+            'quality': settings.DOCUMENT_PREVIEW_QUALITY,
+            'max_text_chars': settings.DOCUMENT_TEXT_MAX_CHARS,
+            'analyzer': analyzer or settings.DOCUMENT_ANALYZER,
+        }
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pool = None
+        self._registered = False
+        self._running = set()  # Content hashes this process has in the pool
+        self._leases_renewed = 0.0
+        self._listeners = []
+        self._path = path
+
+    @cached_property
+    def _conn(self):
+        # Opened on first use: spawned pool processes import this module and never need it
+        conn = cache_db.connect(self._path)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS document_jobs (
+                    content_hash TEXT PRIMARY KEY,
+                    source_path TEXT NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    out_dir TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    artifacts TEXT,
+                    run_after REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_document_jobs_status_run_after ON document_jobs (status, run_after)"
+            )
+        return conn
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            if not self._registered:
+                atexit.register(self.stop)
+                self._registered = True
+            self._stopping = False
+            self._pool = self._new_pool()
+            self._thread = threading.Thread(target=self._run, name='document-worker', daemon=True)
+            self._thread.start()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the parent has threads and open SQLite connections
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def on_done(self, listener: Callable[[str, Dict], None]):
+        """Call listener(content_hash, artifacts) whenever this process finishes a job"""
+        self._listeners.append(listener)
+
+    def submit(self, content_hash: str, source_path: str, mime_type: str, out_dir: str) -> str:
+        """Queue an upload for processing; returns the job status.
+
+        Content that was already processed, or is being processed, is not
+        queued again; jobs that ran out of attempts start over.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO document_jobs (content_hash, source_path, mime_type, out_dir, status, run_after, updated_at)
+                VALUES (?, ?, ?, ?, 'queued', ?, ?)
+                ON CONFLICT (content_hash) DO UPDATE SET
+                    status = 'queued', attempts = 0, error = NULL, run_after = excluded.run_after,
+                    updated_at = excluded.updated_at
+                WHERE document_jobs.status = 'failed'
+            """, (content_hash, source_path, mime_type, out_dir, now, now))
+            status = self._conn.execute(
+                "SELECT status FROM document_jobs WHERE content_hash = ?", (content_hash,)
+            ).fetchone()[0]
+        self.start()
+        self._wake.set()
+        return status
+
+    def status(self, content_hash: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, attempts, error, artifacts, updated_at FROM document_jobs WHERE content_hash = ?",
+                (content_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, attempts, error, artifacts, updated_at = row
+        return {
+            'status': status,
+            'attempts': attempts,
+            'error': error,
+            'artifacts': json.loads(artifacts) if artifacts else None,
+            'updated_at': updated_at
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM document_jobs GROUP BY status"))
+            return {'workers': self.workers, 'in_flight': len(self._running), 'jobs': counts}
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop claiming jobs and wait for the ones in flight"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            pool, self._pool = self._pool, None
+            self._stopping = True
+        self._wake.set()
+        if thread and thread.is_alive():
+            thread.join(timeout)
+        if pool:
+            pool.shutdown(wait=True)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                # Claimed and submitted under the lock stop() takes, so nothing
+                # reaches the pool after it has been shut down
+                if self._stopping:
+                    return
+                self._renew_leases()
+                job = self._claim() if len(self._running) < self.workers else None
+                if job:
+                    content_hash, source_path, mime_type, out_dir = job
+                    try:
+                        future = self._pool.submit(process_document, source_path, mime_type, out_dir, self.options)
+                    except BrokenProcessPool:
+                        # A pool process died (e.g. killed for memory); carry on with a fresh pool
+                        self._pool = self._new_pool()
+                        future = self._pool.submit(process_document, source_path, mime_type, out_dir, self.options)
+                    self._running.add(content_hash)
+            if job is None:
+                # Woken by submit() or a finished job; the timeout picks up retries and stale jobs
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                continue
+            future.add_done_callback(lambda f, content_hash=content_hash: self._finish(content_hash, f))
+
+    def _renew_leases(self):
+        # Caller holds the lock. Jobs that legitimately run past job_timeout
+        # must not be reclaimed and processed a second time.
+        now = time.time()
+        if not self._running or now - self._leases_renewed < self.job_timeout / 3:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE document_jobs SET updated_at = ? WHERE content_hash = ? AND status = 'running'",
+                [(now, content_hash) for content_hash in self._running]
+            )
+        self._leases_renewed = now
+
+    def _claim(self):
+        # Caller holds the lock. BEGIN IMMEDIATE takes the write lock up front,
+        # so two processes never claim the same job.
+        now = time.time()
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            job = self._conn.execute("""
+                SELECT content_hash, source_path, mime_type, out_dir FROM document_jobs
+                WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND updated_at < ?)
+                ORDER BY run_after LIMIT 1
+            """, (now, now - self.job_timeout)).fetchone()
+            if job:
+                self._conn.execute(
+                    "UPDATE document_jobs SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                    "WHERE content_hash = ?",
+                    (now, job[0])
+                )
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+        return job
+
+    def _finish(self, content_hash: str, future: Future):
+        now = time.time()
+        artifacts = None
+        try:
+            artifacts = future.result()
+        except RejectedDocument as e:
+            update = ("status = 'rejected', error = ?", (str(e),))
+        except Exception as e:
+            print(f"Document job {content_hash[:12]} failed: {e!r}")
+            with self._lock:
+                attempts = self._conn.execute(
+                    "SELECT attempts FROM document_jobs WHERE content_hash = ?", (content_hash,)
+                ).fetchone()[0]
+            if attempts < self.max_attempts:
+                retry_at = now + self.retry_delay * 2 ** (attempts - 1)
+                update = ("status = 'queued', error = ?, run_after = ?", (repr(e), retry_at))
+            else:
+                update = ("status = 'failed', error = ?", (repr(e),))
+        else:
+            update = ("status = 'done', error = NULL, artifacts = ?", (json.dumps(artifacts),))
+
+        columns, params = update
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    f"UPDATE document_jobs SET {columns}, updated_at = ? WHERE content_hash = ?",
+                    (*params, now, content_hash)
+                )
+            self._running.discard(content_hash)
+        self._wake.set()
+
+        if artifacts is not None:
+            for listener in self._listeners:
+                try:
+                    listener(content_hash, artifacts)
+                except Exception as e:
+                    print(f"Document listener failed for {content_hash[:12]}: {e!r}")
+
+# Singleton instance; the pool starts with the first submit()
+document_worker = DocumentWorker()
@@ -0,0 +1,34 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+from config import get_settings
+from resilience import stage_timeout
+
+settings = get_settings()
+
+# Shared pool for fanned-out upstream lookups (e.g. Places details)
+_pool = ThreadPoolExecutor(max_workers=settings.MAPS_DETAILS_WORKERS, thread_name_prefix='fanout')
+
+def fetch_concurrently(fn: Callable, items: List, timeout: Optional[float] = None) -> List:
+    """Call fn on every item in parallel and return the results in input order.
+
+    The whole batch shares one deadline (MAPS_SEARCH_DEADLINE_SECONDS by
+    default, less if the request budget has less left). Items that raise or
+    are still running when it passes come back as None, so callers can
+    return partial results instead of waiting.
+    """
+    if timeout is None:
+        timeout = stage_timeout(settings.MAPS_SEARCH_DEADLINE_SECONDS)
+    # Each call runs in a copy of the caller's context, so it sees the request deadline
+    futures = [_pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+    done, pending = wait(futures, timeout=timeout)
+    for future in pending:
+        future.cancel()
+    
+    results = []
+    for future in futures:
+        if future in done and future.exception() is None:
+            results.append(future.result())
+        else:
+            results.append(None)
+    return results
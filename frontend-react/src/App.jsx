@@ -63,6 +63,28 @@ function App() {
     setMessages([])
   }
 
+  // Parse a Server-Sent Events body and call onEvent(event, data) for each event
+  const readEvents = async (response, onEvent) => {
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+
+      buffer += decoder.decode(value, { stream: true })
+      const events = buffer.split('\n\n')
+      buffer = events.pop()
+
+      for (const raw of events) {
+        const event = raw.match(/^event: (.*)$/m)?.[1]
+        const data = raw.match(/^data: (.*)$/m)?.[1]
+        if (event && data) onEvent(event, JSON.parse(data))
+      }
+    }
+  }
+
   const sendMessage = async (message, location = null) => {
     if (!user) return
 
@@ -76,7 +98,7 @@ function App() {
     setMessages(prev => [...prev, userMessage])
 
     try {
-      const response = await fetch('http://localhost:8000/api/chat/send', {
+      const response = await fetch('http://localhost:8000/api/chat/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -88,20 +110,41 @@ function App() {
         }),
       })
 
-      if (response.ok) {
-        const data = await response.json()
-        const aiMessage = {
-          id: data.id,
-          message: data.response,
-          isUser: false,
-          timestamp: data.timestamp,
-          severityScore: data.severity_score,
-          hospitals: data.hospitals
-        }
-        setMessages(prev => [...prev, aiMessage])
-      } else {
+      if (!response.ok) {
         throw new Error('Failed to send message')
       }
+
+      // Show the reply as it streams in, then replace it with the saved record
+      const streamId = `stream_${Date.now()}`
+      const updateAiMessage = (changes) => {
+        setMessages(prev => prev.map(msg => msg.id === streamId ? { ...msg, ...changes } : msg))
+      }
+      setMessages(prev => [...prev, {
+        id: streamId,
+        message: '',
+        isUser: false,
+        timestamp: new Date().toISOString()
+      }])
+
+      let text = ''
+      await readEvents(response, (event, data) => {
+        if (event === 'token') {
+          text += data.text
+          updateAiMessage({ message: text })
+        } else if (event === 'score') {
+          updateAiMessage({ severityScore: data.severity_score })
+        } else if (event === 'hospitals') {
+          updateAiMessage({ hospitals: data.hospitals })
+        } else if (event === 'done') {
+          updateAiMessage({
+            id: data.id,
+            message: data.response,
+            timestamp: data.timestamp,
+            severityScore: data.severity_score,
+            hospitals: data.hospitals
+          })
+        }
+      })
     } catch (error) {
       console.error('Error sending message:', error)
       const errorMessage = {
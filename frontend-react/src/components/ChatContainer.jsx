@@ -55,6 +55,10 @@ const ChatContainer = ({ messages, onSendMessage, user, onLogout }) => {
     textarea.style.height = Math.min(textarea.scrollHeight, 120) + 'px'
   }
 
+  // Hide the typing indicator once the streamed reply starts arriving
+  const lastMessage = messages[messages.length - 1]
+  const replyStreaming = Boolean(lastMessage && !lastMessage.isUser && lastMessage.message)
+
   return (
     <div className="chat-container">
       <div className="chat-header">
@@ -179,7 +183,7 @@ const ChatContainer = ({ messages, onSendMessage, user, onLogout }) => {
         )}
 
         {/* Typing Indicator */}
-        {isTyping && (
+        {isTyping && !replyStreaming && (
           <div className="message bot-message">
             <div className="message-avatar">
               <Bot size={20} />
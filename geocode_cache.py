@@ -0,0 +1,92 @@
+import re
+import time
+import threading
+from functools import cached_property
+from typing import Optional
+import cache_db
+from config import get_settings
+from resilience import guarded_call
+
+settings = get_settings()
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_address(address: str) -> str:
+    """Fold case, punctuation and whitespace: "New York, NY" == "new york ny" """
+    address = _PUNCTUATION.sub(' ', (address or '').lower())
+    return _WHITESPACE.sub(' ', address).strip()
+
+class GeocodeCache:
+    """Persistent geocoding cache backed by a SQLite table.
+
+    Successful lookups are kept for GEOCODE_CACHE_TTL_SECONDS. Addresses that
+    geocode to nothing are cached too, for GEOCODE_NEGATIVE_TTL_SECONDS, so a
+    bad saved location does not cost a round trip on every search. Upstream
+    errors are never cached.
+    """
+
+    def __init__(self, path: str = None, ttl: int = None, negative_ttl: int = None):
+        self.ttl = settings.GEOCODE_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.negative_ttl = settings.GEOCODE_NEGATIVE_TTL_SECONDS if negative_ttl is None else negative_ttl
+        self._lock = threading.Lock()
+        self._path = path
+
+    @cached_property
+    def _conn(self):
+        # Connected on the first lookup, not at import
+        conn = cache_db.connect(self._path)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    address_key TEXT PRIMARY KEY,
+                    lat REAL,
+                    lng REAL,
+                    formatted_address TEXT,
+                    expires_at REAL NOT NULL
+                )
+            """)
+        return conn
+    
+    def get(self, address: str):
+        """Return (hit, location); location is None for a cached miss"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lat, lng, formatted_address, expires_at FROM geocode_cache WHERE address_key = ?",
+                (normalize_address(address),)
+            ).fetchone()
+        if row is None or row[3] <= time.time():
+            return False, None
+        if row[0] is None:
+            return True, None
+        return True, {'lat': row[0], 'lng': row[1], 'formatted_address': row[2]}
+    
+    def set(self, address: str, location: Optional[dict]):
+        ttl = self.ttl if location else self.negative_ttl
+        location = location or {}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache VALUES (?, ?, ?, ?, ?)",
+                (normalize_address(address), location.get('lat'), location.get('lng'),
+                 location.get('formatted_address'), time.time() + ttl)
+            )
+    
+    def geocode(self, gmaps, address: str) -> Optional[dict]:
+        """Geocode through the cache; returns {'lat', 'lng', 'formatted_address'} or None"""
+        hit, location = self.get(address)
+        if hit:
+            return location
+        
+        # The client's own timeout applies; guarded_call stops waiting at the deadline
+        result = guarded_call('maps', lambda timeout: gmaps.geocode(address), share=0.3, idempotent=True)
+        if result:
+            location = {
+                'lat': result[0]['geometry']['location']['lat'],
+                'lng': result[0]['geometry']['location']['lng'],
+                'formatted_address': result[0].get('formatted_address', address)
+            }
+        self.set(address, location)
+        return location
+
+# Singleton instance
+geocode_cache = GeocodeCache()
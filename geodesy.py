@@ -0,0 +1,46 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088  # Mean Earth radius
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in km between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+def haversine_many(lat: float, lng: float, lats: Sequence[float], lngs: Sequence[float]) -> np.ndarray:
+    """Distances in km from one origin to N points in a single vectorized call"""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def nearest_indices(distances: np.ndarray, k: Optional[int] = None, max_km: Optional[float] = None) -> np.ndarray:
+    """Indices of the k smallest distances (within max_km), closest first.
+
+    Uses argpartition, so only the selected k are fully sorted.
+    """
+    indices = np.arange(len(distances))
+    if max_km is not None:
+        indices = indices[distances <= max_km]
+    if k is not None and k < len(indices):
+        part = np.argpartition(distances[indices], k)[:k]
+        indices = indices[part]
+    return indices[np.argsort(distances[indices], kind='stable')]
+
+def rank_by_distance(lat: float, lng: float, candidates: List[Dict], k: Optional[int] = None,
+                     max_km: Optional[float] = None, lat_key: str = 'lat',
+                     lng_key: str = 'lng') -> List[Tuple[Dict, float]]:
+    """Rank candidate dicts by distance from (lat, lng); returns (candidate, km) pairs closest first"""
+    if not candidates:
+        return []
+    lats = np.fromiter((c[lat_key] for c in candidates), dtype=np.float64, count=len(candidates))
+    lngs = np.fromiter((c[lng_key] for c in candidates), dtype=np.float64, count=len(candidates))
+    distances = haversine_many(lat, lng, lats, lngs)
+    return [(candidates[i], float(distances[i])) for i in nearest_indices(distances, k, max_km)]
@@ -0,0 +1,267 @@
+import re
+import csv
+import json
+import math
+import time
+import threading
+from functools import cached_property
+from typing import Dict, Iterable, List, Optional
+import cache_db
+from config import get_settings
+from geodesy import EARTH_RADIUS_KM, haversine_km, haversine_many, nearest_indices
+from place_details_cache import is_open_at
+
+settings = get_settings()
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 7  # ~150m cells; stored per row, queried by prefix
+
+COLUMNS = (
+    'place_id', 'name', 'address', 'phone', 'website', 'rating', 'lat', 'lng', 'geohash',
+    'specialties', 'opening_hours', 'utc_offset', 'source', 'updated_at'
+)
+
+_NAME_WORDS = re.compile(r'[a-z0-9]+')
+
+def normalize_name(name: str) -> str:
+    """Case- and punctuation-insensitive hospital name, for matching rows from different sources"""
+    return ' '.join(_NAME_WORDS.findall((name or '').lower()))
+
+def merge_duplicates(first: Dict, second: Dict) -> Dict:
+    """One result for two rows of the same hospital: the fresher row's values, gaps filled from the other"""
+    newer, older = (first, second) if first['updated_at'] >= second['updated_at'] else (second, first)
+    merged = {key: older[key] if value is None or value == [] else value for key, value in newer.items()}
+    merged['distance_km'] = min(first['distance_km'], second['distance_km'])
+    return merged
+
+def geohash_encode(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+def geohash_cell_size(precision: int):
+    """(lat_degrees, lng_degrees) covered by one cell at this precision"""
+    lng_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+def covering_prefixes(lat: float, lng: float, radius_km: float, max_cells: int = 16) -> List[str]:
+    """Geohash prefixes whose cells cover the bounding box of a circle"""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * max(math.cos(math.radians(lat)), 0.01)))
+
+    # Finest precision whose cells still cover the box in at most max_cells
+    precision = GEOHASH_PRECISION
+    while precision > 1:
+        cell_lat, cell_lng = geohash_cell_size(precision)
+        cells = (math.ceil(2 * dlat / cell_lat) + 1) * (math.ceil(2 * dlng / cell_lng) + 1)
+        if cells <= max_cells:
+            break
+        precision -= 1
+
+    cell_lat, cell_lng = geohash_cell_size(precision)
+    prefixes = set()
+    y = max(lat - dlat, -90.0)
+    while True:
+        x = lng - dlng
+        while True:
+            prefixes.add(geohash_encode(min(y, 89.999999), (x + 180) % 360 - 180, precision))
+            if x >= lng + dlng:
+                break
+            x = min(x + cell_lng, lng + dlng)
+        if y >= min(lat + dlat, 90.0):
+            break
+        y = min(y + cell_lat, lat + dlat, 90.0)
+    return sorted(prefixes)
+
+class HospitalCatalog:
+    """Local hospital catalog with a geohash grid index.
+
+    Rows come from Google Places results and from bulk CSV imports (e.g. an
+    OpenStreetMap extract). Each row stores its geohash, so a radius query is
+    a handful of index range scans over the covering cells followed by an
+    exact distance check.
+
+    Opening status is never stored: rows keep the weekly opening hours and
+    UTC offset, and is_open is computed when the row is read.
+    """
+
+    def __init__(self, path: str = None):
+        self._lock = threading.Lock()
+        self._path = path
+
+    @cached_property
+    def _conn(self):
+        # Opened (and older catalogs migrated) on first use rather than at import
+        conn = cache_db.connect(self._path)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS hospital_catalog (
+                    place_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    address TEXT,
+                    phone TEXT,
+                    website TEXT,
+                    rating REAL,
+                    lat REAL NOT NULL,
+                    lng REAL NOT NULL,
+                    geohash TEXT NOT NULL,
+                    specialties TEXT,
+                    opening_hours TEXT,
+                    utc_offset INTEGER,
+                    source TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # Catalogs written before opening hours were kept (their is_open column is left unused)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(hospital_catalog)")}
+            for column, ddl in (('opening_hours', 'TEXT'), ('utc_offset', 'INTEGER')):
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE hospital_catalog ADD COLUMN {column} {ddl}")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_hospital_catalog_geohash ON hospital_catalog (geohash)")
+        return conn
+
+    def upsert(self, hospitals: Iterable[Dict], source: str = 'places'):
+        """Insert or refresh hospitals given as dicts with place_id, name, lat, lng and optional
+        details, including Places opening_hours (with periods) and utc_offset"""
+        now = time.time()
+        rows = []
+        for h in hospitals:
+            if h.get('lat') is None or h.get('lng') is None or not h.get('place_id'):
+                continue
+            periods = (h.get('opening_hours') or {}).get('periods')
+            rows.append((
+                h['place_id'], h.get('name') or 'Unknown', h.get('address'), h.get('phone'),
+                h.get('website'), h.get('rating'), float(h['lat']), float(h['lng']),
+                geohash_encode(float(h['lat']), float(h['lng'])),
+                json.dumps([s.lower() for s in h.get('specialties') or []]),
+                json.dumps({'periods': periods}) if periods else None, h.get('utc_offset'), source, now
+            ))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO hospital_catalog ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                rows
+            )
+        return len(rows)
+
+    def import_csv(self, path: str, source: str = 'import') -> int:
+        """Bulk import from CSV with columns name, lat, lng and optionally id,
+        address, phone, website, rating and specialties (';'-separated)"""
+        hospitals = []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                lat, lng = float(row['lat']), float(row['lng'])
+                hospitals.append({
+                    'place_id': row.get('id') or f"{source}:{geohash_encode(lat, lng, 9)}:{row['name']}",
+                    'name': row['name'],
+                    'address': row.get('address'),
+                    'phone': row.get('phone'),
+                    'website': row.get('website'),
+                    'rating': float(row['rating']) if row.get('rating') else None,
+                    'lat': lat,
+                    'lng': lng,
+                    'specialties': [s.strip() for s in (row.get('specialties') or '').split(';') if s.strip()]
+                })
+        return self.upsert(hospitals, source=source)
+
+    def nearest(self, lat: float, lng: float, k: int = 10, radius_km: float = 5.0,
+                specialty: Optional[str] = None, open_only: bool = False) -> List[Dict]:
+        """k nearest hospitals within radius_km, closest first.
+
+        open_only drops hospitals closed right now (unknown status is kept).
+        Rows with the same normalized name within CATALOG_DUPLICATE_KM of
+        each other, such as an imported CSV row and the Places row for the
+        same hospital, are merged into one result. Each result carries its
+        distance_km and updated_at.
+        """
+        prefixes = covering_prefixes(lat, lng, radius_km)
+        clause = " OR ".join("(geohash >= ? AND geohash < ?)" for _ in prefixes)
+        params = [bound for p in prefixes for bound in (p, p + '~')]
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT place_id, name, address, phone, website, rating, lat, lng, specialties, "
+                f"opening_hours, utc_offset, updated_at FROM hospital_catalog WHERE {clause}",
+                params
+            )
+            # Opening status as of now, from the stored weekly hours
+            rows = [
+                row[:9] + (is_open_at(json.loads(row[9]) if row[9] else None, row[10]), row[11])
+                for row in cursor.fetchall()
+            ]
+
+        if not rows:
+            return []
+
+        # Distances to every candidate in one vectorized call, closest first
+        distances = haversine_many(lat, lng, [row[6] for row in rows], [row[7] for row in rows])
+        results = []
+        by_name: Dict[str, List[int]] = {}
+        for i in nearest_indices(distances, max_km=radius_km):
+            place_id, name, address, phone, website, rating, h_lat, h_lng, specialties, is_open, updated_at = rows[i]
+            hospital = {
+                'place_id': place_id,
+                'name': name,
+                'address': address,
+                'phone': phone,
+                'website': website,
+                'rating': rating,
+                'lat': h_lat,
+                'lng': h_lng,
+                'specialties': json.loads(specialties or '[]'),
+                'is_open': is_open,
+                'distance_km': round(float(distances[i]), 2),
+                'updated_at': updated_at
+            }
+            same_name = by_name.setdefault(normalize_name(name), [])
+            for j in same_name:
+                if haversine_km(h_lat, h_lng, results[j]['lat'], results[j]['lng']) <= settings.CATALOG_DUPLICATE_KM:
+                    results[j] = merge_duplicates(results[j], hospital)
+                    break
+            else:
+                same_name.append(len(results))
+                results.append(hospital)
+
+        # Filter merged hospitals, so a closed Places row is not hidden by its CSV twin
+        if specialty or open_only:
+            results = [
+                h for h in results
+                if (not open_only or h['is_open'] is not False)
+                and (not specialty or specialty.lower() in h['specialties'])
+            ]
+        return results[:k]
+
+    def is_sufficient(self, results: List[Dict], min_results: int = None, max_age: int = None) -> bool:
+        """Whether local results are dense and fresh enough to skip the Places API"""
+        min_results = settings.CATALOG_MIN_RESULTS if min_results is None else min_results
+        max_age = settings.CATALOG_STALE_SECONDS if max_age is None else max_age
+        if len(results) < min_results:
+            return False
+        oldest = min(h['updated_at'] for h in results)
+        return time.time() - oldest <= max_age
+
+# Singleton instance
+hospital_catalog = HospitalCatalog()
+
+if __name__ == '__main__':
+    # Bulk import: python hospital_catalog.py hospitals.csv [source]
+    import sys
+    if len(sys.argv) < 2:
+        print("usage: python hospital_catalog.py <hospitals.csv> [source]")
+        sys.exit(1)
+    count = hospital_catalog.import_csv(sys.argv[1], *sys.argv[2:3])
+    print(f"Imported {count} hospitals into {cache_db.get_cache_db_path()}")
@@ -0,0 +1,150 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+import numpy as np
+
+@dataclass
+class ScoringWeights:
+    rating: float = 8.0            # points per rating star (0-40 for a 0-5 rating)
+    distance: float = 30.0         # points at distance 0, decaying with distance
+    distance_decay_km: float = 5.0 # distance at which the distance points fall to 1/e
+    open_now: float = 20.0
+    open_unknown: float = 10.0
+    specialty: float = 15.0        # hospital offers one of the needed specializations
+    emergency: float = 10.0        # emergency-capable hospital for high severity
+    emergency_severity: int = 70   # severity at which the emergency bonus applies
+    default_distance_km: float = 10.0
+
+class HospitalScorer:
+    """Scores hospital candidates for a consultation.
+
+    Every factor is computed for all candidates at once as a NumPy array, with
+    a continuous exponential distance decay instead of distance buckets.
+    Specializations are matched against the hospital's specialties and name.
+    Callers that already hold columns (e.g. a catalog query) can use
+    score_columns directly and skip the per-dict extraction.
+    """
+
+    def __init__(self, weights: ScoringWeights = None):
+        self.weights = weights or ScoringWeights()
+
+    def score_columns(self, ratings: np.ndarray, distances: np.ndarray, open_status: np.ndarray,
+                      specialty_match: np.ndarray = None, emergency_capable: np.ndarray = None,
+                      severity_score: float = 0) -> np.ndarray:
+        """Score candidates given as parallel arrays.
+
+        open_status is 1 (open), 0 (closed) or -1 (unknown); NaN distances
+        count as default_distance_km.
+        """
+        w = self.weights
+        distances = np.where(np.isnan(distances), w.default_distance_km, np.maximum(distances, 0))
+        scores = w.rating * np.clip(np.nan_to_num(ratings), 0, 5)
+        scores += w.distance * np.exp(-distances / w.distance_decay_km)
+        scores += w.open_now * (open_status == 1) + w.open_unknown * (open_status == -1)
+        if specialty_match is not None:
+            scores += w.specialty * specialty_match
+        if emergency_capable is not None and severity_score >= w.emergency_severity:
+            scores += w.emergency * emergency_capable
+        return scores
+
+    def score(self, hospitals: Sequence[Dict], severity_score: float = 0,
+              specializations: Sequence[str] = ()) -> np.ndarray:
+        """Score hospital dicts; one pass extracts the columns, the rest is array math"""
+        wanted = re.compile('|'.join(re.escape(s.lower()) for s in specializations)) if specializations else None
+        ratings, distances, open_status, specialty_match, emergency_capable = [], [], [], [], []
+        for h in hospitals:
+            rating = h.get('rating')
+            ratings.append(rating if isinstance(rating, (int, float)) else np.nan)
+            distance = h.get('distance', h.get('distance_km'))
+            distances.append(distance if isinstance(distance, (int, float)) else np.nan)
+            is_open = h.get('is_open')
+            open_status.append(-1 if is_open is None else int(bool(is_open)))
+
+            # Name and specialties as one lowercase string for substring checks
+            text = (h.get('name') or '').lower()
+            specialties = h.get('specialties')
+            if specialties:
+                text = text + '|' + '|'.join(specialties).lower()
+            specialty_match.append(wanted is not None and wanted.search(text) is not None)
+            emergency_capable.append('emergency' in text)
+
+        return self.score_columns(
+            np.array(ratings, dtype=np.float64),
+            np.array(distances, dtype=np.float64),
+            np.array(open_status, dtype=np.int8),
+            np.array(specialty_match, dtype=bool),
+            np.array(emergency_capable, dtype=bool),
+            severity_score
+        )
+
+    def top_k(self, hospitals: Sequence[Dict], severity_score: float = 0,
+              specializations: Sequence[str] = (), k: int = 5) -> List[Dict]:
+        """Best k hospitals, highest score first, as copies with a recommendation_score"""
+        if not hospitals:
+            return []
+        scores = self.score(hospitals, severity_score, specializations)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [dict(hospitals[i], recommendation_score=round(float(scores[i]), 1)) for i in order]
+
+# Singleton instance
+hospital_scorer = HospitalScorer()
+
+if __name__ == '__main__':
+    # Micro-benchmark: python hospital_scorer.py
+    import random
+    import timeit
+
+    def legacy_recommend(hospitals, severity_score):
+        scored = []
+        for hospital in hospitals:
+            score = hospital.get('rating', 0) * 8
+            distance = hospital.get('distance', 10)
+            if distance <= 2:
+                score += 30
+            elif distance <= 5:
+                score += 20
+            elif distance <= 10:
+                score += 10
+            if hospital.get('is_open') is True:
+                score += 20
+            elif hospital.get('is_open') is None:
+                score += 10
+            if severity_score >= 70 and 'emergency' in hospital.get('name', '').lower():
+                score += 10
+            hospital['recommendation_score'] = score
+            scored.append(hospital)
+        scored.sort(key=lambda x: x['recommendation_score'], reverse=True)
+        return scored[:5]
+
+    random.seed(0)
+    specialties = ['cardiology', 'neurology', 'orthopedics', 'emergency', 'internal medicine']
+    for n in (100, 10_000, 100_000):
+        hospitals = [{
+            'name': f"{random.choice(['City', 'Metro', 'Emergency Care'])} Hospital {i}",
+            'rating': round(random.uniform(2, 5), 1),
+            'distance': round(random.uniform(0, 25), 2),
+            'is_open': random.choice([True, False, None]),
+            'specialties': random.sample(specialties, 2)
+        } for i in range(n)]
+        columns = (
+            np.array([h['rating'] for h in hospitals]),
+            np.array([h['distance'] for h in hospitals]),
+            np.array([-1 if h['is_open'] is None else int(h['is_open']) for h in hospitals], dtype=np.int8),
+            np.array(['cardiology' in h['specialties'] for h in hospitals]),
+            np.array(['emergency' in h['specialties'] for h in hospitals])
+        )
+
+        def columnar_top_k():
+            scores = hospital_scorer.score_columns(*columns, severity_score=80)
+            return np.argpartition(-scores, 5)[:5]
+
+        runs = max(1, 100_000 // n)
+        legacy = timeit.timeit(lambda: legacy_recommend(hospitals, 80), number=runs) / runs
+        scorer = timeit.timeit(lambda: hospital_scorer.top_k(hospitals, 80, ['cardiology']), number=runs) / runs
+        columnar = timeit.timeit(columnar_top_k, number=runs) / runs
+        print(f"{n:>7} candidates: legacy loop {legacy * 1e3:8.2f} ms  "
+              f"top_k(dicts) {scorer * 1e3:8.2f} ms  columns {columnar * 1e3:8.2f} ms")
@@ -0,0 +1,64 @@
+from typing import Any, Callable, Hashable, Optional
+from sqlalchemy import inspect
+from config import get_settings
+from ttl_cache import TTLCache
+
+settings = get_settings()
+
+class ModelSnapshot:
+    """Read-only copy of a model row's column values.
+
+    Holds no session, so one instance can be cached and shared by concurrent
+    requests. Relationship attributes are delegated to the live row returned
+    by _load(), which subclasses provide when they need them.
+    """
+
+    def __init__(self, row):
+        mapper = inspect(row).mapper
+        object.__setattr__(self, '_values', {attr.key: getattr(row, attr.key) for attr in mapper.column_attrs})
+        object.__setattr__(self, '_relationships', frozenset(mapper.relationships.keys()))
+
+    def __getattr__(self, name: str) -> Any:
+        values = object.__getattribute__(self, '_values')
+        if name in values:
+            return values[name]
+        if name in object.__getattribute__(self, '_relationships'):
+            return getattr(self._load(), name)
+        raise AttributeError(f"{type(self).__name__} has no attribute {name!r}")
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} is read-only; update the row and invalidate the cache")
+
+    def _load(self):
+        raise AttributeError(f"{type(self).__name__} cannot load relationships")
+
+class IdentityCache:
+    """LRU + TTL cache of user snapshots keyed by user id.
+
+    Profile updates must call invalidate(); the TTL bounds staleness for
+    changes made by other processes.
+    """
+
+    def __init__(self, snapshot_cls: type = ModelSnapshot, maxsize: int = None, ttl: float = None):
+        self.snapshot_cls = snapshot_cls
+        self._cache = TTLCache(
+            maxsize=settings.AUTH_USER_CACHE_SIZE if maxsize is None else maxsize,
+            ttl=settings.AUTH_USER_CACHE_TTL_SECONDS if ttl is None else ttl
+        )
+
+    def get(self, user_id: Hashable, load: Callable[[], Any]) -> Optional[ModelSnapshot]:
+        """Cached snapshot for user_id, calling load() for the row on a miss"""
+        snapshot = self._cache.get(user_id)
+        if snapshot is None:
+            row = load()
+            if row is None:
+                return None
+            snapshot = self.snapshot_cls(row)
+            self._cache.set(user_id, snapshot)
+        return snapshot
+
+    def invalidate(self, user_id: Hashable):
+        self._cache.invalidate(user_id)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
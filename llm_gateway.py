@@ -0,0 +1,252 @@
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Optional
+from config import get_settings
+
+settings = get_settings()
+
+class GatewayOverloaded(RuntimeError):
+    """The wait queue is full, or no slot freed up within the queue timeout"""
+
+# True in a context whose last call() shared another caller's result instead of
+# running the request; a shared failure is that caller's to record, not ours
+coalesced: contextvars.ContextVar[bool] = contextvars.ContextVar('llm_coalesced', default=False)
+
+def is_throttled(error: BaseException) -> bool:
+    """True for quota errors, by exception type (google.api_core ResourceExhausted) or HTTP status 429"""
+    if any(cls.__name__ in ('ResourceExhausted', 'TooManyRequests') for cls in type(error).__mro__):
+        return True
+    code = getattr(error, 'code', None)
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    return code == 429 or getattr(code, 'value', None) == 429 or status == 429
+
+class LLMGateway:
+    """Shared front door for Gemini calls.
+
+    call() coalesces identical in-flight requests (singleflight): the first
+    caller for a key runs the request and every caller that arrives before it
+    finishes gets the same result. Requests that do run go through an AIMD
+    concurrency limit: each call under target_latency raises the limit by
+    1/limit (about one per full window), while a 429 or a slow call cuts it
+    by backoff, at most once per typical call duration so a burst of
+    failures from one window only counts once. Callers over the limit wait in a bounded queue; past
+    max_queue waiters, or after queue_timeout, GatewayOverloaded is raised
+    so the caller falls back at once instead of piling on more retries.
+    """
+
+    def __init__(self, min_limit: int = None, max_limit: int = None, initial_limit: int = None,
+                 target_latency: float = None, max_queue: int = None, queue_timeout: float = None,
+                 backoff: float = 0.5):
+        self.min_limit = min_limit or settings.LLM_MIN_CONCURRENCY
+        self.max_limit = max_limit or settings.LLM_MAX_CONCURRENCY
+        self.target_latency = target_latency or settings.LLM_TARGET_LATENCY_SECONDS
+        self.max_queue = settings.LLM_MAX_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = settings.LLM_QUEUE_TIMEOUT_SECONDS if queue_timeout is None else queue_timeout
+        self.backoff = backoff
+        self.limit = float(initial_limit or settings.LLM_INITIAL_CONCURRENCY)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._last_decrease = 0.0
+        self._latency = 0.0  # Moving average of successful call durations
+        self._pending: Dict[Hashable, Future] = {}
+        # async_slot() callers block here rather than in the default executor that
+        # asyncio.to_thread shares; threads start only for callers that have to queue
+        self._waiters = ThreadPoolExecutor(max_workers=self.max_queue + 1, thread_name_prefix='llm-slot-wait')
+        self._stats = {'calls': 0, 'coalesced': 0, 'throttled': 0, 'slow': 0, 'rejected': 0}
+
+    def call(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn() under the concurrency limit, sharing the result with identical in-flight calls"""
+        with self._cond:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = Future()
+                leader = True
+            else:
+                self._stats['coalesced'] += 1
+                leader = False
+        coalesced.set(not leader)
+        if not leader:
+            return pending.result()
+
+        try:
+            with self.slot():
+                result = fn()
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(result)
+            return result
+        finally:
+            with self._cond:
+                self._pending.pop(key, None)
+
+    @contextmanager
+    def slot(self, measure_latency: bool = True):
+        """Hold one concurrency slot around an upstream call.
+
+        Pass measure_latency=False for streams, whose duration says nothing
+        about upstream load; their 429s still count.
+        """
+        self._acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._release(started if measure_latency else None, e)
+            raise
+        self._release(started if measure_latency else None)
+
+    @asynccontextmanager
+    async def async_slot(self, measure_latency: bool = True):
+        """slot() for coroutines; a caller that has to queue waits in one of the gateway's own threads"""
+        if not self._acquire(wait=False):
+            acquired = asyncio.get_running_loop().run_in_executor(self._waiters, self._acquire)
+            try:
+                await asyncio.shield(acquired)
+            except asyncio.CancelledError:
+                # Give the slot back if the thread gets it after we stopped waiting
+                acquired.add_done_callback(lambda f: f.cancelled() or f.exception() or self._release(None))
+                raise
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._release(started if measure_latency else None, e)
+            raise
+        self._release(started if measure_latency else None)
+
+    async def async_stream(self, chunks: AsyncIterator) -> AsyncIterator:
+        """Relay a streamed response, holding a slot only while the upstream produces it.
+
+        A task drains chunks under async_slot() into a queue, so the slot is
+        free as soon as generation ends, however slowly the client reads.
+        Stream durations are not measured (see slot()).
+        """
+        queue = asyncio.Queue()
+        finished = object()
+
+        async def pump():
+            try:
+                async with self.async_slot(measure_latency=False):
+                    async for chunk in chunks:
+                        queue.put_nowait(chunk)
+            finally:
+                queue.put_nowait(finished)
+
+        task = asyncio.create_task(pump())
+        # Mark the error retrieved in case the client leaves before it is re-raised
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is finished:
+                    break
+                yield chunk
+            await task
+        finally:
+            task.cancel()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return dict(self._stats, limit=round(self.limit, 2), latency=round(self._latency, 3),
+                        in_flight=self._in_flight, waiting=self._waiting, coalescing=len(self._pending))
+
+    def _acquire(self, wait: bool = True) -> bool:
+        """Take a slot, queueing for one unless wait is False; False when none was free"""
+        with self._cond:
+            if self._in_flight >= int(self.limit):
+                if not wait:
+                    return False
+                if self._waiting >= self.max_queue:
+                    self._stats['rejected'] += 1
+                    raise GatewayOverloaded("LLM wait queue is full")
+                self._waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self._in_flight < int(self.limit), self.queue_timeout)
+                finally:
+                    self._waiting -= 1
+                if not admitted:
+                    self._stats['rejected'] += 1
+                    raise GatewayOverloaded(f"No LLM slot within {self.queue_timeout}s")
+            self._in_flight += 1
+            self._stats['calls'] += 1
+            return True
+
+    def _release(self, started: Optional[float], error: BaseException = None):
+        now = time.monotonic()
+        with self._cond:
+            self._in_flight -= 1
+            throttled = error is not None and is_throttled(error)
+            slow = started is not None and now - started > self.target_latency
+            if throttled or slow:
+                self._stats['throttled' if throttled else 'slow'] += 1
+                if now - self._last_decrease >= self._latency:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif error is None and started is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self._latency += 0.2 * (now - started - self._latency)
+            self._cond.notify_all()
+
+# Singleton instance shared by every Gemini caller in the process
+llm_gateway = LLMGateway()
+
+if __name__ == '__main__':
+    # Spike simulation: python llm_gateway.py
+    # The fake upstream serves 6 concurrent calls and answers 429 beyond that.
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+
+    class Throttled(Exception):
+        code = 429
+
+    class Upstream:
+        def __init__(self, quota: int = 6):
+            self.quota, self.active, self.calls, self.rejected = quota, 0, 0, 0
+            self.lock = threading.Lock()
+
+        def generate(self, prompt: str) -> str:
+            with self.lock:
+                self.calls += 1
+                if self.active >= self.quota:
+                    self.rejected += 1
+                    raise Throttled('429 quota exceeded')
+                self.active += 1
+            time.sleep(random.uniform(0.05, 0.15))
+            with self.lock:
+                self.active -= 1
+            return prompt.upper()
+
+    def run(use_gateway: bool):
+        upstream = Upstream()
+        gateway = LLMGateway(min_limit=1, max_limit=32, initial_limit=16, target_latency=1.0,
+                             max_queue=256, queue_timeout=30)
+        prompts = [f"symptom {random.randrange(60)}" for _ in range(300)]
+
+        def request(prompt: str):
+            for attempt in range(4):
+                try:
+                    if use_gateway:
+                        return gateway.call(prompt, lambda: upstream.generate(prompt))
+                    return upstream.generate(prompt)
+                except Throttled:
+                    time.sleep(0.05 * 2 ** attempt)
+            return None
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(64) as pool:
+            results = list(pool.map(request, prompts))
+        elapsed = time.perf_counter() - start
+        failed = sum(result is None for result in results)
+        print(f"{'gateway' if use_gateway else 'direct ':}: {elapsed:5.2f} s, upstream calls {upstream.calls:4}, "
+              f"429s {upstream.rejected:4}, failed requests {failed:3}"
+              + (f", final limit {gateway.stats()['limit']}, coalesced {gateway.stats()['coalesced']}" if use_gateway else ''))
+
+    run(False)
+    run(True)
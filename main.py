@@ -1,19 +1,28 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, File, Request, UploadFile, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional, List
 import os
+import json
+import asyncio
+from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # Import services
-from ai_service import ai_service
+from ai_service import async_ai_service, build_triage_result, conversation_memory
+from llm_gateway import llm_gateway
+from resilience import request_deadline, resilience_stats
 from maps_service import maps_service
-from auth import verify_google_token, create_access_token, get_current_user
-from database import get_db, init_db, User, Chat, Report
+from auth import verify_google_token_async, create_access_token, get_current_user, invalidate_user
+from database import get_db, init_db, SessionLocal, User, Chat, Report, chat_writer, INSERT_CHAT
+from sse import format_sse, SSE_HEADERS
+from upload_store import upload_store, UploadTooLarge
+from document_worker import document_worker
 
 app = FastAPI(title="MediGuide AI", version="1.0.0")
 
@@ -42,6 +51,8 @@ class ChatResponse(BaseModel):
 class HospitalRequest(BaseModel):
     location: str
     radius: Optional[int] = 5000
+    specialty: Optional[str] = None
+    open_only: bool = False
 
 class GoogleAuthRequest(BaseModel):
     token: str
@@ -57,6 +68,15 @@ class UserProfile(BaseModel):
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    chat_writer.start()
+    # Resume documents queued before the last restart
+    document_worker.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Flush queued chat logs before exiting
+    await asyncio.to_thread(chat_writer.stop)
+    await asyncio.to_thread(document_worker.stop)
 
 @app.get("/")
 async def root():
@@ -65,7 +85,7 @@ async def root():
 @app.post("/auth/google")
 async def google_auth(auth_request: GoogleAuthRequest):
     """Authenticate user with Google token"""
-    user_info = verify_google_token(auth_request.token)
+    user_info = await verify_google_token_async(auth_request.token)
     if not user_info:
         raise HTTPException(status_code=401, detail="Invalid token")
     
@@ -121,57 +141,110 @@ async def update_profile(
     db = Depends(get_db)
 ):
     """Update user profile"""
-    current_user.name = profile.name
-    current_user.age = profile.age
-    current_user.gender = profile.gender
-    current_user.phone = profile.phone
-    current_user.location_preference = profile.location_preference
-    current_user.profile_completed = True
+    # current_user is a cached read-only snapshot; update the row itself
+    user = db.query(User).filter(User.id == current_user.id).first()
+    user.name = profile.name
+    user.age = profile.age
+    user.gender = profile.gender
+    user.phone = profile.phone
+    user.location_preference = profile.location_preference
+    user.profile_completed = True
     
     db.commit()
-    db.refresh(current_user)
+    invalidate_user(user.id)
     
     return {"message": "Profile updated successfully"}
 
+def get_user_profile(user: User) -> dict:
+    """Profile fields passed to the AI service for context"""
+    return {
+        "age": user.age,
+        "gender": user.gender,
+        "phone": user.phone,
+        "location_preference": user.location_preference,
+        "blood_group": user.blood_group,
+        "height": user.height,
+        "weight": user.weight,
+        "allergies": user.allergies,
+        "chronic_conditions": user.chronic_conditions,
+        "current_medications": user.current_medications
+    }
+
+def save_chat(user_id: int, message: str, response_text: str, seriousness_score: float) -> Optional[int]:
+    """Log a chat and return its id, or None when it was queued for write-behind"""
+    row = {
+        "user_id": user_id,
+        "message": message,
+        "response": response_text,
+        "seriousness_score": seriousness_score,
+        "timestamp": datetime.utcnow()
+    }
+    if chat_writer.enabled:
+        chat_writer.submit([(INSERT_CHAT, row)])
+        return None
+    
+    db = SessionLocal()
+    try:
+        chat_entry = Chat(**row)
+        db.add(chat_entry)
+        db.commit()
+        return chat_entry.id
+    finally:
+        db.close()
+
+def store_report_artifacts(content_hash: str, artifacts: dict):
+    """Copy a finished job's artifacts onto every report of that content, so they outlive the cache DB"""
+    db = SessionLocal()
+    try:
+        db.query(Report).filter(Report.content_hash == content_hash, Report.artifacts.is_(None)).update(
+            {Report.artifacts: json.dumps(artifacts)}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def sync_report_artifacts(content_hash: str) -> Optional[dict]:
+    """Job status of an upload; stores the artifacts of jobs finished by another process"""
+    job = document_worker.status(content_hash)
+    if job and job['status'] == 'done':
+        store_report_artifacts(content_hash, job['artifacts'])
+    return job
+
+document_worker.on_done(store_report_artifacts)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header with an ETag, as HTTP requires for GET"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    strip_weak = lambda tag: tag[2:] if tag.startswith("W/") else tag
+    return strip_weak(etag) in {strip_weak(tag.strip()) for tag in if_none_match.split(",")}
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(
     chat_request: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """Process chat message and return AI response"""
     
-    # Get user profile for context
-    user_profile = {
-        "age": current_user.age,
-        "gender": current_user.gender,
-        "phone": current_user.phone,
-        "location_preference": current_user.location_preference,
-        "blood_group": current_user.blood_group,
-        "height": current_user.height,
-        "weight": current_user.weight,
-        "allergies": current_user.allergies,
-        "chronic_conditions": current_user.chronic_conditions,
-        "current_medications": current_user.current_medications
-    }
-    
-    # Evaluate seriousness and get AI response
-    seriousness_score = ai_service.evaluate_seriousness(chat_request.message)
-    response_text = ai_service.get_medical_advice(chat_request.message, user_profile)
+    # Get user profile and the bounded conversation context
+    user_profile = get_user_profile(current_user)
+    conversation_key = f"api:{current_user.id}"
+    conversation = await asyncio.to_thread(conversation_memory.context, conversation_key)
     
-    # Determine if report upload or hospital search is needed
-    request_report = any(word in chat_request.message.lower() for word in ['report', 'upload', 'scan', 'lab'])
-    suggest_hospital = seriousness_score > 60 or 'hospital' in response_text.lower()
+    # Evaluate seriousness, get AI response and decide whether a report upload
+    # or hospital search is needed, within the request's time budget
+    with request_deadline():
+        triage = await async_ai_service.triage(chat_request.message, user_profile, conversation)
+    seriousness_score = triage['seriousness_score']
+    response_text = triage['advice']
+    request_report = triage['request_report']
+    suggest_hospital = triage['suggest_hospital']
     
     # Save chat to database
-    chat_entry = Chat(
-        user_id=current_user.id,
-        message=chat_request.message,
-        response=response_text,
-        seriousness_score=seriousness_score
-    )
-    db.add(chat_entry)
-    db.commit()
+    await asyncio.to_thread(save_chat, current_user.id, chat_request.message, response_text, seriousness_score)
+    await asyncio.to_thread(conversation_memory.record, conversation_key, chat_request.message, response_text)
     
     return ChatResponse(
         response=response_text,
@@ -180,16 +253,92 @@ async def chat_endpoint(
         suggest_hospital=suggest_hospital
     )
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream the AI response as Server-Sent Events.
+
+    Emits `token` events while the advice is generated, then a `score` event,
+    a `hospitals` event when a hospital visit is suggested, and a final `done`
+    event once the chat has been saved exactly as /chat saves it (its
+    chat_id is null when the save was queued for write-behind).
+    """
+    message = chat_request.message
+    user_id = current_user.id
+    user_profile = get_user_profile(current_user)
+    location = current_user.location_preference
+    conversation_key = f"api:{user_id}"
+    
+    async def events():
+        conversation = await asyncio.to_thread(conversation_memory.context, conversation_key)
+        with request_deadline():
+            # Score in parallel with the advice stream
+            score_task = asyncio.create_task(async_ai_service.evaluate_seriousness(message))
+            try:
+                parts = []
+                async for text in async_ai_service.stream_medical_advice(message, user_profile, conversation):
+                    parts.append(text)
+                    yield format_sse("token", {"text": text})
+                response_text = "".join(parts)
+                
+                seriousness_score = await score_task
+                triage = build_triage_result(message, seriousness_score, response_text)
+                yield format_sse("score", {
+                    "seriousness_score": seriousness_score,
+                    "request_report": triage["request_report"],
+                    "suggest_hospital": triage["suggest_hospital"]
+                })
+                
+                if triage["suggest_hospital"] and location:
+                    hospitals = await asyncio.to_thread(maps_service.find_nearby_hospitals, location)
+                    yield format_sse("hospitals", {"location": location, "hospitals": hospitals})
+                
+                # The request's DB session is gone by now; save_chat uses its own
+                chat_id = await asyncio.to_thread(save_chat, user_id, message, response_text, seriousness_score)
+                await asyncio.to_thread(conversation_memory.record, conversation_key, message, response_text)
+                
+                yield format_sse("done", {"chat_id": chat_id})
+            finally:
+                score_task.cancel()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/metrics/write-behind")
+async def write_behind_metrics(current_user: User = Depends(get_current_user)):
+    """Queue depth and flush counters for write-behind chat logging"""
+    return chat_writer.stats()
+
+@app.get("/metrics/llm")
+async def llm_metrics(current_user: User = Depends(get_current_user)):
+    """Gemini gateway concurrency limit, queue and coalescing counters"""
+    return llm_gateway.stats()
+
+@app.get("/metrics/resilience")
+async def resilience_metrics(current_user: User = Depends(get_current_user)):
+    """Circuit breaker state per upstream (Gemini, Google Maps)"""
+    return resilience_stats()
+
+@app.get("/metrics/documents")
+async def document_metrics(current_user: User = Depends(get_current_user)):
+    """Document processing jobs by status and pool usage"""
+    return document_worker.stats()
+
 @app.post("/hospitals/nearby")
 async def get_nearby_hospitals(
     hospital_request: HospitalRequest,
     current_user: User = Depends(get_current_user)
 ):
     """Get nearby hospitals using Maps API"""
-    hospitals = maps_service.find_nearby_hospitals(
-        hospital_request.location,
-        hospital_request.radius
-    )
+    with request_deadline():
+        hospitals = await asyncio.to_thread(
+            maps_service.find_nearby_hospitals,
+            hospital_request.location,
+            hospital_request.radius,
+            hospital_request.specialty,
+            hospital_request.open_only
+        )
     
     return {
         "location": hospital_request.location,
@@ -199,14 +348,102 @@ async def get_nearby_hospitals(
 
 @app.post("/upload-report")
 async def upload_report(
-    # File upload will be handled separately
+    file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
     db = Depends(get_db)
 ):
     """Upload medical report"""
-    # This endpoint would handle file uploads
-    # For now, return a placeholder response
-    return {"message": "Report upload endpoint - implement file handling"}
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file selected")
+    
+    # Hashed and copied in chunks off the event loop; identical files are stored once
+    try:
+        stored = await asyncio.to_thread(upload_store.save, file.file, file.filename)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    finally:
+        await file.close()
+    
+    report = Report(
+        user_id=current_user.id,
+        filename=os.path.basename(file.filename),
+        filepath=stored.path,
+        file_size=stored.size,
+        content_hash=stored.hash,
+        mime_type=stored.mime_type
+    )
+    db.add(report)
+    db.commit()
+    db.refresh(report)
+    
+    # Previews and text are derived in the background
+    processing = await asyncio.to_thread(
+        document_worker.submit,
+        stored.hash, upload_store.path_for(stored.hash), stored.mime_type, upload_store.derived_dir(stored.hash)
+    )
+    if processing == "done":
+        # Identical content was processed before; copy its artifacts now
+        await asyncio.to_thread(sync_report_artifacts, stored.hash)
+    
+    return {
+        "report_id": report.id,
+        "filename": report.filename,
+        "file_size": report.file_size,
+        "mime_type": report.mime_type,
+        "content_hash": report.content_hash,
+        "duplicate": not stored.created,
+        "processing": processing
+    }
+
+@app.get("/reports/{report_id}/status")
+async def report_status(
+    report_id: int,
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """Processing status and derived artifacts of an uploaded report"""
+    report = db.query(Report).filter(Report.id == report_id, Report.user_id == current_user.id).first()
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if report.artifacts:
+        return {"status": "done", "artifacts": json.loads(report.artifacts)}
+    job = await asyncio.to_thread(sync_report_artifacts, report.content_hash) if report.content_hash else None
+    return job or {"status": "unprocessed"}
+
+@app.api_route("/reports/{report_id}/file", methods=["GET", "HEAD"])
+async def download_report(
+    report_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """Download an uploaded report.
+
+    Supports Range (resumable downloads) and If-None-Match. The ETag is the
+    content hash, so it only changes when the stored bytes do. FileResponse
+    streams from disk in chunks, or hands the path to the server for
+    zero-copy sending where it supports the ASGI pathsend extension.
+    """
+    report = db.query(Report).filter(Report.id == report_id, Report.user_id == current_user.id).first()
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    path = os.path.join(upload_store.root, report.filepath)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Report file is missing")
+    
+    headers = {"Cache-Control": "private, no-cache"}
+    if report.content_hash:
+        headers["ETag"] = f'"{report.content_hash}"'
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return FileResponse(
+        path,
+        headers=headers,
+        media_type=report.mime_type,
+        filename=report.filename,
+        content_disposition_type="inline"
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,57 +1,103 @@
-import googlemaps
+from functools import cached_property
 from config import get_settings
-from typing import List, Dict
+from typing import List, Dict, Optional
+from fanout import fetch_concurrently
+from geocode_cache import geocode_cache
+from hospital_catalog import hospital_catalog
+from place_details_cache import place_details_cache
+from resilience import MAPS_CLIENT_OPTIONS, guarded_call
 
 settings = get_settings()
 
 class MapsService:
-    def __init__(self):
+    @cached_property
+    def gmaps(self):
+        # Created on first use so importing the service stays cheap
+        import googlemaps
         try:
-            self.gmaps = googlemaps.Client(key=settings.GOOGLE_MAPS_API_KEY)
+            return googlemaps.Client(key=settings.GOOGLE_MAPS_API_KEY, **MAPS_CLIENT_OPTIONS)
         except Exception as e:
             print(f"Error initializing Google Maps: {e}")
-            self.gmaps = None
+            return None
     
-    def find_nearby_hospitals(self, location: str, radius: int = 5000) -> List[Dict]:
-        """Find nearby hospitals with their details including open/closed status"""
-        if not self.gmaps:
-            return []
-        
+    def find_nearby_hospitals(self, location: str, radius: int = 5000, specialty: Optional[str] = None,
+                              open_only: bool = False) -> List[Dict]:
+        """Find nearby hospitals with their details including open/closed status.
+
+        The local hospital catalog is queried first; the Places API is only
+        used when local coverage is sparse or stale, and its results are
+        written back to the catalog. Without a Maps client, previously geocoded
+        locations are still served from the catalog. specialty narrows the
+        search (a Places keyword); open_only drops hospitals known to be closed.
+        """
         try:
-            # Geocode the location
-            geocode_result = self.gmaps.geocode(location)
-            if not geocode_result:
+            # Geocode the location (cached on disk)
+            if self.gmaps:
+                geocoded = geocode_cache.geocode(self.gmaps, location)
+            else:
+                _, geocoded = geocode_cache.get(location)
+            if not geocoded:
                 return []
             
-            lat = geocode_result[0]['geometry']['location']['lat']
-            lng = geocode_result[0]['geometry']['location']['lng']
+            lat = geocoded['lat']
+            lng = geocoded['lng']
+            
+            # Serve from the local catalog when it covers the area well, or
+            # whatever it has when there is no Places API to ask
+            local = hospital_catalog.nearest(lat, lng, k=10, radius_km=radius / 1000, specialty=specialty,
+                                             open_only=open_only)
+            if hospital_catalog.is_sufficient(local) or not self.gmaps:
+                return [self._catalog_hospital_info(h) for h in local]
             
             # Search for nearby hospitals
-            places_result = self.gmaps.places_nearby(
-                location=(lat, lng),
-                radius=radius,
-                type='hospital'
-            )
+            try:
+                places_result = guarded_call('maps', lambda timeout: self.gmaps.places_nearby(
+                    location=(lat, lng),
+                    radius=radius,
+                    type='hospital',
+                    keyword=specialty,
+                    open_now=open_only
+                ), share=0.5, idempotent=True)
+            except Exception as e:
+                print(f"Places search failed, using local catalog: {e}")
+                return [self._catalog_hospital_info(h) for h in local]
+            
+            places = places_result.get('results', [])[:10]  # Limit to 10 results
+            
+            # Get detailed information including opening hours, all places at once
+            details = fetch_concurrently(self._get_place_details, [place.get('place_id') for place in places])
             
             hospitals = []
-            for place in places_result.get('results', [])[:10]:  # Limit to 10 results
-                place_id = place.get('place_id')
-                
-                # Get detailed information including opening hours
-                details = self.gmaps.place(place_id, fields=[
-                    'name', 'formatted_address', 'formatted_phone_number',
-                    'rating', 'opening_hours', 'geometry', 'website'
-                ])
-                
-                result = details.get('result', {})
+            catalog_entries = []
+            for place, result in zip(places, details):
+                # Fall back to the nearby-search data if details failed or timed out
+                result = result or place
                 opening_hours = result.get('opening_hours', {})
+                # Computed from the cached weekly hours; unknown without periods or a UTC offset
+                is_open = opening_hours.get('open_now')
+                if is_open is None:
+                    is_open = place.get('opening_hours', {}).get('open_now')
+                geometry = result.get('geometry', place.get('geometry', {})).get('location', {})
+                
+                catalog_entries.append({
+                    'place_id': place.get('place_id'),
+                    'name': result.get('name'),
+                    'address': result.get('formatted_address', place.get('vicinity')),
+                    'phone': result.get('formatted_phone_number'),
+                    'website': result.get('website'),
+                    'rating': result.get('rating'),
+                    'lat': geometry.get('lat'),
+                    'lng': geometry.get('lng'),
+                    'opening_hours': opening_hours,
+                    'utc_offset': result.get('utc_offset')
+                })
                 
                 hospital_info = {
                     'name': result.get('name', 'Unknown'),
-                    'address': result.get('formatted_address', 'Address not available'),
+                    'address': result.get('formatted_address', place.get('vicinity', 'Address not available')),
                     'phone': result.get('formatted_phone_number', 'Phone not available'),
                     'rating': result.get('rating', 'No rating'),
-                    'is_open': opening_hours.get('open_now', None),
+                    'is_open': is_open,
                     'website': result.get('website', 'Not available'),
                     'location': {
                         'lat': result.get('geometry', {}).get('location', {}).get('lat'),
@@ -59,12 +105,35 @@ class MapsService:
                     }
                 }
                 
-                hospitals.append(hospital_info)
+                if not open_only or is_open is not False:
+                    hospitals.append(hospital_info)
             
+            hospital_catalog.upsert(catalog_entries, source='places')
             return hospitals
         except Exception as e:
             print(f"Error finding nearby hospitals: {e}")
             return []
+    
+    def _catalog_hospital_info(self, hospital: Dict) -> Dict:
+        """Shape a catalog row like a find_nearby_hospitals result"""
+        return {
+            'name': hospital['name'],
+            'address': hospital['address'] or 'Address not available',
+            'phone': hospital['phone'] or 'Phone not available',
+            'rating': hospital['rating'] if hospital['rating'] is not None else 'No rating',
+            'is_open': hospital['is_open'],
+            'website': hospital['website'] or 'Not available',
+            'location': {
+                'lat': hospital['lat'],
+                'lng': hospital['lng']
+            }
+        }
+    
+    def _get_place_details(self, place_id: str) -> Dict:
+        return place_details_cache.details(self.gmaps, place_id, [
+            'name', 'formatted_address', 'formatted_phone_number',
+            'rating', 'opening_hours', 'geometry', 'website'
+        ])
 
 # Singleton instance
 maps_service = MapsService()
@@ -0,0 +1,238 @@
+"""Versioned schema migrations for the FastAPI ('api') and Flask ('flask') databases.
+
+create_all only creates missing tables, so anything added to an existing
+table (indexes, backfills) goes here as a numbered migration. Applied
+versions are recorded per app in schema_migrations, so both apps can share
+one database file.
+
+    python migrations.py upgrade [api|flask] [DATABASE_URL]
+    python migrations.py status  [api|flask] [DATABASE_URL]
+    python migrations.py check   [api|flask] [DATABASE_URL]   # exits 1 if a hot query lost its index
+"""
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from text_blob import INSERT_BLOB_SQL, blob_params
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+def create_index(conn: Connection, name: str, table: str, columns: List[str]):
+    """CREATE INDEX IF NOT EXISTS, skipped when the table belongs to the other app"""
+    if not inspect(conn).has_table(table):
+        return
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+def add_column(conn: Connection, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN unless the column exists or the table belongs to the other app"""
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        return
+    if column not in {c['name'] for c in inspector.get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def _api_indexes(conn: Connection):
+    create_index(conn, 'ix_chats_user_timestamp', 'chats', ['user_id', 'timestamp'])
+    create_index(conn, 'ix_reports_user_uploaded_at', 'reports', ['user_id', 'uploaded_at'])
+
+def _api_report_content(conn: Connection):
+    add_column(conn, 'reports', 'content_hash', 'VARCHAR(64)')
+    add_column(conn, 'reports', 'mime_type', 'VARCHAR(100)')
+
+def _api_report_artifacts(conn: Connection):
+    add_column(conn, 'reports', 'artifacts', 'TEXT')
+
+def _flask_indexes(conn: Connection):
+    create_index(conn, 'ix_chat_message_user_timestamp', 'chat_message', ['user_id', 'timestamp', 'id'])
+    create_index(conn, 'ix_consultation_user_timestamp', 'consultation', ['user_id', 'timestamp'])
+    create_index(conn, 'ix_medical_document_user_upload_date', 'medical_document', ['user_id', 'upload_date'])
+    create_index(conn, 'ix_reminder_is_sent_scheduled_time', 'reminder', ['is_sent', 'scheduled_time'])
+
+def move_text_to_blobs(conn: Connection, table: str, columns: List[str], batch_size: int = 500):
+    """Replace inline text columns with <column>_hash references into text_blob.
+
+    Rows are backfilled in id order, in batches, and the inline columns are
+    dropped afterwards. Tables that already use hashes are skipped.
+    """
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        return
+    existing = {column['name'] for column in inspector.get_columns(table)}
+    columns = [column for column in columns if column in existing]
+    if not columns:
+        return
+
+    for column in columns:
+        if f"{column}_hash" not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column}_hash VARCHAR(64) REFERENCES text_blob (hash)"))
+
+    select = text(f"SELECT id, {', '.join(columns)} FROM {table} WHERE id > :last ORDER BY id LIMIT :n")
+    update = text(f"UPDATE {table} SET {', '.join(f'{c}_hash = :{c}' for c in columns)} WHERE id = :id")
+    last = 0
+    while True:
+        rows = conn.execute(select, {'last': last, 'n': batch_size}).fetchall()
+        if not rows:
+            break
+        blobs, updates = {}, []
+        for row in rows:
+            values = {'id': row[0]}
+            for column, value in zip(columns, row[1:]):
+                if value is None:
+                    values[column] = None
+                    continue
+                params = blob_params(value)
+                blobs[params['hash']] = params
+                values[column] = params['hash']
+            updates.append(values)
+        if blobs:
+            conn.execute(text(INSERT_BLOB_SQL), list(blobs.values()))
+        conn.execute(update, updates)
+        last = rows[-1][0]
+
+    for column in columns:
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+def _flask_text_blobs(conn: Connection):
+    binary = 'BYTEA' if conn.dialect.name == 'postgresql' else 'BLOB'
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS text_blob (
+            hash VARCHAR(64) NOT NULL PRIMARY KEY,
+            codec VARCHAR(8) NOT NULL,
+            data {binary} NOT NULL,
+            size INTEGER NOT NULL
+        )
+    """))
+    move_text_to_blobs(conn, 'chat_message', ['response', 'extracted_symptoms'])
+    move_text_to_blobs(conn, 'consultation', ['symptoms', 'diagnosis'])
+
+def _flask_document_content(conn: Connection):
+    add_column(conn, 'medical_document', 'content_hash', 'VARCHAR(64)')
+
+def _flask_document_artifacts(conn: Connection):
+    add_column(conn, 'medical_document', 'artifacts', 'TEXT')
+
+MIGRATIONS: Dict[str, List[Migration]] = {
+    'api': [
+        Migration(1, 'per-user indexes on chats and reports', _api_indexes),
+        Migration(2, 'content hash and MIME type of uploaded reports', _api_report_content),
+        Migration(3, 'processing artifacts of uploaded reports', _api_report_artifacts),
+    ],
+    'flask': [
+        Migration(1, 'per-user and due-reminder indexes', _flask_indexes),
+        Migration(2, 'deduplicated, compressed chat and consultation text', _flask_text_blobs),
+        Migration(3, 'content hash of uploaded documents', _flask_document_content),
+        Migration(4, 'processing artifacts of uploaded documents', _flask_document_artifacts),
+    ],
+}
+
+# Hot queries and the index each must use: (description, SQL, index name)
+HOT_QUERIES: Dict[str, List[Tuple[str, str, str]]] = {
+    'api': [
+        ('recent chats for a user',
+         "SELECT * FROM chats WHERE user_id = 1 ORDER BY timestamp DESC LIMIT 20",
+         'ix_chats_user_timestamp'),
+        ('reports for a user',
+         "SELECT * FROM reports WHERE user_id = 1 ORDER BY uploaded_at DESC",
+         'ix_reports_user_uploaded_at'),
+    ],
+    'flask': [
+        ('chat history page',
+         "SELECT * FROM chat_message WHERE user_id = 1 AND (timestamp, id) < ('2030-01-01', 1) "
+         "ORDER BY timestamp DESC, id DESC LIMIT 51",
+         'ix_chat_message_user_timestamp'),
+        ('consultations for a user',
+         "SELECT * FROM consultation WHERE user_id = 1 ORDER BY timestamp DESC",
+         'ix_consultation_user_timestamp'),
+        ('documents for a user',
+         "SELECT * FROM medical_document WHERE user_id = 1 ORDER BY upload_date DESC",
+         'ix_medical_document_user_upload_date'),
+        ('due reminders',
+         "SELECT * FROM reminder WHERE is_sent = 0 AND scheduled_time <= '2030-01-01' ORDER BY scheduled_time",
+         'ix_reminder_is_sent_scheduled_time'),
+    ],
+}
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            app VARCHAR(32) NOT NULL,
+            version INTEGER NOT NULL,
+            name VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (app, version)
+        )
+    """))
+
+def applied_versions(engine: Engine, app: str) -> List[int]:
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        rows = conn.execute(text("SELECT version FROM schema_migrations WHERE app = :app ORDER BY version"),
+                            {'app': app})
+        return [row[0] for row in rows]
+
+def migrate(engine: Engine, app: str) -> List[Migration]:
+    """Apply pending migrations in order, each in its own transaction; returns those applied"""
+    done = set(applied_versions(engine, app))
+    applied = []
+    for migration in sorted(MIGRATIONS[app], key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (app, version, name, applied_at) VALUES (:app, :v, :n, :t)"),
+                {'app': app, 'v': migration.version, 'n': migration.name, 't': datetime.utcnow()}
+            )
+        applied.append(migration)
+    return applied
+
+def check_query_plans(engine: Engine, app: str) -> List[str]:
+    """Problems with the hot-query plans; empty when every hot query uses its index.
+
+    Only SQLite plans are checked; other backends pick plans from table
+    statistics, so a small database is not representative.
+    """
+    if engine.dialect.name != 'sqlite':
+        return []
+    problems = []
+    with engine.connect() as conn:
+        for description, sql, index in HOT_QUERIES[app]:
+            table = sql.split(' FROM ')[1].split()[0]
+            if not inspect(conn).has_table(table):
+                continue
+            plan = ' | '.join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+            if index not in plan:
+                problems.append(f"{description}: expected {index}, got: {plan}")
+    return problems
+
+if __name__ == '__main__':
+    from sqlalchemy import create_engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    app = sys.argv[2] if len(sys.argv) > 2 else 'api'
+    default_url = 'sqlite:///./mediguide.db' if app == 'api' else 'sqlite:///instance/mediguide.db'
+    engine = create_engine(sys.argv[3] if len(sys.argv) > 3 else os.getenv('DATABASE_URL', default_url))
+
+    if command == 'upgrade':
+        for migration in migrate(engine, app):
+            print(f"Applied {app} migration {migration.version}: {migration.name}")
+    elif command == 'status':
+        done = set(applied_versions(engine, app))
+        for migration in MIGRATIONS[app]:
+            print(f"[{'x' if migration.version in done else ' '}] {migration.version}: {migration.name}")
+    elif command == 'check':
+        problems = check_query_plans(engine, app)
+        for problem in problems:
+            print(problem)
+        print("All hot queries use their indexes" if not problems else f"{len(problems)} hot queries lost their index")
+        sys.exit(1 if problems else 0)
+    else:
+        print(__doc__)
+        sys.exit(1)
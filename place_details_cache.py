@@ -0,0 +1,139 @@
+import json
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import cached_property
+from typing import Dict, List, Optional
+import cache_db
+from config import get_settings
+from resilience import guarded_call
+
+settings = get_settings()
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+# Fields that only change when the place itself changes
+STATIC_FIELDS = {'name', 'formatted_address', 'formatted_phone_number', 'website', 'geometry'}
+# The weekly schedule and the offset needed to evaluate it locally
+HOURS_FIELDS = {'opening_hours', 'utc_offset'}
+
+def _minute_of_week(point: Dict) -> int:
+    """Minutes since Sunday 00:00 for a Places period point ({'day': 0-6, 'time': 'HHMM'})"""
+    return int(point['day']) * 1440 + int(point['time'][:2]) * 60 + int(point['time'][2:])
+
+def is_open_at(opening_hours: Optional[Dict], utc_offset: Optional[int],
+               now: Optional[datetime] = None) -> Optional[bool]:
+    """Whether a place is open, from its weekly periods and UTC offset in minutes.
+
+    Returns None when the schedule or the offset is unknown.
+    """
+    periods = (opening_hours or {}).get('periods')
+    if not periods or utc_offset is None:
+        return None
+
+    now = now or datetime.now(timezone.utc)
+    local = now.astimezone(timezone.utc) + timedelta(minutes=utc_offset)
+    # Places counts days from Sunday, Python from Monday
+    current = ((local.weekday() + 1) % 7) * 1440 + local.hour * 60 + local.minute
+
+    for period in periods:
+        if 'close' not in period:
+            return True  # A lone open with no close means open 24/7
+        start = _minute_of_week(period['open'])
+        end = _minute_of_week(period['close'])
+        if end <= start:
+            end += MINUTES_PER_WEEK  # Wraps past Saturday midnight
+        if start <= current < end or start <= current + MINUTES_PER_WEEK < end:
+            return True
+    return False
+
+class PlaceDetailsCache:
+    """Place details cache with a TTL per field.
+
+    Contact fields (name, address, phone, website, location) are kept for
+    PLACE_DETAILS_TTL_SECONDS and the weekly opening hours for
+    PLACE_HOURS_TTL_SECONDS; anything else (e.g. rating) for
+    PLACE_VOLATILE_TTL_SECONDS. Only expired fields are refetched. open_now is
+    never cached: it is computed at read time from the cached periods and the
+    place's UTC offset, so a warm cache needs no details call at all.
+    """
+
+    def __init__(self, path: str = None):
+        self.ttls = {}
+        for field in STATIC_FIELDS:
+            self.ttls[field] = settings.PLACE_DETAILS_TTL_SECONDS
+        for field in HOURS_FIELDS:
+            self.ttls[field] = settings.PLACE_HOURS_TTL_SECONDS
+        self._lock = threading.Lock()
+        self._path = path
+
+    @cached_property
+    def _conn(self):
+        # Connected on first use, like the geocode cache
+        conn = cache_db.connect(self._path)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS place_details_cache (
+                    place_id TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    value TEXT,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (place_id, field)
+                )
+            """)
+        return conn
+
+    def ttl_for(self, field: str) -> int:
+        return self.ttls.get(field, settings.PLACE_VOLATILE_TTL_SECONDS)
+
+    def get_cached(self, place_id: str, fields: List[str]) -> Dict:
+        """Unexpired cached fields for a place; missing keys need a refetch"""
+        placeholders = ', '.join('?' for _ in fields)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT field, value FROM place_details_cache "
+                f"WHERE place_id = ? AND field IN ({placeholders}) AND expires_at > ?",
+                (place_id, *fields, time.time())
+            ).fetchall()
+        return {field: json.loads(value) for field, value in rows}
+
+    def set_fields(self, place_id: str, result: Dict, fields: List[str]):
+        """Store fetched fields, returning them as stored; requested fields
+        absent from the result are cached as null"""
+        now = time.time()
+        rows, stored = [], {}
+        for field in fields:
+            value = result.get(field)
+            if field == 'opening_hours' and value:
+                # open_now is only true at fetch time
+                value = {k: v for k, v in value.items() if k != 'open_now'}
+            stored[field] = value
+            rows.append((place_id, field, json.dumps(value), now + self.ttl_for(field)))
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO place_details_cache VALUES (?, ?, ?, ?)", rows)
+        return stored
+
+    def details(self, gmaps, place_id: str, fields: List[str]) -> Dict:
+        """Place details like gmaps.place(...)['result'], with opening_hours.open_now evaluated now"""
+        fields = list(fields)
+        if 'opening_hours' in fields and 'utc_offset' not in fields:
+            fields.append('utc_offset')
+
+        result = self.get_cached(place_id, fields)
+        missing = [field for field in fields if field not in result]
+        if missing:
+            fetched = guarded_call(
+                'maps', lambda timeout: gmaps.place(place_id, fields=missing), idempotent=True
+            ).get('result', {})
+            result.update(self.set_fields(place_id, fetched, missing))
+
+        result = {field: value for field, value in result.items() if value is not None}
+        if 'opening_hours' in result:
+            result['opening_hours'] = dict(
+                result['opening_hours'],
+                open_now=is_open_at(result['opening_hours'], result.get('utc_offset'))
+            )
+        return result
+
+# Singleton instance
+place_details_cache = PlaceDetailsCache()
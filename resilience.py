@@ -0,0 +1,275 @@
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+from config import get_settings
+from llm_gateway import coalesced, is_throttled
+
+settings = get_settings()
+
+T = TypeVar('T')
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out before the upstream answered"""
+
+class CircuitOpen(RuntimeError):
+    """The upstream is failing; the call was not attempted"""
+
+# Error types worth another attempt, matched by name so the SDKs need not be imported here
+_TRANSIENT_ERRORS = {
+    'Timeout', 'ReadTimeout', 'ConnectTimeout', 'ConnectionError', 'TransportError', '_OverQueryLimit',
+    'ServiceUnavailable', 'InternalServerError', 'DeadlineExceeded', 'GatewayTimeout', 'TooManyRequests',
+    'ResourceExhausted',
+}
+
+def is_transient(error: BaseException) -> bool:
+    """True for timeouts, connection failures, 5xx and 429 responses"""
+    if isinstance(error, (TimeoutError, ConnectionError)) or is_throttled(error):
+        return True
+    if any(cls.__name__ in _TRANSIENT_ERRORS for cls in type(error).__mro__):
+        return True
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    return isinstance(status, int) and status >= 500
+
+class Deadline:
+    """End-to-end time budget of one request"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar('deadline', default=None)
+
+@contextmanager
+def request_deadline(seconds: float = None):
+    """Give the calls made inside this block one shared budget (REQUEST_DEADLINE_SECONDS).
+
+    The budget travels in a context variable, so asyncio.to_thread and
+    fanout.fetch_concurrently carry it into worker threads. A nested block
+    can only shorten the budget, never extend it.
+    """
+    deadline = Deadline(settings.REQUEST_DEADLINE_SECONDS if seconds is None else seconds)
+    outer = _deadline.get()
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            # An abandoned async generator closed from another context; nothing to restore there
+            pass
+
+def stage_timeout(cap: float, share: float = 1.0) -> float:
+    """Seconds a stage may take: its share of what is left of the request budget, at most cap.
+
+    Outside request_deadline() stages just get cap.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return cap
+    return min(cap, deadline.remaining() * share)
+
+class CircuitBreaker:
+    """Per-upstream circuit breaker.
+
+    Opens after failure_threshold consecutive transient failures; while open
+    calls fail at once with CircuitOpen. After reset_timeout one trial call
+    is let through (half-open): success closes the circuit, failure opens it
+    for another reset_timeout.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = settings.BREAKER_RESET_SECONDS if reset_timeout is None else reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._stats = {'opened': 0, 'short_circuited': 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'half_open' if now - self._opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        """Raise CircuitOpen unless a call may go ahead"""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == 'closed':
+                return
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return
+            self._stats['short_circuited'] += 1
+        raise CircuitOpen(f"{self.name} circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    self._stats['opened'] += 1
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+    def record(self, error: BaseException = None):
+        """Record a call's outcome: no error closes, a transient error counts as a failure.
+
+        Other errors (a bad request, our own GatewayOverloaded) say nothing
+        about the upstream's health; they only free the half-open trial.
+        """
+        if isinstance(error, CircuitOpen):
+            return
+        if error is None:
+            self.record_success()
+        elif is_transient(error):
+            self.record_failure()
+        else:
+            self.release()
+
+    def release(self):
+        """Give up a call slot without a verdict on the upstream"""
+        with self._lock:
+            self._trial_running = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, state=self._state(time.monotonic()), failures=self._failures)
+
+breakers = {
+    'gemini': CircuitBreaker('gemini'),
+    'maps': CircuitBreaker('maps'),
+}
+
+UPSTREAM_TIMEOUTS = {
+    'gemini': settings.GEMINI_TIMEOUT_SECONDS,
+    'maps': settings.MAPS_TIMEOUT_SECONDS,
+}
+
+# googlemaps.Client options: our own retries replace its 60 s retry loop
+MAPS_CLIENT_OPTIONS = {
+    'timeout': settings.MAPS_TIMEOUT_SECONDS,
+    'retry_timeout': settings.MAPS_TIMEOUT_SECONDS,
+    'retry_over_query_limit': False,
+}
+
+# Runs blocking calls so the caller can stop waiting at its deadline; a call
+# that overruns keeps its thread until the client's own timeout ends it
+_pool = ThreadPoolExecutor(max_workers=settings.RESILIENCE_WORKERS, thread_name_prefix='upstream')
+
+def guarded_call(upstream: str, fn: Callable[[float], T], share: float = 1.0, idempotent: bool = False) -> T:
+    """Call fn(timeout) against an upstream with a deadline, retries and a circuit breaker.
+
+    timeout is the seconds fn's own client should allow; guarded_call stops
+    waiting at the same point regardless. Only idempotent calls are retried,
+    on transient errors, with capped exponential backoff and full jitter,
+    and only while the budget lasts. Raises CircuitOpen without calling fn
+    while the upstream's circuit is open.
+    """
+    breaker = breakers[upstream]
+    breaker.allow()
+    budget_ends = time.monotonic() + stage_timeout(UPSTREAM_TIMEOUTS[upstream], share)
+    attempts = settings.RETRY_MAX_ATTEMPTS if idempotent else 1
+    for attempt in range(attempts):
+        timeout = budget_ends - time.monotonic()
+        if timeout <= 0:
+            # Earlier stages used up the budget; not the upstream's fault
+            breaker.release()
+            raise DeadlineExceeded(f"{upstream}: no time left in the request budget")
+        context = contextvars.copy_context()
+        future = _pool.submit(context.run, fn, timeout)
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            error = DeadlineExceeded(f"{upstream} did not answer within {timeout:.1f}s")
+        except Exception as e:
+            error = e
+        else:
+            breaker.record_success()
+            return result
+
+        if context.get(coalesced):
+            # A coalesced LLM call re-raises its leader's error; the leader records it once
+            breaker.release()
+        else:
+            breaker.record(error)
+        if not is_transient(error):
+            # The upstream answered; the request itself was bad
+            raise error
+        delay = random.uniform(0, min(settings.RETRY_MAX_DELAY_SECONDS, settings.RETRY_BASE_DELAY_SECONDS * 2 ** attempt))
+        if attempt + 1 == attempts or time.monotonic() + delay >= budget_ends:
+            raise error
+        time.sleep(delay)
+        try:
+            breaker.allow()
+        except CircuitOpen:
+            # This failure opened the circuit; report it rather than the short-circuit
+            raise error from None
+
+async def bounded_stream(upstream: str, start: Awaitable, timeout: float) -> AsyncIterator:
+    """Await start (a call returning an async iterable) and yield its items, all within timeout seconds.
+
+    The asyncio counterpart of guarded_call's wait, for streamed responses
+    whose client-side timeout does not cover the whole stream. Raises
+    DeadlineExceeded.
+    """
+    ends = time.monotonic() + timeout
+    try:
+        iterator = (await asyncio.wait_for(start, timeout)).__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), max(0.0, ends - time.monotonic()))
+            except StopAsyncIteration:
+                return
+            yield chunk
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"{upstream} stream did not finish within {timeout:.1f}s") from None
+
+def resilience_stats() -> Dict:
+    return {name: breaker.stats() for name, breaker in breakers.items()}
+
+if __name__ == '__main__':
+    # Hung-upstream check: python resilience.py
+    # Every call hangs; requests still end at their deadline and, once the
+    # circuit opens, fail at once without touching the upstream.
+    calls = 0
+
+    def hang(timeout: float):
+        global calls
+        calls += 1
+        time.sleep(timeout + 5)
+
+    breakers['maps'] = CircuitBreaker('maps', failure_threshold=3, reset_timeout=60)
+    for request in range(6):
+        started = time.perf_counter()
+        with request_deadline(1.0):
+            try:
+                guarded_call('maps', hang, idempotent=True)
+            except (DeadlineExceeded, CircuitOpen) as e:
+                outcome = type(e).__name__
+        print(f"request {request}: {outcome:16} after {time.perf_counter() - started:4.2f} s, "
+              f"upstream calls {calls}, circuit {breakers['maps'].state}")
+    _pool.shutdown(wait=False, cancel_futures=True)
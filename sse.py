@@ -0,0 +1,10 @@
+import json
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+}
+
+def format_sse(event: str, data) -> str:
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
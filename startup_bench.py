@@ -0,0 +1,79 @@
+"""Import-time budget for the app entry points.
+
+Each module is imported in a fresh interpreter under `python -X importtime`,
+so nothing is shared between runs. Prints the total import time and the
+slowest imports, and exits 1 when any entry point is over budget.
+
+    python startup_bench.py [--budget-ms 1500] [--top 10] [main app backend]
+
+The budget can also be set with STARTUP_BUDGET_MS.
+"""
+import os
+import sys
+import argparse
+import subprocess
+from typing import List, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (working directory, module); backend/main.py shadows the root main.py from its own directory
+ENTRY_POINTS = {
+    'main': (ROOT, 'main'),
+    'app': (ROOT, 'app'),
+    'backend': (os.path.join(ROOT, 'backend'), 'main'),
+}
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, str]]:
+    """(self_us, cumulative_us, module) for each line of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # column header
+        rows.append((int(fields[0]), int(fields[1]), fields[2].rstrip()))
+    return rows
+
+def measure(name: str) -> Tuple[int, List[Tuple[int, int, str]]]:
+    """Total import time in microseconds and the per-module rows"""
+    cwd, module = ENTRY_POINTS[name]
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed in {cwd}:\n{result.stderr[-2000:]}")
+    rows = parse_importtime(result.stderr)
+    # Top-level imports have no indentation; their cumulative times add up to the total
+    total = sum(cumulative for _, cumulative, package in rows if not package.startswith('  '))
+    return total, rows
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('entry_points', nargs='*', help=f"any of {', '.join(ENTRY_POINTS)} (default: all)")
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', 1500)))
+    parser.add_argument('--top', type=int, default=10, help='slowest top-level packages to list')
+    args = parser.parse_args()
+    unknown = set(args.entry_points) - set(ENTRY_POINTS)
+    if unknown:
+        parser.error(f"unknown entry points: {', '.join(sorted(unknown))}")
+
+    over = []
+    for name in args.entry_points or ENTRY_POINTS:
+        total, rows = measure(name)
+        total_ms = total / 1000
+        status = 'OK' if total_ms <= args.budget_ms else 'OVER BUDGET'
+        print(f"{name}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms) {status}")
+        # Slowest packages by cumulative time, counting each top-level package once
+        module = ENTRY_POINTS[name][1]
+        top_level = [(cumulative, package.strip()) for _, cumulative, package in rows
+                     if '.' not in package.strip() and package.strip() != module]
+        for cumulative, package in sorted(top_level, reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {package}")
+        if total_ms > args.budget_ms:
+            over.append(name)
+    return 1 if over else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,34 +2,84 @@
 
 let chatHistory = [];
 let isTyping = false;
+let oldestCursor = null;
+let hasOlderHistory = false;
+let isLoadingHistory = false;
 
 // Initialize chat when page loads
 document.addEventListener('DOMContentLoaded', function() {
     loadChatHistory();
     initializeChatForm();
     initializeQuickActions();
+    initializeHistoryScroll();
 });
 
-// Load chat history from server
+// Fetch one page of chat history; newest page when no cursor is given
+async function fetchHistoryPage(before = null) {
+    const params = new URLSearchParams({ limit: 50 });
+    if (before) params.set('before', before);
+    
+    const response = await fetch(`/api/chat_history?${params}`);
+    return response.json();
+}
+
+// Load the newest page of chat history from server
 async function loadChatHistory() {
     try {
-        const response = await fetch('/api/chat_history');
-        const history = await response.json();
+        const page = await fetchHistoryPage();
         
-        chatHistory = history;
+        chatHistory = page.messages;
+        oldestCursor = page.before;
+        hasOlderHistory = page.has_more;
         displayChatHistory();
     } catch (error) {
         console.error('Error loading chat history:', error);
     }
 }
 
+// Load the next older page when the user scrolls to the top
+async function loadOlderHistory() {
+    if (!hasOlderHistory || isLoadingHistory) return;
+    isLoadingHistory = true;
+    
+    try {
+        const page = await fetchHistoryPage(oldestCursor);
+        const messagesContainer = document.getElementById('chatMessages');
+        const previousHeight = messagesContainer.scrollHeight;
+        
+        // Insert older messages above the current ones, after the welcome message
+        const fragment = document.createDocumentFragment();
+        page.messages.forEach(chat => {
+            fragment.appendChild(createMessageElement(chat.message, 'user', chat.timestamp));
+            fragment.appendChild(createMessageElement(chat.response, 'bot', chat.timestamp, chat.severity_score));
+        });
+        const welcomeMessage = messagesContainer.querySelector('.welcome-message');
+        messagesContainer.insertBefore(fragment, welcomeMessage ? welcomeMessage.nextSibling : messagesContainer.firstChild);
+        
+        // Keep the messages the user was reading in place
+        messagesContainer.scrollTop += messagesContainer.scrollHeight - previousHeight;
+        
+        chatHistory = page.messages.concat(chatHistory);
+        oldestCursor = page.before;
+        hasOlderHistory = page.has_more;
+    } catch (error) {
+        console.error('Error loading older chat history:', error);
+    } finally {
+        isLoadingHistory = false;
+    }
+}
+
+function initializeHistoryScroll() {
+    const messagesContainer = document.getElementById('chatMessages');
+    messagesContainer.addEventListener('scroll', function() {
+        if (this.scrollTop < 50) {
+            loadOlderHistory();
+        }
+    });
+}
+
 // Display chat history in the UI
 function displayChatHistory() {
-    const messagesContainer = document.getElementById('chatMessages');
-    
-    // Keep welcome message, add history after it
-    const welcomeMessage = messagesContainer.querySelector('.welcome-message');
-    
     chatHistory.forEach(chat => {
         addMessageToUI(chat.message, 'user', chat.timestamp);
         addMessageToUI(chat.response, 'bot', chat.timestamp, chat.severity_score);
@@ -121,6 +171,12 @@ async function handleMessageSubmit(e) {
 // Add message to UI
 function addMessageToUI(message, sender, timestamp = null, severityScore = null) {
     const messagesContainer = document.getElementById('chatMessages');
+    messagesContainer.appendChild(createMessageElement(message, sender, timestamp, severityScore));
+    scrollToBottom();
+}
+
+// Build a message element
+function createMessageElement(message, sender, timestamp = null, severityScore = null) {
     const messageElement = document.createElement('div');
     
     messageElement.className = `message ${sender}-message`;
@@ -161,8 +217,7 @@ function addMessageToUI(message, sender, timestamp = null, severityScore = null)
         content.appendChild(timeElement);
     }
     
-    messagesContainer.appendChild(messageElement);
-    scrollToBottom();
+    return messageElement;
 }
 
 // Show typing indicator
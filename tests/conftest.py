@@ -0,0 +1,46 @@
+import os
+import sys
+import uuid
+import tempfile
+
+import pytest
+
+# Settings are read once on first import; point every database and store at a
+# scratch directory so the suite never touches the project's own files
+_scratch = tempfile.mkdtemp(prefix='mediguide-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_scratch, 'mediguide.db')}"
+os.environ['CACHE_DB_PATH'] = os.path.join(_scratch, 'cache.db')
+os.environ['UPLOAD_DIR'] = os.path.join(_scratch, 'uploads')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope='session')
+def flask_app():
+    """The Flask app with its tables created and migrated in the scratch database"""
+    from app import app, db
+    from migrations import migrate
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        migrate(db.engine, 'flask')
+    return app
+
+@pytest.fixture
+def flask_user(flask_app):
+    """A new registered user: (id, email, password)"""
+    from werkzeug.security import generate_password_hash
+    from app import User, db
+    email, password = f"{uuid.uuid4().hex}@example.com", 'secret'
+    with flask_app.app_context():
+        user = User(email=email, name='Test Patient', password_hash=generate_password_hash(password))
+        db.session.add(user)
+        db.session.commit()
+        return user.id, email, password
+
+@pytest.fixture
+def flask_client(flask_app, flask_user):
+    """A test client logged in as flask_user"""
+    client = flask_app.test_client()
+    _, email, password = flask_user
+    assert client.post('/login', json={'email': email, 'password': password}).get_json()['success']
+    return client
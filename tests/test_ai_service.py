@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+from ai_service import AIService, profile_key
+
+ALICE = {'age': 30, 'gender': 'female', 'allergies': 'penicillin', 'location_preference': 'Chennai'}
+BETA = {'age': 31, 'gender': 'female', 'allergies': 'peanuts', 'location_preference': 'Madurai'}
+
+def test_profile_key_covers_every_prompt_field():
+    assert profile_key(ALICE) == profile_key(dict(ALICE))
+    assert profile_key(ALICE) != profile_key(BETA)
+    assert profile_key(ALICE) != profile_key(dict(ALICE, blood_group='O+'))
+    assert profile_key(None) == profile_key({}) == ''
+
+def test_cached_advice_is_not_shared_between_profiles(monkeypatch):
+    service = AIService()
+    monkeypatch.setattr(service, '_generate', lambda prompt: SimpleNamespace(text=prompt))
+
+    alice = service.get_medical_advice("I have a rash", ALICE)
+    beta = service.get_medical_advice("I have a rash", BETA)
+
+    assert 'penicillin' in alice and 'Chennai' in alice
+    assert 'penicillin' not in beta and 'Chennai' not in beta
+    assert service.get_medical_advice("I have a rash!", ALICE) == alice
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+START = datetime(2024, 6, 1, 9, 0)
+
+def _add_messages(flask_app, user_id: int, minutes) -> None:
+    from app import ChatMessage, db
+    with flask_app.app_context():
+        for i, minute in enumerate(minutes):
+            message = ChatMessage(user_id=user_id, message=f"m{minute}-{i}", severity_score=30,
+                                  timestamp=START + timedelta(minutes=minute))
+            message.response = "reply"
+            db.session.add(message)
+        db.session.commit()
+
+def _page(client, **params) -> dict:
+    response = client.get('/api/chat_history', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+@pytest.fixture
+def history(flask_app, flask_user, flask_client):
+    # Two messages share a timestamp, so pages must break ties by id
+    _add_messages(flask_app, flask_user[0], [0, 1, 2, 2, 3, 4, 5])
+    return flask_client
+
+def test_pages_walk_back_without_gaps_or_repeats(history):
+    newest = _page(history, limit=3)
+    assert [m['message'] for m in newest['messages']] == ['m3-4', 'm4-5', 'm5-6']
+    assert newest['has_more'] is True
+
+    middle = _page(history, limit=3, before=newest['before'])
+    assert [m['message'] for m in middle['messages']] == ['m1-1', 'm2-2', 'm2-3']
+    assert middle['has_more'] is True
+
+    oldest = _page(history, limit=3, before=middle['before'])
+    assert [m['message'] for m in oldest['messages']] == ['m0-0']
+    assert oldest['has_more'] is False
+
+def test_full_page_at_the_end_has_no_more(history):
+    assert _page(history, limit=7)['has_more'] is False
+    assert _page(history, limit=6)['has_more'] is True
+
+def test_after_returns_only_newer_messages(flask_app, flask_user, history):
+    newest = _page(history, limit=3)
+    assert _page(history, after=newest['after'])['messages'] == []
+
+    _add_messages(flask_app, flask_user[0], [6])
+    assert [m['message'] for m in _page(history, after=newest['after'])['messages']] == ['m6-0']
+
+def test_unchanged_page_revalidates_with_304(flask_app, flask_user, history):
+    first = history.get('/api/chat_history', query_string={'limit': 3})
+    etag = first.headers['ETag']
+    assert 'no-cache' in first.headers['Cache-Control']
+
+    again = history.get('/api/chat_history', query_string={'limit': 3}, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+
+    _add_messages(flask_app, flask_user[0], [6])
+    changed = history.get('/api/chat_history', query_string={'limit': 3}, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+@pytest.mark.parametrize('params', [{'before': 'not-a-cursor'}, {'after': '2024-06-01T09:00:00_x'}, {'limit': 'ten'}])
+def test_bad_cursor_or_limit_is_rejected(history, params):
+    assert history.get('/api/chat_history', query_string=params).status_code == 400
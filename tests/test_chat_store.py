@@ -0,0 +1,81 @@
+import os
+import importlib.util
+from datetime import datetime, timedelta
+
+import pytest
+
+from chat_store import ChatHistoryStore
+
+START = datetime(2024, 6, 1, 9, 0)
+
+def _record(user_id: str, i: int) -> dict:
+    return {
+        'user_id': user_id,
+        'message': f"message {i}",
+        'response': f"reply {i}",
+        'severity_score': 30,
+        'timestamp': (START + timedelta(minutes=i)).isoformat(),
+        'hospitals': [{'name': 'City Hospital'}] if i == 0 else []
+    }
+
+def _messages(records) -> list:
+    return [record['message'] for record in records]
+
+@pytest.fixture
+def store(tmp_path):
+    return ChatHistoryStore(str(tmp_path / 'history.db'), ring_size=3, max_users=2)
+
+def test_ring_spills_older_chats_to_disk(store):
+    for i in range(8):
+        store.append(_record('alice', i))
+    assert store.memory_stats() == {'users': 1, 'records': 3}
+
+    assert _messages(store.history('alice', limit=5)) == [f"message {i}" for i in range(3, 8)]
+    assert store.history('alice', limit=8)[0]['hospitals'] == [{'name': 'City Hospital'}]
+
+def test_paging_back_with_before_crosses_ring_and_disk(store):
+    for i in range(8):
+        store.append(_record('alice', i))
+    newest = store.history('alice', limit=4)
+    older = store.history('alice', limit=4, before=datetime.fromisoformat(newest[0]['timestamp']))
+    assert _messages(older + newest) == [f"message {i}" for i in range(8)]
+    assert store.history('alice', limit=4, before=START) == []
+
+def test_least_recent_user_is_evicted_to_disk(store):
+    for user in ('alice', 'bob', 'carol'):
+        store.append(_record(user, 0))
+    assert store.memory_stats()['users'] == 2
+    assert _messages(store.history('alice')) == ["message 0"]
+
+def test_close_keeps_history_across_restarts(tmp_path, store):
+    for i in range(2):
+        store.append(_record('alice', i))
+    store.close()
+    reopened = ChatHistoryStore(str(tmp_path / 'history.db'), ring_size=3, max_users=2)
+    assert _messages(reopened.history('alice')) == ["message 0", "message 1"]
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """backend/main.py with its chat history in a fresh store"""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend', 'main.py')
+    spec = importlib.util.spec_from_file_location('backend_main', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, 'chat_store', ChatHistoryStore(str(tmp_path / 'backend.db'), ring_size=3))
+    return module
+
+def test_backend_history_has_more_only_when_older_chats_exist(backend):
+    from fastapi.testclient import TestClient
+    for i in range(5):
+        backend.chat_store.append(_record('alice', i))
+    client = TestClient(backend.app)
+
+    def page(**params):
+        return client.get('/api/chat/history/alice', params=params).json()
+
+    full = page(limit=5)
+    assert (_messages(full['history']), full['has_more']) == ([f"message {i}" for i in range(5)], False)
+    newest = page(limit=3)
+    assert (_messages(newest['history']), newest['has_more']) == (["message 2", "message 3", "message 4"], True)
+    rest = page(limit=3, before=newest['history'][0]['timestamp'])
+    assert (_messages(rest['history']), rest['has_more']) == (["message 0", "message 1"], False)
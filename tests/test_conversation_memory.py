@@ -0,0 +1,47 @@
+import pytest
+
+from conversation_memory import ConversationMemory, estimate_tokens
+
+@pytest.fixture
+def memory(tmp_path):
+    return ConversationMemory(lambda summary, turns: f"{summary} {len(turns)} older turns".strip(),
+                              path=str(tmp_path / 'memory.db'), recent_turns=3, summarize_every=2,
+                              token_budget=120, summary_tokens=30)
+
+def test_context_stays_within_the_token_budget(memory):
+    for i in range(20):
+        memory.record('patient', f"message {i} " + 'ache ' * 20, f"reply {i} " + 'rest ' * 20)
+        memory.flush()
+        assert estimate_tokens(memory.context('patient')) <= memory.token_budget
+
+    context = memory.context('patient')
+    assert context.startswith("Summary of earlier conversation:")
+    assert "message 19" in context
+    assert "message 0 " not in context
+
+def test_older_turns_are_folded_into_the_summary(memory):
+    for i in range(5):
+        memory.record('patient', f"message {i}", f"reply {i}")
+    memory.flush()
+
+    context = memory.context('patient')
+    assert "2 older turns" in context
+    assert "message 1" not in context
+    assert all(f"message {i}" in context for i in (2, 3, 4))
+
+def test_failed_summarizer_keeps_the_patients_words(tmp_path):
+    def failing(summary, turns):
+        raise RuntimeError("model unavailable")
+
+    memory = ConversationMemory(failing, path=str(tmp_path / 'memory.db'), recent_turns=1,
+                                summarize_every=1, token_budget=200, summary_tokens=50)
+    memory.record('patient', "my ankle is swollen", "keep it raised")
+    memory.record('patient', "it still hurts", "see a doctor")
+    memory.flush()
+    assert "Patient said: my ankle is swollen" in memory.context('patient')
+
+def test_conversations_are_separate(memory):
+    memory.record('a', "headache", "drink water")
+    assert memory.context('b') == ''
+    memory.clear('a')
+    assert memory.context('a') == ''
@@ -0,0 +1,114 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+from PIL import Image
+
+from document_worker import DocumentWorker, RejectedDocument, process_document
+
+OPTIONS = {'max_side': 64, 'thumbnail_side': 16, 'quality': 80, 'max_text_chars': 1000,
+           'analyzer': 'document_worker:stub_analyzer'}
+
+def _png(path, size=(200, 100)) -> str:
+    Image.new('RGB', size, 'white').save(path, 'PNG')
+    return str(path)
+
+def _failed(error: Exception) -> Future:
+    future = Future()
+    future.set_exception(error)
+    return future
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    """A worker whose pool never starts, so jobs are claimed and finished by hand"""
+    worker = DocumentWorker(str(tmp_path / 'jobs.db'), max_attempts=3, retry_delay=10, job_timeout=60)
+    monkeypatch.setattr(worker, 'start', lambda: None)
+    return worker
+
+def test_image_is_downscaled_and_analyzed(tmp_path):
+    artifacts = process_document(_png(tmp_path / 'scan.png'), 'image/png', str(tmp_path / 'out'), OPTIONS)
+    assert (artifacts['width'], artifacts['height']) == (200, 100)
+    with Image.open(artifacts['preview']) as preview:
+        assert max(preview.size) == 64
+    assert artifacts['analysis'] == {'analyzer': 'stub', 'inputs': ['preview']}
+
+def test_unsupported_or_unreadable_uploads_are_rejected(tmp_path):
+    garbage = tmp_path / 'garbage'
+    garbage.write_bytes(b'\x89PNG\r\n\x1a\n' + b'\x00' * 64)
+    with pytest.raises(RejectedDocument):
+        process_document(str(garbage), 'application/zip', str(tmp_path / 'out'), OPTIONS)
+    with pytest.raises(RejectedDocument):
+        process_document(str(garbage), 'image/png', str(tmp_path / 'out'), OPTIONS)
+    with pytest.raises(RejectedDocument):
+        process_document(str(garbage), 'application/pdf', str(tmp_path / 'out'), OPTIONS)
+
+def test_decompression_bomb_is_rejected(tmp_path, monkeypatch):
+    # Past twice the pixel limit Pillow refuses to decode the image at all
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    with pytest.raises(RejectedDocument, match='too large'):
+        process_document(_png(tmp_path / 'bomb.png'), 'image/png', str(tmp_path / 'out'), OPTIONS)
+
+def test_failures_are_retried_with_backoff_then_given_up(worker):
+    assert worker.submit('abc', '/missing.png', 'image/png', '/out') == 'queued'
+    for attempt in (1, 2):
+        assert worker._claim()[0] == 'abc'
+        started = time.time()
+        worker._finish('abc', _failed(OSError('disk')))
+        job = worker.status('abc')
+        assert (job['status'], job['attempts']) == ('queued', attempt)
+        delay = worker._conn.execute("SELECT run_after FROM document_jobs").fetchone()[0] - started
+        assert delay == pytest.approx(10 * 2 ** (attempt - 1), abs=1)
+        # Not claimable again until the backoff has passed
+        assert worker._claim() is None
+        with worker._conn:
+            worker._conn.execute("UPDATE document_jobs SET run_after = 0")
+
+    worker._claim()
+    worker._finish('abc', _failed(OSError('disk')))
+    assert worker.status('abc')['status'] == 'failed'
+    assert worker._claim() is None
+    # A new upload of the same content starts over
+    assert worker.submit('abc', '/missing.png', 'image/png', '/out') == 'queued'
+    assert worker.status('abc')['attempts'] == 0
+
+def test_rejection_is_not_retried(worker):
+    worker.submit('abc', '/upload.zip', 'application/zip', '/out')
+    worker._claim()
+    worker._finish('abc', _failed(RejectedDocument('Unsupported document type')))
+    job = worker.status('abc')
+    assert (job['status'], job['attempts'], job['error']) == ('rejected', 1, 'Unsupported document type')
+    assert worker._claim() is None
+
+def test_lost_jobs_are_reclaimed_but_renewed_ones_are_not(worker, tmp_path):
+    worker.submit('lost', '/a.png', 'image/png', '/out')
+    worker.submit('alive', '/b.png', 'image/png', '/out')
+    claimed = {worker._claim()[0], worker._claim()[0]}
+    assert claimed == {'lost', 'alive'}
+    # Only "alive" is still in this process's pool; "lost" was left by a crashed process
+    worker._running.add('alive')
+
+    # Both leases are past job_timeout until the dispatcher renews its own
+    with worker._conn:
+        worker._conn.execute("UPDATE document_jobs SET updated_at = ?", (time.time() - 120,))
+    worker._renew_leases()
+    other = DocumentWorker(str(tmp_path / 'jobs.db'), job_timeout=60)
+    assert other._claim()[0] == 'lost'
+    assert other._claim() is None
+    assert other.status('lost')['attempts'] == 2
+
+def test_pool_processes_a_submitted_upload(tmp_path):
+    worker = DocumentWorker(str(tmp_path / 'jobs.db'), workers=1)
+    done = []
+    worker.on_done(lambda content_hash, artifacts: done.append(content_hash))
+    try:
+        worker.submit('scan', _png(tmp_path / 'scan.png'), 'image/png', str(tmp_path / 'out'))
+        deadline = time.monotonic() + 60
+        # Listeners run once the job is marked done
+        while not done:
+            assert time.monotonic() < deadline, "timed out"
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+    assert done == ['scan']
+    assert worker.status('scan')['status'] == 'done'
+    assert worker.status('scan')['artifacts']['width'] == 200
@@ -0,0 +1,93 @@
+import io
+import os
+import uuid
+
+import pytest
+
+from upload_store import upload_store
+
+def _content() -> bytes:
+    # Unique per test so every stored file and ETag is new
+    return b'%PDF-1.4\n' + uuid.uuid4().hex.encode() * 64
+
+@pytest.fixture
+def document(flask_app, flask_user, flask_client, tmp_path, monkeypatch):
+    """A stored Flask document: (client, download url, content, content hash)"""
+    from app import MedicalDocument, db
+    from app import upload_store as flask_store
+    content = _content()
+    stored = flask_store.save(io.BytesIO(content), 'report.pdf')
+    with flask_app.app_context():
+        row = MedicalDocument(user_id=flask_user[0], filename=stored.path, original_filename='report.pdf',
+                              file_type=stored.mime_type, file_size=stored.size, content_hash=stored.hash)
+        db.session.add(row)
+        db.session.commit()
+        document_id = row.id
+    # Paths must not depend on where the process was started
+    monkeypatch.chdir(tmp_path)
+    return flask_client, f'/api/documents/{document_id}/download', content, stored.hash
+
+def test_flask_store_root_is_absolute():
+    from app import app, upload_store as flask_store
+    assert os.path.isabs(flask_store.root)
+    assert flask_store.root == app.config['UPLOAD_FOLDER']
+
+def test_flask_range_request_gets_206(document):
+    client, url, content, _ = document
+    whole = client.get(url)
+    assert (whole.status_code, whole.data) == (200, content)
+
+    part = client.get(url, headers={'Range': 'bytes=5-14'})
+    assert part.status_code == 206
+    assert part.headers['Content-Range'] == f'bytes 5-14/{len(content)}'
+    assert part.data == content[5:15]
+
+def test_flask_matching_etag_gets_304(document):
+    client, url, _, content_hash = document
+    first = client.get(url)
+    assert first.headers['ETag'] == f'"{content_hash}"'
+    again = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert client.get(url, headers={'If-None-Match': '"other"'}).status_code == 200
+
+@pytest.fixture
+def report(tmp_path, monkeypatch):
+    """A stored API report: (client, auth headers, file url, content, content hash)"""
+    from fastapi.testclient import TestClient
+    from auth import create_access_token
+    from database import Base, Report, SessionLocal, User, engine
+    from main import app
+
+    Base.metadata.create_all(bind=engine)
+    content = _content()
+    stored = upload_store.save(io.BytesIO(content), 'report.pdf')
+    with SessionLocal() as db:
+        user = User(email=f"{uuid.uuid4().hex}@example.com", name='Patient', google_id=uuid.uuid4().hex)
+        db.add(user)
+        db.flush()
+        row = Report(user_id=user.id, filename='report.pdf', filepath=stored.path, file_size=stored.size,
+                     content_hash=stored.hash, mime_type=stored.mime_type)
+        db.add(row)
+        db.commit()
+        user_id, report_id = user.id, row.id
+    monkeypatch.chdir(tmp_path)
+    headers = {'Authorization': f"Bearer {create_access_token({'user_id': user_id})}"}
+    return TestClient(app), headers, f'/reports/{report_id}/file', content, stored.hash
+
+def test_api_range_request_gets_206(report):
+    client, headers, url, content, _ = report
+    whole = client.get(url, headers=headers)
+    assert (whole.status_code, whole.content) == (200, content)
+
+    part = client.get(url, headers=dict(headers, Range='bytes=5-14'))
+    assert part.status_code == 206
+    assert part.headers['Content-Range'] == f'bytes 5-14/{len(content)}'
+    assert part.content == content[5:15]
+
+def test_api_matching_etag_gets_304(report):
+    client, headers, url, _, content_hash = report
+    first = client.get(url, headers=headers)
+    assert first.headers['ETag'] == f'"{content_hash}"'
+    again = client.get(url, headers=dict(headers, **{'If-None-Match': first.headers['ETag']}))
+    assert again.status_code == 304
+    assert client.get(url, headers=dict(headers, **{'If-None-Match': '"other"'})).status_code == 200
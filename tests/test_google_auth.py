@@ -0,0 +1,70 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import auth
+
+class UserinfoStub(BaseHTTPRequestHandler):
+    """Google's userinfo endpoint: tokens starting with "slow" stall, "bad" ones are rejected"""
+    requests = []
+
+    def do_GET(self):
+        token = self.headers['Authorization'].removeprefix('Bearer ')
+        self.requests.append(token)
+        if token.startswith('slow'):
+            time.sleep(1)
+        if token.startswith('bad'):
+            self.send_response(401)
+            self.end_headers()
+            return
+        body = json.dumps({'id': token, 'email': 'patient@example.com', 'expires_in': 3600}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture(scope='module')
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), UserinfoStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/userinfo"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def google(stub_server, monkeypatch):
+    monkeypatch.setattr(auth.settings, 'GOOGLE_USERINFO_URL', stub_server)
+    monkeypatch.setattr(auth.settings, 'GOOGLE_HTTP_READ_TIMEOUT', 0.2)
+    UserinfoStub.requests = []
+    return UserinfoStub.requests
+
+def _token(prefix: str = 'good') -> str:
+    return f"{prefix}-{uuid.uuid4().hex}"
+
+def test_verified_userinfo_is_cached(google):
+    token = _token()
+    assert auth.verify_google_token(token)['id'] == token
+    assert auth.verify_google_token(token)['id'] == token
+    assert google == [token]
+
+def test_rejected_token_is_not_cached(google):
+    token = _token('bad')
+    assert auth.verify_google_token(token) is None
+    assert auth.verify_google_token(token) is None
+    assert google == [token, token]
+
+def test_slow_userinfo_times_out_and_is_not_cached(google):
+    token = _token('slow')
+    started = time.monotonic()
+    assert auth.verify_google_token(token) is None
+    assert time.monotonic() - started < 0.9
+    assert auth.google_token_cache.get(hashlib.sha256(token.encode()).hexdigest()) is None
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from hospital_catalog import HospitalCatalog, covering_prefixes, geohash_encode
+
+ORIGIN = (13.0827, 80.2707)
+# Roughly 1 km of latitude
+KM = 1 / 111.2
+
+def _period_point(when: datetime) -> dict:
+    return {'day': (when.weekday() + 1) % 7, 'time': when.strftime('%H%M')}
+
+def _hours_starting_in(hours: int) -> dict:
+    """A one-hour UTC opening period starting hours from now"""
+    start = datetime.now(timezone.utc) + timedelta(hours=hours)
+    return {'periods': [{'open': _period_point(start), 'close': _period_point(start + timedelta(hours=1))}]}
+
+def _hospital(place_id: str, km_north: float, **details) -> dict:
+    return dict(dict(place_id=place_id, name=place_id, lat=ORIGIN[0] + km_north * KM, lng=ORIGIN[1]), **details)
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = HospitalCatalog(str(tmp_path / 'catalog.db'))
+    catalog.upsert([
+        _hospital('far', 3.0, specialties=['Cardiology']),
+        _hospital('near', 0.5, opening_hours=_hours_starting_in(3), utc_offset=0),
+        _hospital('middle', 1.5, opening_hours={'periods': [{'open': {'day': 0, 'time': '0000'}}]}, utc_offset=0),
+        _hospital('out_of_range', 12.0),
+    ])
+    return catalog
+
+def test_nearest_is_ordered_and_bounded_by_radius(catalog):
+    results = catalog.nearest(*ORIGIN, radius_km=5.0)
+    assert [h['place_id'] for h in results] == ['near', 'middle', 'far']
+    assert results[0]['distance_km'] == pytest.approx(0.5, abs=0.01)
+    assert [h['place_id'] for h in catalog.nearest(*ORIGIN, k=2)] == ['near', 'middle']
+
+def test_opening_status_is_computed_when_read(catalog):
+    status = {h['place_id']: h['is_open'] for h in catalog.nearest(*ORIGIN)}
+    assert status == {'near': False, 'middle': True, 'far': None}
+
+def test_open_only_keeps_open_and_unknown(catalog):
+    assert [h['place_id'] for h in catalog.nearest(*ORIGIN, open_only=True)] == ['middle', 'far']
+
+def test_specialty_filter(catalog):
+    assert [h['place_id'] for h in catalog.nearest(*ORIGIN, specialty='cardiology')] == ['far']
+
+def test_covering_prefixes_include_the_origin_cell():
+    prefixes = covering_prefixes(*ORIGIN, radius_km=2.0)
+    assert any(geohash_encode(*ORIGIN).startswith(prefix) for prefix in prefixes)
+
+def test_is_sufficient_needs_enough_fresh_results(catalog):
+    results = catalog.nearest(*ORIGIN)
+    assert catalog.is_sufficient(results, min_results=3, max_age=60)
+    assert not catalog.is_sufficient(results, min_results=4, max_age=60)
+    assert not catalog.is_sufficient(results, min_results=1, max_age=-1)
+
+def test_rows_of_one_hospital_from_two_sources_are_merged(catalog):
+    catalog.upsert([_hospital('import:abc', 0.8, name='St. Mary Hospital', specialties=['Cardiology'],
+                              phone='044 1234')], source='osm')
+    catalog.upsert([_hospital('ChIJ-st-mary', 0.85, name='st mary hospital', website='https://stmary.example',
+                              opening_hours=_hours_starting_in(3), utc_offset=0)])
+
+    results = catalog.nearest(*ORIGIN)
+    merged = [h for h in results if 'mary' in h['name'].lower()]
+    assert len(merged) == 1
+    assert merged[0]['place_id'] == 'ChIJ-st-mary'
+    assert (merged[0]['phone'], merged[0]['website']) == ('044 1234', 'https://stmary.example')
+    assert merged[0]['specialties'] == ['cardiology']
+    assert merged[0]['distance_km'] == pytest.approx(0.8, abs=0.01)
+
+    # The Places row's hours say closed, so the merged hospital is dropped
+    assert 'ChIJ-st-mary' not in [h['place_id'] for h in catalog.nearest(*ORIGIN, open_only=True)]
+
+def test_same_name_far_apart_is_not_merged(catalog):
+    catalog.upsert([_hospital('branch-a', 0.2, name='Apollo Clinic'), _hospital('branch-b', 2.0, name='Apollo Clinic')])
+    assert [h['place_id'] for h in catalog.nearest(*ORIGIN) if h['name'] == 'Apollo Clinic'] == ['branch-a', 'branch-b']
@@ -0,0 +1,66 @@
+import uuid
+
+import pytest
+
+from identity_cache import IdentityCache
+
+def test_snapshot_is_cached_until_invalidated(flask_app, flask_user):
+    from app import User, db
+    cache = IdentityCache(maxsize=10, ttl=60)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return db.session.get(User, flask_user[0])
+
+    with flask_app.app_context():
+        first = cache.get(flask_user[0], load)
+        assert cache.get(flask_user[0], load) is first
+        assert len(loads) == 1
+
+        cache.invalidate(flask_user[0])
+        assert cache.get(flask_user[0], load) is not first
+        assert len(loads) == 2
+
+        assert cache.get(-1, lambda: None) is None
+        with pytest.raises(AttributeError):
+            first.name = 'changed'
+
+def _cached(user_id: int):
+    from app import user_cache
+    return user_cache._cache.get(user_id)
+
+def test_flask_profile_update_and_logout_invalidate(flask_client, flask_user):
+    user_id = flask_user[0]
+    flask_client.get('/api/chat_history')
+    assert _cached(user_id).name == 'Test Patient'
+
+    assert flask_client.post('/api/update_profile', json={'name': 'Renamed Patient'}).get_json()['success']
+    assert _cached(user_id) is None
+    flask_client.get('/api/chat_history')
+    assert _cached(user_id).name == 'Renamed Patient'
+
+    flask_client.get('/logout')
+    assert _cached(user_id) is None
+    assert flask_client.get('/api/chat_history').status_code == 302
+
+def test_api_profile_update_is_seen_at_once():
+    from fastapi.testclient import TestClient
+    from auth import create_access_token
+    from database import Base, SessionLocal, User, engine
+    from main import app
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = User(email=f"{uuid.uuid4().hex}@example.com", name='Before', google_id=uuid.uuid4().hex)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    client = TestClient(app)
+    headers = {'Authorization': f"Bearer {create_access_token({'user_id': user_id})}"}
+
+    assert client.get('/profile', headers=headers).json()['name'] == 'Before'
+    update = {'name': 'After', 'email': 'ignored@example.com', 'age': 40}
+    assert client.put('/profile', json=update, headers=headers).status_code == 200
+    profile = client.get('/profile', headers=headers).json()
+    assert (profile['name'], profile['age']) == ('After', 40)
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each entry point is imported in a fresh interpreter
+IMPORTS = {
+    'main': "import main",
+    'app': "import app",
+    'backend': "import importlib.util; spec = importlib.util.spec_from_file_location('backend_main', "
+               f"{os.path.join(ROOT, 'backend', 'main.py')!r}); spec.loader.exec_module(importlib.util.module_from_spec(spec))",
+}
+
+@pytest.mark.parametrize('entry_point', sorted(IMPORTS))
+def test_importing_creates_no_files(entry_point, tmp_path):
+    scratch = tmp_path / 'data'
+    scratch.mkdir()
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        DATABASE_URL=f"sqlite:///{scratch / 'mediguide.db'}",
+        CACHE_DB_PATH=str(scratch / 'cache.db'),
+        UPLOAD_DIR=str(scratch / 'uploads'),
+    )
+    subprocess.run([sys.executable, '-c', IMPORTS[entry_point]], cwd=tmp_path, env=env, check=True)
+    assert sorted(os.listdir(tmp_path)) == ['data']
+    assert os.listdir(scratch) == []
@@ -0,0 +1,134 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from llm_gateway import GatewayOverloaded, LLMGateway, is_throttled
+
+class Throttled(Exception):
+    code = 429
+
+def _gateway(**options) -> LLMGateway:
+    settings = dict(min_limit=1, max_limit=8, initial_limit=4, target_latency=5.0, max_queue=8, queue_timeout=1.0)
+    settings.update(options)
+    return LLMGateway(**settings)
+
+def _wait_for(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def test_identical_in_flight_calls_are_coalesced():
+    gateway = _gateway()
+    release = threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        release.wait(2)
+        return 'advice'
+
+    with ThreadPoolExecutor(5) as pool:
+        futures = [pool.submit(gateway.call, 'prompt', generate) for _ in range(5)]
+        _wait_for(lambda: gateway.stats()['coalesced'] == 4)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert results == ['advice'] * 5
+    assert len(calls) == 1
+    assert gateway.stats()['coalescing'] == 0
+
+def test_coalesced_callers_share_the_error():
+    gateway = _gateway()
+    release = threading.Event()
+
+    def generate():
+        release.wait(2)
+        raise Throttled()
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(gateway.call, 'prompt', generate) for _ in range(3)]
+        _wait_for(lambda: gateway.stats()['coalesced'] == 2)
+        release.set()
+        for future in futures:
+            with pytest.raises(Throttled):
+                future.result()
+
+def test_throttling_halves_the_limit():
+    gateway = _gateway()
+    with pytest.raises(Throttled):
+        with gateway.slot():
+            raise Throttled()
+    assert gateway.stats()['limit'] == 2
+    assert gateway.stats()['throttled'] == 1
+
+def test_fast_calls_raise_the_limit():
+    gateway = _gateway()
+    for _ in range(4):
+        with gateway.slot():
+            pass
+    assert gateway.stats()['limit'] > 4
+
+def test_full_queue_is_rejected():
+    gateway = _gateway(initial_limit=1, max_queue=0)
+    with gateway.slot():
+        with pytest.raises(GatewayOverloaded):
+            gateway.call('other', lambda: None)
+    assert gateway.stats()['rejected'] == 1
+
+def test_async_slot_waits_for_a_free_slot():
+    gateway = _gateway(initial_limit=1, max_limit=1)
+    order = []
+
+    async def use(name: str):
+        async with gateway.async_slot(measure_latency=False):
+            order.append(name)
+            await asyncio.sleep(0.02)
+
+    async def main():
+        await asyncio.gather(use('first'), use('second'))
+
+    asyncio.run(main())
+    assert order == ['first', 'second']
+    assert gateway.stats()['in_flight'] == 0
+
+async def _chunks(*items, fail: Exception = None):
+    for item in items:
+        await asyncio.sleep(0)
+        yield item
+    if fail:
+        raise fail
+
+def test_stream_frees_its_slot_before_a_slow_client_reads():
+    gateway = _gateway(initial_limit=1, max_limit=1)
+
+    async def main():
+        stream = gateway.async_stream(_chunks('a', 'b', 'c'))
+        first = await stream.__anext__()
+        # The upstream is done; the client has not read the rest yet
+        for _ in range(10):
+            await asyncio.sleep(0)
+        in_flight = gateway.stats()['in_flight']
+        return [first] + [chunk async for chunk in stream], in_flight
+
+    chunks, in_flight = asyncio.run(main())
+    assert chunks == ['a', 'b', 'c']
+    assert in_flight == 0
+
+def test_stream_errors_reach_the_client_and_count():
+    gateway = _gateway()
+
+    async def main():
+        return [chunk async for chunk in gateway.async_stream(_chunks('a', fail=Throttled()))]
+
+    with pytest.raises(Throttled):
+        asyncio.run(main())
+    assert gateway.stats()['throttled'] == 1
+    assert gateway.stats()['in_flight'] == 0
+
+def test_is_throttled_ignores_the_message_text():
+    assert is_throttled(Throttled())
+    assert not is_throttled(ValueError('invalid value 429 for max_tokens'))
@@ -0,0 +1,59 @@
+import pytest
+
+import maps_service
+from hospital_catalog import HospitalCatalog
+from maps_service import MapsService
+
+ORIGIN = {'lat': 13.0827, 'lng': 80.2707}
+
+def _place(place_id: str, open_now=None) -> dict:
+    place = {'place_id': place_id, 'name': place_id, 'vicinity': 'Chennai', 'geometry': {'location': ORIGIN}}
+    if open_now is not None:
+        place['opening_hours'] = {'open_now': open_now}
+    return place
+
+class FakeMaps:
+    def __init__(self, places):
+        self.places = places
+
+    def places_nearby(self, **kwargs):
+        self.search = kwargs
+        return {'results': self.places}
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(maps_service, 'hospital_catalog', HospitalCatalog(str(tmp_path / 'catalog.db')))
+    monkeypatch.setattr(maps_service.geocode_cache, 'geocode', lambda gmaps, location: ORIGIN)
+    return MapsService()
+
+def _details(monkeypatch, details: dict):
+    monkeypatch.setattr(maps_service.place_details_cache, 'details', lambda gmaps, place_id, fields: details[place_id])
+
+def test_unknown_computed_status_falls_back_to_the_search(service, monkeypatch):
+    service.gmaps = FakeMaps([_place('open', open_now=True), _place('closed', open_now=False), _place('unknown')])
+    # Details without periods or a UTC offset: open_now could not be computed
+    _details(monkeypatch, {place_id: dict(_place(place_id), opening_hours={'open_now': None})
+                           for place_id in ('open', 'closed', 'unknown')})
+
+    status = {h['name']: h['is_open'] for h in service.find_nearby_hospitals('Chennai')}
+    assert status == {'open': True, 'closed': False, 'unknown': None}
+
+def test_computed_status_wins_over_the_search(service, monkeypatch):
+    service.gmaps = FakeMaps([_place('closed_now', open_now=True)])
+    _details(monkeypatch, {'closed_now': dict(_place('closed_now'), opening_hours={'open_now': False})})
+
+    assert service.find_nearby_hospitals('Chennai')[0]['is_open'] is False
+
+def test_filters_reach_the_catalog_and_places(service, monkeypatch):
+    service.gmaps = FakeMaps([_place('open', open_now=True), _place('closed', open_now=False)])
+    _details(monkeypatch, {'open': _place('open', open_now=True), 'closed': _place('closed', open_now=False)})
+    catalog_calls = []
+    nearest = maps_service.hospital_catalog.nearest
+    monkeypatch.setattr(maps_service.hospital_catalog, 'nearest',
+                        lambda *args, **kwargs: catalog_calls.append(kwargs) or nearest(*args, **kwargs))
+
+    hospitals = service.find_nearby_hospitals('Chennai', specialty='cardiology', open_only=True)
+
+    assert [h['name'] for h in hospitals] == ['open']
+    assert (catalog_calls[0]['specialty'], catalog_calls[0]['open_only']) == ('cardiology', True)
+    assert (service.gmaps.search['keyword'], service.gmaps.search['open_now']) == ('cardiology', True)
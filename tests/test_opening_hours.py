@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+
+from place_details_cache import is_open_at
+
+# Weekdays 09:00-17:00 local time; Places counts days from Sunday (0)
+WEEKDAYS = {'periods': [
+    {'open': {'day': day, 'time': '0900'}, 'close': {'day': day, 'time': '1700'}} for day in range(1, 6)
+]}
+# Friday 22:00 to Monday 06:00, across the Saturday-midnight wrap
+WEEKEND_NIGHTS = {'periods': [{'open': {'day': 5, 'time': '2200'}, 'close': {'day': 1, 'time': '0600'}}]}
+IST = 330
+
+def utc(day: int, hour: int, minute: int = 0) -> datetime:
+    """A UTC time in the week of Sunday 2024-06-02"""
+    return datetime(2024, 6, 2 + day, hour, minute, tzinfo=timezone.utc)
+
+def test_open_within_a_period():
+    assert is_open_at(WEEKDAYS, 0, utc(1, 10)) is True
+    assert is_open_at(WEEKDAYS, 0, utc(1, 17)) is False
+    assert is_open_at(WEEKDAYS, 0, utc(0, 10)) is False
+
+def test_uses_the_places_local_time():
+    # 04:00 UTC is 09:30 in India
+    assert is_open_at(WEEKDAYS, IST, utc(1, 4)) is True
+    assert is_open_at(WEEKDAYS, 0, utc(1, 4)) is False
+
+def test_period_wrapping_past_saturday():
+    assert is_open_at(WEEKEND_NIGHTS, 0, utc(6, 12)) is True
+    assert is_open_at(WEEKEND_NIGHTS, 0, utc(0, 12)) is True
+    assert is_open_at(WEEKEND_NIGHTS, 0, utc(1, 5)) is True
+    assert is_open_at(WEEKEND_NIGHTS, 0, utc(3, 12)) is False
+
+def test_open_without_close_is_always_open():
+    assert is_open_at({'periods': [{'open': {'day': 0, 'time': '0000'}}]}, 0, utc(3, 3)) is True
+
+def test_unknown_without_periods_or_offset():
+    assert is_open_at(None, 0) is None
+    assert is_open_at({'open_now': True}, 0) is None
+    assert is_open_at(WEEKDAYS, None) is None
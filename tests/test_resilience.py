@@ -0,0 +1,109 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import resilience
+from llm_gateway import LLMGateway
+from resilience import (
+    CircuitBreaker, CircuitOpen, DeadlineExceeded, guarded_call, is_transient, request_deadline, stage_timeout
+)
+
+RESET = 0.05
+
+class BadRequest(Exception):
+    status_code = 400
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker('test', failure_threshold=2, reset_timeout=RESET)
+
+def test_opens_after_consecutive_transient_failures(breaker):
+    breaker.record(TimeoutError())
+    assert breaker.state == 'closed'
+    breaker.record(ConnectionError())
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    assert breaker.stats()['short_circuited'] == 1
+
+def test_success_resets_the_failure_count(breaker):
+    breaker.record(TimeoutError())
+    breaker.record()
+    breaker.record(TimeoutError())
+    assert breaker.state == 'closed'
+
+def test_non_transient_errors_do_not_count(breaker):
+    for _ in range(3):
+        breaker.record(BadRequest())
+    assert breaker.state == 'closed'
+
+def test_half_open_lets_one_trial_through(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(RESET)
+    assert breaker.state == 'half_open'
+
+    breaker.allow()
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    breaker.record()
+    assert breaker.state == 'closed'
+
+def test_failed_trial_reopens(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(RESET)
+    breaker.allow()
+    breaker.record(DeadlineExceeded())
+    assert breaker.state == 'open'
+    assert breaker.stats()['opened'] == 2
+
+def test_release_frees_the_trial_without_a_verdict(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(RESET)
+    breaker.allow()
+    breaker.release()
+    assert breaker.state == 'half_open'
+    breaker.allow()
+
+def test_transient_errors():
+    assert is_transient(TimeoutError())
+    assert not is_transient(BadRequest())
+    assert not is_transient(ValueError())
+
+def test_stage_timeout_shares_the_request_budget():
+    assert stage_timeout(5.0) == 5.0
+    with request_deadline(2.0):
+        assert stage_timeout(5.0, 0.5) <= 1.0
+        with request_deadline(10.0):
+            # A nested block cannot extend the outer budget
+            assert stage_timeout(5.0) <= 2.0
+
+def test_coalesced_failure_counts_once(breaker, monkeypatch):
+    monkeypatch.setitem(resilience.breakers, 'gemini', breaker)
+    gateway = LLMGateway(min_limit=1, max_limit=4, initial_limit=4, max_queue=4, queue_timeout=1.0)
+    release = threading.Event()
+
+    def generate():
+        release.wait(2)
+        raise ConnectionError('reset')
+
+    def call():
+        return guarded_call('gemini', lambda timeout: gateway.call('prompt', generate))
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(call) for _ in range(3)]
+        deadline = time.monotonic() + 2
+        while gateway.stats()['coalesced'] < 2:
+            assert time.monotonic() < deadline, "timed out"
+            time.sleep(0.005)
+        release.set()
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result()
+
+    assert breaker.stats()['failures'] == 1
+    assert breaker.state == 'closed'
@@ -0,0 +1,93 @@
+import json
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import migrate
+from text_blob import COMPRESS_MIN_BYTES, decode_text, encode_text, text_hash
+
+ADVICE = "Rest, drink fluids and see a doctor if the fever lasts more than three days. " * 10
+SYMPTOMS = json.dumps(['fever', 'headache'])
+
+# The chat and consultation tables as they were before migration 2
+BASELINE_SCHEMA = [
+    """CREATE TABLE chat_message (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, message TEXT NOT NULL, response TEXT NOT NULL,
+        severity_score INTEGER, extracted_symptoms TEXT, timestamp DATETIME
+    )""",
+    """CREATE TABLE consultation (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, symptoms TEXT NOT NULL, severity_score INTEGER NOT NULL,
+        diagnosis TEXT, recommended_action VARCHAR(50), recommended_hospitals TEXT, timestamp DATETIME
+    )""",
+]
+
+def test_encoding_round_trips():
+    short, long = "Drink water", ADVICE
+    assert encode_text(short)[1] == 'raw'
+    assert len(long.encode()) >= COMPRESS_MIN_BYTES and encode_text(long)[1] == 'zlib'
+    for value in (short, long, "Température 39 °C"):
+        digest, codec, data, size = encode_text(value)
+        assert digest == text_hash(value)
+        assert size == len(value.encode('utf-8'))
+        assert decode_text(codec, data) == value
+
+def test_unknown_codec_is_an_error():
+    with pytest.raises(ValueError):
+        decode_text('zstd', b'')
+
+def test_identical_texts_are_stored_once(flask_app, flask_user):
+    from app import ChatMessage, Consultation, TextBlob, db
+    # Texts no other test has stored in the shared database
+    advice, symptoms = f"{ADVICE} {uuid.uuid4()}", json.dumps(['fever', str(uuid.uuid4())])
+    with flask_app.app_context():
+        before = db.session.query(TextBlob).count()
+        for _ in range(3):
+            message = ChatMessage(user_id=flask_user[0], message="fever", severity_score=60)
+            message.response = advice
+            message.extracted_symptoms = symptoms
+            consultation = Consultation(user_id=flask_user[0], severity_score=60)
+            consultation.symptoms = symptoms
+            consultation.diagnosis = advice
+            db.session.add_all([message, consultation])
+        db.session.commit()
+
+        assert db.session.query(TextBlob).count() - before == 2
+        stored = ChatMessage.query.filter_by(user_id=flask_user[0]).first()
+        assert (stored.response, stored.extracted_symptoms) == (advice, symptoms)
+        assert Consultation.query.filter_by(user_id=flask_user[0]).first().diagnosis == advice
+
+def test_migration_backfills_a_baseline_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        for ddl in BASELINE_SCHEMA:
+            conn.execute(text(ddl))
+        # Enough rows for three backfill batches
+        conn.execute(text(
+            "INSERT INTO chat_message (user_id, message, response, severity_score, extracted_symptoms) "
+            "VALUES (1, :message, :response, 50, :symptoms)"
+        ), [{'message': f"question {i}", 'response': ADVICE if i % 2 else f"short reply {i}",
+             'symptoms': SYMPTOMS if i % 3 else None} for i in range(1200)])
+        conn.execute(text(
+            "INSERT INTO consultation (user_id, symptoms, severity_score, diagnosis) VALUES (1, :symptoms, 50, :diagnosis)"
+        ), [{'symptoms': SYMPTOMS, 'diagnosis': ADVICE}, {'symptoms': SYMPTOMS, 'diagnosis': None}])
+
+    migrate(engine, 'flask')
+
+    columns = {column['name'] for column in inspect(engine).get_columns('chat_message')}
+    assert {'response_hash', 'extracted_symptoms_hash'} <= columns
+    assert not {'response', 'extracted_symptoms'} & columns
+    with engine.connect() as conn:
+        blobs = {row.hash: decode_text(row.codec, row.data)
+                 for row in conn.execute(text("SELECT hash, codec, data FROM text_blob"))}
+        # ADVICE, SYMPTOMS and the 600 distinct short replies
+        assert len(blobs) == 602
+        rows = conn.execute(text(
+            "SELECT id, response_hash, extracted_symptoms_hash FROM chat_message ORDER BY id"
+        )).fetchall()
+        assert len(rows) == 1200
+        for i, (_, response_hash, symptoms_hash) in enumerate(rows):
+            assert blobs[response_hash] == (ADVICE if i % 2 else f"short reply {i}")
+            assert (blobs[symptoms_hash] if symptoms_hash else None) == (SYMPTOMS if i % 3 else None)
+        consultations = conn.execute(text("SELECT symptoms_hash, diagnosis_hash FROM consultation ORDER BY id")).fetchall()
+        assert [(blobs[s], blobs.get(d)) for s, d in consultations] == [(SYMPTOMS, ADVICE), (SYMPTOMS, None)]
@@ -0,0 +1,60 @@
+import pytest
+
+from triage_engine import TriageEngine, triage_engine
+
+@pytest.mark.parametrize('message, score', [
+    ("I have chest pain", 90),
+    ("severe pain in my back", 80),
+    ("severe nausea since lunch", 80),
+    ("I've had headaches all week", 50),
+    ("coughing at night", 40),
+    ("feeling feverish", 60),
+    ("my knee is painful", 50),
+    ("I feel a bit tired", 30),
+])
+def test_scores_keep_the_keyword_tiers(message, score):
+    assert triage_engine.score(message).score == score
+
+def test_no_match_has_zero_confidence():
+    result = triage_engine.score("just checking in")
+    assert result.score == 30
+    assert result.confidence == 0.0
+    assert result.findings == []
+
+def test_negated_findings_do_not_score():
+    result = triage_engine.score("no chest pain, just a cough")
+    assert result.score == 40
+    assert result.negated == ['chest pain']
+    assert result.findings == ['cough']
+
+def test_longer_phrase_keeps_the_highest_contained_tier():
+    engine = TriageEngine([
+        {'phrase': 'severe', 'score': 80, 'confidence': 0.6},
+        {'phrase': 'severe rash', 'score': 50, 'confidence': 0.7},
+        {'phrase': 'rash', 'score': 40, 'confidence': 0.5},
+    ])
+    result = engine.score("a severe rash")
+    assert result.findings == ['severe rash']
+    assert (result.score, result.confidence) == (80, 0.6)
+
+@pytest.mark.parametrize('message, score, findings', [
+    ("I could not sleep because of chest pain", 90, ['chest pain']),
+    ("I never felt this severe chest pain before", 90, ['severe', 'chest pain']),
+    ("I can not stop coughing", 40, ['cough']),
+    ("not really sure why, but chest pain", 90, ['chest pain']),
+])
+def test_negation_ends_after_the_noun_phrase(message, score, findings):
+    result = triage_engine.score(message)
+    assert (result.score, result.findings, result.negated) == (score, findings, [])
+
+@pytest.mark.parametrize('message, negated', [
+    ("no chest pain", ['chest pain']),
+    ("without any fever", ['fever']),
+    ("I don't have a cough", ['cough']),
+    ("denies severe headache", ['severe headache']),
+    ("no history of chest pain", ['chest pain']),
+    ("I have not had any high fever", ['high fever']),
+])
+def test_negated_noun_phrases(message, negated):
+    result = triage_engine.score(message)
+    assert (result.score, result.negated) == (30, negated)
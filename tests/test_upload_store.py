@@ -0,0 +1,48 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from upload_store import UploadStore, UploadTooLarge, sniff_mime
+
+PDF = b'%PDF-1.4\n' + b'0123456789' * 100
+
+@pytest.fixture
+def store(tmp_path):
+    # A small chunk size so every save spans several reads
+    return UploadStore(str(tmp_path / 'uploads'), chunk_size=64, max_bytes=2048)
+
+def _files(store):
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), store.root)
+        for directory, _, names in os.walk(store.root) for name in names
+    )
+
+def test_identical_uploads_share_one_file(store):
+    first = store.save(io.BytesIO(PDF), 'scan.pdf')
+    second = store.save(io.BytesIO(PDF), 'copy.pdf')
+
+    assert first.hash == second.hash == hashlib.sha256(PDF).hexdigest()
+    assert (first.created, second.created) == (True, False)
+    assert (first.size, first.mime_type) == (len(PDF), 'application/pdf')
+    assert first.path == os.path.join(first.hash[:2], first.hash[2:4], first.hash)
+    assert _files(store) == [first.path]
+    with open(store.path_for(first.hash), 'rb') as stored:
+        assert stored.read() == PDF
+
+    other = store.save(io.BytesIO(PDF + b'!'), 'scan.pdf')
+    assert other.created and other.hash != first.hash
+    assert len(_files(store)) == 2
+
+def test_upload_at_the_limit_is_kept_and_past_it_rejected(store):
+    assert store.save(io.BytesIO(b'x' * 2048)).size == 2048
+    with pytest.raises(UploadTooLarge):
+        store.save(io.BytesIO(b'y' * 2049))
+    # The partial copy is removed
+    assert _files(store) == [store.relative_path(hashlib.sha256(b'x' * 2048).hexdigest())]
+
+def test_mime_type_comes_from_content_first():
+    assert sniff_mime(b'\x89PNG\r\n\x1a\n', 'scan.pdf') == 'image/png'
+    assert sniff_mime(b'plain text', 'notes.txt') == 'text/plain'
+    assert sniff_mime(b'plain text') == 'application/octet-stream'
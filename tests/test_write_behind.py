@@ -0,0 +1,81 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from write_behind import WriteBehindQueue
+
+INSERT = text("INSERT INTO chat_log (id, message) VALUES (:id, :message)")
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chats.db'}")
+    _create_table(engine)
+    return engine
+
+def _create_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE chat_log (id INTEGER PRIMARY KEY, message TEXT NOT NULL)"))
+
+def _records(ids):
+    return [(INSERT, {'id': i, 'message': f"message {i}"}) for i in ids]
+
+def _rows(engine):
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text("SELECT id FROM chat_log ORDER BY id"))]
+
+def _wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_stop_flushes_everything_queued(engine):
+    writer = WriteBehindQueue(engine, enabled=True, batch_size=100, flush_interval=30, max_queue=100)
+    for i in range(5):
+        writer.submit(_records([i]))
+    assert _rows(engine) == []
+
+    writer.stop()
+    assert _rows(engine) == [0, 1, 2, 3, 4]
+    assert writer.stats()['written'] == 5
+
+def test_full_batches_are_written_without_waiting(engine):
+    writer = WriteBehindQueue(engine, enabled=True, batch_size=3, flush_interval=30, max_queue=100)
+    writer.submit(_records([1, 2, 3]))
+    _wait_for(lambda: len(_rows(engine)) == 3)
+    writer.stop()
+
+def test_disabled_or_full_queue_writes_synchronously(engine, monkeypatch):
+    WriteBehindQueue(engine, enabled=False).submit(_records([1]))
+    assert _rows(engine) == [1]
+
+    writer = WriteBehindQueue(engine, enabled=True, max_queue=1)
+    # Hold the writer back so the queue stays full
+    monkeypatch.setattr(writer, 'start', lambda: None)
+    writer.submit(_records([2]))
+    writer.submit(_records([3]))
+    assert writer.stats()['overflow'] == 1
+    assert _rows(engine) == [1, 3]
+
+def test_failed_batch_is_kept_and_written_with_the_next(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chats.db'}")
+    writer = WriteBehindQueue(engine, enabled=True, batch_size=2, flush_interval=0.01, max_queue=100, retries=2)
+    # No table yet: every attempt fails
+    writer.submit(_records([1, 2]))
+    _wait_for(lambda: writer.stats()['kept'] == 2)
+    assert writer.stats()['failed'] == 0
+
+    _create_table(engine)
+    writer.submit(_records([3]))
+    writer.stop()
+    assert _rows(engine) == [1, 2, 3]
+    assert writer.stats()['kept'] == 0
+
+def test_records_unwritable_at_stop_are_counted(tmp_path, capsys):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chats.db'}")
+    writer = WriteBehindQueue(engine, enabled=True, batch_size=100, flush_interval=0.01, max_queue=100, retries=1)
+    writer.submit(_records([1, 2]))
+    writer.stop()
+    assert writer.stats()['failed'] == 2
+    assert "could not write" in capsys.readouterr().out
@@ -0,0 +1,37 @@
+import zlib
+import hashlib
+from typing import Tuple
+
+# Texts shorter than this are stored raw; zlib's header outweighs the savings
+COMPRESS_MIN_BYTES = 256
+
+# Works on SQLite 3.24+ and PostgreSQL; a blob that already exists is left alone
+INSERT_BLOB_SQL = (
+    "INSERT INTO text_blob (hash, codec, data, size) VALUES (:hash, :codec, :data, :size) "
+    "ON CONFLICT (hash) DO NOTHING"
+)
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def encode_text(text: str) -> Tuple[str, str, bytes, int]:
+    """(hash, codec, data, size) for storing a text in the text_blob table"""
+    raw = text.encode('utf-8')
+    digest = hashlib.sha256(raw).hexdigest()
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(raw, 6)
+        if len(compressed) < len(raw):
+            return digest, 'zlib', compressed, len(raw)
+    return digest, 'raw', raw, len(raw)
+
+def decode_text(codec: str, data: bytes) -> str:
+    if codec == 'zlib':
+        data = zlib.decompress(data)
+    elif codec != 'raw':
+        raise ValueError(f"Unknown text blob codec: {codec}")
+    return bytes(data).decode('utf-8')
+
+def blob_params(text: str) -> dict:
+    """INSERT_BLOB_SQL parameters for a text"""
+    digest, codec, data, size = encode_text(text)
+    return {'hash': digest, 'codec': codec, 'data': data, 'size': size}
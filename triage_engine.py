@@ -0,0 +1,138 @@
+import os
+import re
+import json
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'triage_rules.json')
+
+# A negation cue and the noun phrase right after it, e.g. "no chest pain",
+# "without any fever", "don't have a cough", "denies severe headache". The
+# scope runs from the cue through an optional verb (have, feel, ...), any
+# determiners or severity words, and the first word after them, so a finding
+# is negated only if it starts inside that span. Anything else ends it:
+# punctuation, a conjunction, or another verb ("could not sleep because of
+# chest pain", "never felt this severe chest pain", "can not stop coughing").
+_NEGATION_CUES = (
+    r"no|not|without|never|denies|denied|deny|negative for|free of|absence of|(?:do|does|did)n't"
+)
+_NEGATION_VERBS = r"have|having|had|feel|feeling|felt|experience|experiencing|experienced|get|getting|got"
+_NEGATION_MODIFIERS = (
+    r"a|an|any|the|much|more|other|further|real|significant|major|severe|mild|sharp|sudden|high|persistent|"
+    r"signs? of|symptoms? of|history of|evidence of"
+)
+_NEGATION_SCOPE = re.compile(
+    rf"\b(?:{_NEGATION_CUES})(?:\s+(?:{_NEGATION_VERBS}))?(?:\s+(?:{_NEGATION_MODIFIERS})\b){{0,3}}\s+[\w']+"
+)
+
+def _trie_regex(phrases: List[str]) -> str:
+    """Regex for a set of literal phrases with shared prefixes factored out,
+    so the engine never re-tests a prefix once it has failed"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A phrase may end here; try the longer continuations first
+        return '(?:' + body + ')?' if '' in node else body
+
+    return build(trie)
+
+@dataclass
+class TriageResult:
+    score: int
+    confidence: float
+    findings: List[str] = field(default_factory=list)
+    negated: List[str] = field(default_factory=list)
+
+class TriageEngine:
+    """Rule-based symptom scorer.
+
+    All rule phrases are compiled into one trie-shaped regex, so a message is
+    scanned once no matter how many rules there are. A phrase matches at a
+    word start and may run on into a longer word, so "headaches", "coughing"
+    and "feverish" count as headache, cough and fever.
+    The score is the highest-weighted finding that is not negated, and the
+    confidence is that rule's own confidence, lowered for each distinct
+    negated finding since those make the message harder to read. A phrase
+    never scores below a shorter rule phrase it contains: "severe pain"
+    matches as one finding but keeps the tier of "severe".
+    """
+
+    def __init__(self, rules: List[Dict], default_score: int = 30, negation_penalty: float = 0.15):
+        rules = {rule['phrase'].lower(): rule for rule in rules}
+        self.rules = {phrase: self._effective_rule(phrase, rules) for phrase in rules}
+        self.default_score = default_score
+        self.negation_penalty = negation_penalty
+        self._pattern = re.compile(r"\b(" + _trie_regex(list(self.rules)) + r")\w*")
+
+    @staticmethod
+    def _effective_rule(phrase: str, rules: Dict[str, Dict]) -> Dict:
+        """The highest-weighted rule among phrase and the rule phrases it contains"""
+        contained = [
+            rule for other, rule in rules.items()
+            if re.search(r"\b" + re.escape(other), phrase)
+        ]
+        best = max(contained, key=lambda rule: (rule['score'], rule['confidence']))
+        return dict(best, phrase=phrase)
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_RULES_PATH) -> 'TriageEngine':
+        """Load a weighted rule table from JSON"""
+        with open(path, encoding='utf-8') as f:
+            table = json.load(f)
+        return cls(table['rules'], default_score=table.get('default_score', 30))
+
+    def score(self, text: str) -> TriageResult:
+        """Score a message; confidence 0.0 means no rule matched"""
+        text = (text or '').lower().replace('’', "'")
+        scopes = [(m.start(), m.end()) for m in _NEGATION_SCOPE.finditer(text)]
+        scope_starts = [start for start, _ in scopes]
+        findings, negated = {}, {}
+        best = None
+        for match in self._pattern.finditer(text):
+            phrase = match.group(1)
+            i = bisect_right(scope_starts, match.start()) - 1
+            if i >= 0 and match.start() < scopes[i][1]:
+                negated[phrase] = True
+                continue
+            findings[phrase] = True
+            rule = self.rules[phrase]
+            if best is None or (rule['score'], rule['confidence']) > (best['score'], best['confidence']):
+                best = rule
+
+        if best is None:
+            return TriageResult(self.default_score, 0.0, list(findings), list(negated))
+        confidence = max(0.0, best['confidence'] - self.negation_penalty * len(negated))
+        return TriageResult(best['score'], round(confidence, 3), list(findings), list(negated))
+
+# Singleton instance
+triage_engine = TriageEngine.from_file()
+
+if __name__ == '__main__':
+    # Benchmark: python triage_engine.py
+    import timeit
+
+    samples = {
+        'short': "I have chest pain and shortness of breath",
+        'negated': "No chest pain, no fever, but a mild headache since morning",
+        'long': " ".join([
+            "I've been feeling tired for a few days and my back is a little stiff after work.",
+            "Yesterday I did not have a fever but today I feel warm and slightly dizzy,",
+            "and I noticed a runny nose and a sore throat in the evening."
+        ] * 20) + " Now there is sudden onset crushing pain in my chest."
+    }
+    for name, text in samples.items():
+        runs = 2000
+        seconds = timeit.timeit(lambda: triage_engine.score(text), number=runs)
+        result = triage_engine.score(text)
+        print(f"{name:>8} ({len(text):5d} chars): {seconds / runs * 1e6:8.1f} us/score  "
+              f"score={result.score} confidence={result.confidence} negated={result.negated}")
@@ -0,0 +1,116 @@
+import os
+import hashlib
+import tempfile
+import mimetypes
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+from config import get_settings
+
+settings = get_settings()
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (offset, magic bytes, MIME type) for the document types users upload
+_SIGNATURES = [
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'II*\x00', 'image/tiff'),
+    (0, b'MM\x00*', 'image/tiff'),
+    (128, b'DICM', 'application/dicom'),
+]
+
+class UploadTooLarge(ValueError):
+    pass
+
+@dataclass
+class StoredFile:
+    hash: str
+    size: int
+    mime_type: str
+    path: str  # Relative to the store root, e.g. "ab/cd/abcd..."
+    created: bool  # False when identical content was already stored
+
+def sniff_mime(head: bytes, filename: Optional[str] = None) -> str:
+    """MIME type from the first bytes of a file, falling back to its extension"""
+    for offset, magic, mime_type in _SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return mime_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    guessed, _ = mimetypes.guess_type(filename or '')
+    return guessed or 'application/octet-stream'
+
+class UploadStore:
+    """Content-addressed file store for uploaded documents.
+
+    save() copies a stream to a temporary file in fixed-size chunks, hashing
+    it and counting its size on the way, then moves it to <root>/ab/cd/<sha256>.
+    Identical uploads share one file, and memory use is one chunk whatever
+    the file size.
+    """
+
+    def __init__(self, root: str = None, chunk_size: int = None, max_bytes: int = None):
+        self.root = root or settings.UPLOAD_DIR or os.path.join(PROJECT_DIR, 'uploads')
+        self.chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+        self.max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+        self._tmp_dir = os.path.join(self.root, '.tmp')
+
+    def relative_path(self, content_hash: str) -> str:
+        return os.path.join(content_hash[:2], content_hash[2:4], content_hash)
+
+    def path_for(self, content_hash: str) -> str:
+        return os.path.join(self.root, self.relative_path(content_hash))
+
+    def derived_dir(self, content_hash: str) -> str:
+        """Directory for files derived from a stored upload (previews, extracted text)"""
+        return os.path.join(self.root, 'derived', content_hash[:2], content_hash[2:4], content_hash)
+
+    def save(self, stream: BinaryIO, filename: Optional[str] = None) -> StoredFile:
+        """Store the rest of stream; raises UploadTooLarge past max_bytes"""
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        # The temporary file sits under the root so the final rename stays on one filesystem;
+        # the folders are created here rather than at import
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+                    if len(head) < 512:
+                        head += chunk[:512 - len(head)]
+                    digest.update(chunk)
+                    tmp.write(chunk)
+
+            content_hash = digest.hexdigest()
+            final_path = self.path_for(content_hash)
+            created = not os.path.exists(final_path)
+            if created:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+            else:
+                os.unlink(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        return StoredFile(
+            hash=content_hash,
+            size=size,
+            mime_type=sniff_mime(head, filename),
+            path=self.relative_path(content_hash),
+            created=created
+        )
+
+# Singleton instance
+upload_store = UploadStore()
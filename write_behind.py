@@ -0,0 +1,160 @@
+import time
+import queue
+import atexit
+import threading
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.engine import Engine
+from config import get_settings
+
+settings = get_settings()
+
+_STOP = object()
+
+class WriteBehindQueue:
+    """Write-behind buffer for insert-only records (chat logs, consultations).
+
+    Callers submit (statement, params) pairs and return immediately; a
+    background thread drains the bounded queue and writes up to batch_size
+    records per transaction, with one executemany per statement. Submit the
+    same statement object for every record of a kind (e.g. a module-level
+    insert) so records from different requests group together.
+
+    When the queue is full the caller writes synchronously instead of
+    dropping the record. A batch that still fails after its retries is
+    kept and written ahead of the next batch (at most max_queue records
+    are kept; anything older is logged as lost). stop() (also registered
+    with atexit) flushes everything still queued before returning.
+    """
+
+    def __init__(self, engine: Engine, enabled: bool = None, batch_size: int = None,
+                 flush_interval: float = None, max_queue: int = None, retries: int = 3):
+        self.engine = engine
+        self.enabled = settings.WRITE_BEHIND_ENABLED if enabled is None else enabled
+        self.batch_size = batch_size or settings.WRITE_BEHIND_BATCH_SIZE
+        self.flush_interval = settings.WRITE_BEHIND_FLUSH_INTERVAL_SECONDS if flush_interval is None else flush_interval
+        self.retries = retries
+        self._queue = queue.Queue(maxsize=max_queue or settings.WRITE_BEHIND_MAX_QUEUE)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._registered = False
+        self._kept: List[Tuple] = []  # Records of failed batches, oldest first; only the writer thread touches it
+        self._stats = {'submitted': 0, 'written': 0, 'batches': 0, 'overflow': 0, 'failed': 0, 'max_depth': 0}
+
+    def start(self):
+        with self._lock:
+            if not self.enabled or (self._thread and self._thread.is_alive()):
+                return
+            if self._thread is None and not self._registered:
+                atexit.register(self.stop)
+                self._registered = True
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def submit(self, records: List[Tuple]):
+        """Queue (statement, params) records to be written together, in order.
+
+        Writes them synchronously when write-behind is disabled or the queue
+        is full.
+        """
+        if not self.enabled:
+            self._write(records)
+            return
+        self.start()
+        try:
+            self._queue.put_nowait(records)
+        except queue.Full:
+            with self._lock:
+                self._stats['overflow'] += 1
+            self._write(records)
+            return
+        with self._lock:
+            self._stats['submitted'] += len(records)
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._queue.qsize())
+
+    def stop(self, timeout: Optional[float] = None):
+        """Flush pending records and stop the writer"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, enabled=self.enabled, depth=self._queue.qsize(), kept=len(self._kept),
+                        batch_size=self.batch_size, flush_interval=self.flush_interval)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = list(item)
+            # Keep collecting until the batch is full or the flush interval passes
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.extend(item)
+            self._flush(batch)
+
+        # Drain whatever was queued behind the stop marker
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.extend(item)
+        if leftovers or self._kept:
+            self._flush(leftovers)
+        if self._kept:
+            print(f"Write-behind stopped with {len(self._kept)} records it could not write")
+            with self._lock:
+                self._stats['failed'] += len(self._kept)
+            self._kept = []
+
+    def _flush(self, batch: List[Tuple]):
+        # Records kept from failed batches go first, so dependencies still precede their rows
+        batch = self._kept + batch
+        for attempt in range(self.retries):
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"Write-behind flush failed (attempt {attempt + 1}): {e}")
+                time.sleep(self.flush_interval * (attempt + 1))
+                continue
+            with self._lock:
+                self._kept = []
+                self._stats['written'] += len(batch)
+                self._stats['batches'] += 1
+            return
+
+        kept = batch[-self._queue.maxsize:]
+        lost = len(batch) - len(kept)
+        print(f"Write-behind keeps {len(kept)} records to retry with the next batch"
+              + (f"; {lost} older records are lost" if lost else ""))
+        with self._lock:
+            self._kept = kept
+            self._stats['failed'] += lost
+
+    def _write(self, records: List[Tuple]):
+        """Write records in one transaction, one executemany per statement.
+
+        Statements run in order of first appearance, so callers must submit
+        dependencies (e.g. blobs) before the rows that reference them.
+        """
+        groups = {}
+        for statement, params in records:
+            groups.setdefault(id(statement), (statement, []))[1].append(params)
+        with self.engine.begin() as conn:
+            for statement, params in groups.values():
+                conn.execute(statement, params)